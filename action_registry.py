@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+# Metadata declared by @action on the functions in actions.py, keyed by action name
+ACTION_METADATA: Dict[str, "ActionMeta"] = {}
+
+
+@dataclass(frozen=True)
+class ActionMeta:
+    """
+    How the workflow engine may treat an action.
+
+    pure:       no side effects and the result depends only on the arguments, so results can be memoized
+    read_only:  no side effects, but may read shared state (see reads); safe to run alongside other read-only steps
+    idempotent: running it twice has the same effect as once, so it is safe to retry
+    cache_ttl:  seconds a pure result stays valid across workflows (0 = reuse only within one workflow)
+    reads/writes: names of shared state the action touches, e.g. "document"
+    """
+    pure: bool = False
+    read_only: bool = False
+    idempotent: bool = False
+    cache_ttl: float = 0.0
+    reads: Tuple[str, ...] = ()
+    writes: Tuple[str, ...] = ()
+
+    @property
+    def concurrent_safe(self) -> bool:
+        return (self.pure or self.read_only) and not self.writes
+
+
+# Unregistered actions (including generated tools) are assumed to have side effects
+DEFAULT_META = ActionMeta()
+
+
+def action(pure: bool = False, read_only: bool = False, idempotent: bool = False, cache_ttl: float = 0.0,
+           reads: Tuple[str, ...] = (), writes: Tuple[str, ...] = ()):
+    """
+    Register metadata for an action function; the function itself is returned unchanged.
+    Pure actions are also read-only, and read-only actions are also idempotent.
+    """
+    read_only = read_only or pure
+    meta = ActionMeta(
+        pure=pure,
+        read_only=read_only,
+        idempotent=idempotent or read_only,
+        cache_ttl=cache_ttl,
+        reads=tuple(reads),
+        writes=tuple(writes),
+    )
+
+    def decorator(func):
+        ACTION_METADATA[func.__name__] = meta
+        func.__action_meta__ = meta
+        return func
+
+    return decorator
+
+
+def get_action_meta(name: str) -> ActionMeta:
+    return ACTION_METADATA.get(name, DEFAULT_META)
+
+# Usage:
+# @action(pure=True, cache_ttl=600)
+# def get_weather(location=""):
+#     ...
+# get_action_meta("get_weather").concurrent_safe  # True
@@ -1,134 +1,207 @@
 import os
 import openai
 import webbrowser
-import pyautogui
 import requests
 import wolframalpha
-import sys
 import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
 import subprocess
 import json
+from contextvars import ContextVar
 from typing import Any
-from workflow_models import Workflow, Action, ValidationError
+from workflow_models import validate_workflow, format_errors
 from logging_setup import logger
+from model_router import routed_completion
+from app_index import app_index, launch_app
+from action_registry import action
+from document_store import LetterDocument, PatchError, affected_paragraphs, FULL_EDIT_CHARS
+from tracing import span
 
 load_dotenv()
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Bounded client timeout so a hung request cannot outlive the workflow step that made it
+client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=30.0, max_retries=0)
 wolfram_client = wolframalpha.Client(os.getenv("WOLFRAM_APP_ID"))
 
-# In-memory document for letter writing/editing
-current_document = {"content": ""}
+# In-memory document for letter writing/editing. The single-user front ends share this default;
+# server sessions bind their own document with use_document(), which follows the context into
+# workflow step threads.
+current_document = LetterDocument()
+_document_var: ContextVar[LetterDocument] = ContextVar("current_document", default=current_document)
 
+
+def get_document() -> LetterDocument:
+    return _document_var.get()
+
+
+def use_document(document: LetterDocument):
+    """
+    Make `document` the letter the actions read and edit in the current context; returns the reset token.
+    """
+    return _document_var.set(document)
+
+
+@action(read_only=True)
 def handle_general_chat(prompt):
-    logger.info(f"handle_general_chat called with prompt: {prompt!r}")
+    logger.info("handle_general_chat called with prompt: %r", prompt)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        response = routed_completion(
+            client, "chat",
             messages=[{"role": "user", "content": prompt}]
         )
         result = response.choices[0].message.content
-        logger.info(f"handle_general_chat result: {result!r}")
+        logger.info("handle_general_chat result: %r", result)
         return result
     except Exception as e:
-        logger.error(f"handle_general_chat error: {e}")
+        logger.error("handle_general_chat error: %s", e)
         return f"Error: {e}"
 
+@action()
 def open_application(app_name):
-    logger.info(f"open_application called with app_name: {app_name!r}")
-    app_map = {
-        "chrome": "google-chrome" if os.name != "nt" else "chrome.exe",
-        "spotify": "spotify",
-        "notepad": "notepad.exe"
-    }
+    logger.info("open_application called with app_name: %r", app_name)
+    entry = app_index.resolve(app_name)
+    if entry is None:
+        logger.warning("open_application: no installed application matches %r", app_name)
+        return f"I'm sorry, I couldn't find the application {app_name}."
     try:
-        if os.name == "nt":
-            os.startfile(app_map.get(app_name.lower(), app_name))
-        else:
-            from subprocess import Popen
-            Popen(["open" if sys.platform == "darwin" else "xdg-open", app_map.get(app_name.lower(), app_name)])
-        logger.info(f"open_application success: {app_name}")
-        return f"Opening {app_name}, sir."
+        launch_app(entry)
+        logger.info("open_application success: %s", entry.name)
+        return f"Opening {entry.name}, sir."
     except Exception as e:
-        logger.error(f"open_application error: {e}")
-        return f"I'm sorry, I couldn't find the application {app_name}. ({e})"
+        logger.error("open_application error: %s", e)
+        return f"I'm sorry, I couldn't open the application {app_name}. ({e})"
 
+@action(pure=True, cache_ttl=3600)
 def perform_calculation(query):
-    logger.info(f"perform_calculation called with query: {query!r}")
+    logger.info("perform_calculation called with query: %r", query)
     try:
-        res = wolfram_client.query(query)
+        with span("api.wolfram"):
+            res = wolfram_client.query(query)
         result = next(res.results).text
-        logger.info(f"perform_calculation result: {result!r}")
+        logger.info("perform_calculation result: %r", result)
         return result
     except Exception as e:
-        logger.error(f"perform_calculation error: {e}")
+        logger.error("perform_calculation error: %s", e)
         return f"Sorry, I couldn't compute that. ({e})"
 
+@action(pure=True, cache_ttl=300)
 def get_news():
     logger.info("get_news called")
     result = "Headline: Stark Industries Announces Breakthrough in Arc Reactor Technology."
-    logger.info(f"get_news result: {result!r}")
+    logger.info("get_news result: %r", result)
     return result
 
+@action(pure=True, cache_ttl=600)
 def get_weather(location=""):
-    logger.info(f"get_weather called with location: {location!r}")
+    logger.info("get_weather called with location: %r", location)
     result = f"The weather in {location or 'your area'} is currently sunny and 25°C."
-    logger.info(f"get_weather result: {result!r}")
+    logger.info("get_weather result: %r", result)
     return result
 
+@action()
 def web_search(query):
-    logger.info(f"web_search called with query: {query!r}")
+    logger.info("web_search called with query: %r", query)
     try:
-        webbrowser.open(f"https://www.google.com/search?q={query}")
-        logger.info(f"web_search opened browser for: {query!r}")
+        with span("browser.open"):
+            webbrowser.open(f"https://www.google.com/search?q={query}")
+        logger.info("web_search opened browser for: %r", query)
         return f"Searching the web for '{query}'."
     except Exception as e:
-        logger.error(f"web_search error: {e}")
+        logger.error("web_search error: %s", e)
         return f"Error searching the web: {e}"
 
+@action()
 def system_command(command):
-    logger.info(f"system_command called with command: {command!r}")
+    logger.info("system_command called with command: %r", command)
     return f"System command '{command}' received (not executed for safety)."
 
 # --- Letter/document actions ---
+@action(idempotent=True, writes=("document",))
 def create_letter(subject, body):
-    logger.info(f"create_letter called with subject: {subject!r}, body: {body!r}")
-    current_document["content"] = f"Subject: {subject}\n\n{body}"
+    logger.info("create_letter called with subject: %r, body: %r", subject, body)
+    get_document().set_content(f"Subject: {subject}\n\n{body}", label="create")
     logger.info("create_letter updated current_document")
     return "Draft letter created."
 
-def edit_letter(edit_instruction):
-    logger.info(f"edit_letter called with edit_instruction: {edit_instruction!r}")
-    prompt = f"Current letter:\n{current_document['content']}\n\nEdit instruction: {edit_instruction}\n\nReturn the revised letter."
+def _rewrite_letter(document: LetterDocument, edit_instruction: str):
+    prompt = f"Current letter:\n{document.content}\n\nEdit instruction: {edit_instruction}\n\nReturn the revised letter."
+    response = routed_completion(
+        client, "edit_letter",
+        messages=[{"role": "user", "content": prompt}]
+    )
+    document.set_content(response.choices[0].message.content, label="edit")
+
+def _patch_letter(document: LetterDocument, edit_instruction: str, targets):
+    # Only the target paragraphs and a one-line-per-paragraph outline go to the model
+    patches = []
+
+    def _valid(content):
+        patches.append(document.parse_patch(content, targets))
+        return True
+
+    routed_completion(
+        client, "edit_letter_patch",
+        messages=document.patch_messages(edit_instruction, targets),
+        validate=_valid,
+        response_format={"type": "json_object"}
+    )
+    if not patches:
+        raise PatchError("no valid patch returned")
+    document.apply_patch(patches[-1], label="edit")
+
+@action(writes=("document",))
+def edit_letter(edit_instruction, paragraphs=None):
+    """
+    Short letters, and edits that do not point at specific paragraphs, are rewritten whole; otherwise
+    only the affected paragraphs are sent and the returned patch is applied locally.
+    """
+    logger.info("edit_letter called with edit_instruction: %r, paragraphs: %r", edit_instruction, paragraphs)
+    document = get_document()
+    count = len(document.paragraphs)
+    targets = sorted({n for n in paragraphs or () if 1 <= n <= count}) or affected_paragraphs(edit_instruction, document.paragraphs)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        current_document["content"] = response.choices[0].message.content
-        logger.info("edit_letter updated current_document")
+        if targets and len(document.content) > FULL_EDIT_CHARS:
+            try:
+                _patch_letter(document, edit_instruction, targets)
+                logger.info("edit_letter patched paragraphs %s (version %s)", targets, document.version)
+                return "Letter updated."
+            except PatchError as e:
+                logger.warning("edit_letter patch failed, rewriting the whole letter: %s", e)
+        _rewrite_letter(document, edit_instruction)
+        logger.info("edit_letter updated current_document (version %s)", document.version)
         return "Letter updated."
     except Exception as e:
-        logger.error(f"edit_letter error: {e}")
+        logger.error("edit_letter error: %s", e)
         return f"Error editing letter: {e}"
 
+@action(writes=("document",))
+def undo_letter_edit():
+    logger.info("undo_letter_edit called")
+    document = get_document()
+    undone = document.undo()
+    if undone is None:
+        return "There is nothing to undo."
+    return f"Undid the last {undone} (letter is back at version {document.version})."
+
+@action(read_only=True, reads=("document",))
 def read_letter():
     logger.info("read_letter called")
-    result = f"Here is your current letter:\n{current_document['content']}"
-    logger.info(f"read_letter result: {result!r}")
+    result = f"Here is your current letter:\n{get_document().content}"
+    logger.info("read_letter result: %r", result)
     return result
 
+@action(idempotent=True, writes=("document",))
 def clear_letter():
     logger.info("clear_letter called")
-    current_document["content"] = ""
+    get_document().set_content("", label="clear")
     logger.info("clear_letter cleared current_document")
     return "Letter cleared."
 
+@action(reads=("document",))
 def send_letter_via_email_macos(to_email, subject=None):
-    logger.info(f"send_letter_via_email_macos called with to_email: {to_email!r}, subject: {subject!r}")
+    logger.info("send_letter_via_email_macos called with to_email: %r, subject: %r", to_email, subject)
     subject = subject or "Letter from JARVIS"
-    body = current_document["content"]
+    body = get_document().content
     applescript = f'''
     tell application "Mail"
         activate
@@ -140,61 +213,60 @@ def send_letter_via_email_macos(to_email, subject=None):
     end tell
     '''
     try:
-        subprocess.run(["osascript", "-e", applescript], check=True)
-        logger.info(f"send_letter_via_email_macos success for {to_email}")
+        subprocess.run(["osascript", "-e", applescript], check=True, timeout=15)
+        logger.info("send_letter_via_email_macos success for %s", to_email)
         return f"Email draft created in Mail.app for {to_email}. Please review and send."
     except Exception as e:
-        logger.error(f"send_letter_via_email_macos error: {e}")
+        logger.error("send_letter_via_email_macos error: %s", e)
         return f"Failed to create email: {e}"
 
+@action(pure=True, cache_ttl=3600)
 def transcribe_exactly(text):
-    logger.info(f"transcribe_exactly called with text: {text!r}")
+    logger.info("transcribe_exactly called with text: %r", text)
     return text
 
 def execute_workflow(workflow_json: Any):
-    logger.info(f"execute_workflow called with workflow_json: {workflow_json!r}")
+    logger.debug("execute_workflow called with workflow_json: %r", workflow_json)
     """
     Accepts a workflow as a JSON string or dict, validates and executes each step, and returns a summary.
     """
-    try:
-        if isinstance(workflow_json, str):
-            wf = Workflow.parse_raw(workflow_json)
-        else:
-            wf = Workflow.parse_obj(workflow_json)
-    except ValidationError as e:
-        logger.error(f"execute_workflow validation error: {e}")
-        return f"Invalid workflow: {e}"
+    wf, errors = validate_workflow(workflow_json)
+    if wf is None:
+        logger.error("execute_workflow validation error: %s", errors)
+        return f"Invalid workflow: {format_errors(errors)}"
 
     results = []
     for step in wf.steps:
         action = step.action
-        logger.info(f"execute_workflow step: {action}")
+        logger.info("execute_workflow step: %s", action)
         if action == "create_letter":
-            results.append(create_letter(step.subject or "", step.body or ""))
+            results.append(create_letter(step.subject, step.body))
         elif action == "edit_letter":
-            results.append(edit_letter(step.edit_instruction or ""))
+            results.append(edit_letter(step.edit_instruction, step.paragraphs))
+        elif action == "undo_letter_edit":
+            results.append(undo_letter_edit())
         elif action == "read_letter":
             results.append(read_letter())
         elif action == "clear_letter":
             results.append(clear_letter())
         elif action == "send_letter_via_email_macos":
-            results.append(send_letter_via_email_macos(step.to_email or "", step.subject))
+            results.append(send_letter_via_email_macos(step.to_email, step.subject))
         elif action == "web_search":
-            results.append(web_search(step.query or ""))
+            results.append(web_search(step.query))
         elif action == "transcribe_exactly":
-            results.append(transcribe_exactly(step.text or ""))
+            results.append(transcribe_exactly(step.text))
         elif action == "perform_calculation":
-            results.append(perform_calculation(step.query or ""))
+            results.append(perform_calculation(step.query))
         elif action == "handle_general_chat":
-            results.append(handle_general_chat(step.text or ""))
+            results.append(handle_general_chat(step.prompt))
         elif action == "open_application":
-            results.append(open_application(step.app_name or ""))
+            results.append(open_application(step.app_name))
         elif action == "system_command":
-            results.append(system_command(step.command or ""))
+            results.append(system_command(step.command))
         elif action == "discuss_programming":
-            results.append(handle_general_chat(step.text or ""))
+            results.append(handle_general_chat(step.text))
         else:
-            logger.warning(f"execute_workflow unknown action: {action}")
+            logger.warning("execute_workflow unknown action: %s", action)
             results.append(f"Unknown action: {action}")
-    logger.info(f"execute_workflow results: {results!r}")
+    logger.info("execute_workflow results: %r", results)
     return json.dumps({"workflow_results": results}, indent=2)
\ No newline at end of file
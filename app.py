@@ -2,15 +2,19 @@ import streamlit as st
 from brain import jarvis_think
 import actions
 import os
+from tts_cache import TTSCache
 
 # For voice input/output
 import tempfile
 from openai import OpenAI
+from request_governor import governor
+from model_router import routed_completion
 
 st.title("J.A.R.V.I.S. Protocol - Initialized")
 st.markdown("_Welcome, Sir. Let's have a conversation!_")
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+tts_cache = TTSCache()
 
 # --- Conversation State ---
 if "history" not in st.session_state:
@@ -40,7 +44,8 @@ if audio_file is not None:
 
     with st.spinner("Transcribing with Whisper..."):
         with open(tmpfile_path, "rb") as af:
-            transcript = client.audio.transcriptions.create(
+            transcript = governor.call(
+                "transcription", client.audio.transcriptions.create,
                 model="whisper-1",
                 file=af
             )
@@ -57,8 +62,8 @@ if st.button("Send", use_container_width=True) or (user_input and st.session_sta
 
         # Get assistant response with context
         with st.spinner("J.A.R.V.I.S. is thinking..."):
-            response = client.chat.completions.create(
-                model="gpt-4o",
+            response = routed_completion(
+                client, "chat",
                 messages=st.session_state.history,
                 temperature=0.7
             )
@@ -69,13 +74,8 @@ if st.button("Send", use_container_width=True) or (user_input and st.session_sta
         # Display and speak response
         st.markdown(f"**J.A.R.V.I.S.:** {assistant_reply}")
         with st.spinner("Synthesizing voice..."):
-            tts_response = client.audio.speech.create(
-                model="tts-1",
-                voice="onyx",
-                input=assistant_reply
-            )
-            audio_bytes = tts_response.content
-            st.audio(audio_bytes, format="audio/mp3")
+            mp3_path = tts_cache.synthesize(client, assistant_reply)
+            st.audio(mp3_path, format="audio/mp3")
 
     # Note: Streamlit does not allow resetting st.session_state["text"] after widget creation.
     # To continue, simply type or upload your next message.
@@ -0,0 +1,283 @@
+import os
+import re
+import sys
+import shlex
+import difflib
+import threading
+import time
+import subprocess
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from logging_setup import logger
+
+REFRESH_INTERVAL = 300  # seconds between background rescans
+
+DESKTOP_DIRS = [
+    "/usr/share/applications",
+    "/usr/local/share/applications",
+    os.path.expanduser("~/.local/share/applications"),
+    "/var/lib/flatpak/exports/share/applications",
+    "/var/lib/snapd/desktop/applications",
+]
+MACOS_APP_DIRS = [
+    "/Applications",
+    "/Applications/Utilities",
+    "/System/Applications",
+    "/System/Applications/Utilities",
+    os.path.expanduser("~/Applications"),
+]
+WINDOWS_START_MENU_DIRS = [
+    os.path.join(os.getenv("PROGRAMDATA", r"C:\ProgramData"), "Microsoft", "Windows", "Start Menu", "Programs"),
+    os.path.join(os.getenv("APPDATA", os.path.expanduser(r"~\AppData\Roaming")), "Microsoft", "Windows", "Start Menu", "Programs"),
+]
+
+# Spoken names -> candidate application names, tried in order
+APP_ALIASES = {
+    "camera": ["photo booth", "camera", "cheese"],
+    "photo booth": ["photo booth", "cheese"],
+    "browser": ["safari", "google chrome", "firefox", "chromium"],
+    "web": ["safari", "google chrome", "firefox", "chromium"],
+    "chrome": ["google chrome", "google-chrome", "chrome", "chromium"],
+    "terminal": ["terminal", "gnome-terminal", "konsole", "xterm", "cmd"],
+    "shell": ["terminal", "gnome-terminal", "konsole", "xterm", "cmd"],
+    "settings": ["system settings", "system preferences", "gnome-control-center", "settings"],
+    "preferences": ["system settings", "system preferences", "gnome-control-center"],
+    "system preferences": ["system settings", "system preferences", "gnome-control-center"],
+    "reminders": ["reminders"],
+    "notepad": ["notepad", "textedit", "gedit", "gnome-text-editor"],
+}
+
+# The only PATH executables that count as apps: terminal emulators and editors. Anything else on
+# PATH (reboot, shutdown, rm, ...) is a command, not an application, and is never indexed.
+CLI_APP_ALLOWLIST = {
+    "gnome-terminal", "konsole", "xterm", "xfce4-terminal", "alacritty", "kitty", "tilix", "terminator",
+    "wezterm", "cmd", "powershell", "wt",
+    "gedit", "gnome-text-editor", "kate", "mousepad", "notepad", "notepad++", "code", "codium", "subl",
+    "gvim", "emacs",
+}
+
+WINDOWS_EXECUTABLE_EXTS = {".exe", ".bat", ".cmd", ".com"}
+_FILLER = re.compile(r"\b(?:open|launch|start|run|the|app|application|please)\b")
+_FIELD_CODE = re.compile(r"%[a-zA-Z]")
+
+
+@dataclass(frozen=True)
+class AppEntry:
+    name: str
+    command: tuple
+    source: str
+
+
+def normalize_app_name(name: str, strip_filler: bool = False) -> str:
+    name = (name or "").lower()
+    if strip_filler:
+        name = _FILLER.sub(" ", name)
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ._+-]", " ", name)).strip()
+
+
+def _scan_path() -> Dict[str, AppEntry]:
+    entries = {}
+    for directory in os.getenv("PATH", "").split(os.pathsep):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        stem, ext = os.path.splitext(entry.name)
+                        key = normalize_app_name(stem if ext.lower() in WINDOWS_EXECUTABLE_EXTS else entry.name)
+                        if key not in CLI_APP_ALLOWLIST:
+                            continue
+                        entries.setdefault(key, AppEntry(entry.name, (entry.path,), "path"))
+        except OSError:
+            continue
+    return entries
+
+
+def _parse_desktop_file(path: str) -> Optional[Dict[str, str]]:
+    fields = {}
+    in_entry = False
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                elif in_entry and "=" in line:
+                    key, value = line.split("=", 1)
+                    fields.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+    if fields.get("Type", "Application") != "Application" or fields.get("Hidden") == "true" or "Exec" not in fields:
+        return None
+    return fields
+
+
+def _scan_desktop_files() -> Dict[str, AppEntry]:
+    entries = {}
+    for directory in DESKTOP_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            if not filename.endswith(".desktop"):
+                continue
+            fields = _parse_desktop_file(os.path.join(directory, filename))
+            if not fields:
+                continue
+            try:
+                command = tuple(shlex.split(_FIELD_CODE.sub("", fields["Exec"])))
+            except ValueError:
+                continue
+            if not command:
+                continue
+            name = fields.get("Name") or filename[:-len(".desktop")]
+            entry = AppEntry(name, command, "desktop")
+            for key in (name, filename[:-len(".desktop")], os.path.basename(command[0])):
+                entries.setdefault(normalize_app_name(key), entry)
+    return entries
+
+
+def _scan_macos_apps() -> Dict[str, AppEntry]:
+    entries = {}
+    for directory in MACOS_APP_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            if filename.endswith(".app"):
+                name = filename[:-len(".app")]
+                path = os.path.join(directory, filename)
+                entries.setdefault(normalize_app_name(name), AppEntry(name, ("open", "-a", path), "macos"))
+    return entries
+
+
+def _scan_start_menu() -> Dict[str, AppEntry]:
+    entries = {}
+    for directory in WINDOWS_START_MENU_DIRS:
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                name, ext = os.path.splitext(filename)
+                # Start Menu folders also hold uninstallers and help links next to the app
+                if ext.lower() != ".lnk" or normalize_app_name(name).startswith("uninstall"):
+                    continue
+                entries.setdefault(normalize_app_name(name), AppEntry(name, (os.path.join(root, filename),), "windows"))
+    return entries
+
+
+class AppIndex:
+    """
+    Name -> launch command index of installed applications (.desktop files, macOS bundles, Windows
+    Start Menu shortcuts and allowlisted terminal/editor executables on PATH), so app resolution is a dictionary lookup and unknown apps are rejected
+    without spawning a process. The index is rebuilt periodically on a background thread.
+    """
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[str, AppEntry] = {}
+        self._tokens: Dict[str, List[str]] = {}
+        self._resolved: Dict[tuple, Optional[AppEntry]] = {}
+        self._ready = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def build(self):
+        entries = _scan_path()
+        # GUI applications win over same-named command line executables
+        entries.update(_scan_desktop_files())
+        if sys.platform == "darwin":
+            entries.update(_scan_macos_apps())
+        elif os.name == "nt":
+            entries.update(_scan_start_menu())
+        tokens = {}
+        for key, entry in entries.items():
+            if entry.source == "path":
+                continue
+            for token in key.split():
+                tokens.setdefault(token, []).append(key)
+        self._entries, self._tokens, self._resolved = entries, tokens, {}
+        self._ready.set()
+        logger.info("AppIndex built with %s entries", len(entries))
+
+    def start(self):
+        """
+        Build the index in the background and keep refreshing it; safe to call more than once.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._refresh_loop, name="app-index", daemon=True).start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.build()
+            except Exception as e:
+                logger.error("AppIndex build failed: %s", e)
+                self._ready.set()
+            if not self.refresh_interval:
+                return
+            time.sleep(self.refresh_interval)
+
+    def resolve(self, name: str, timeout: float = 5.0, include_cli: bool = True) -> Optional[AppEntry]:
+        """
+        include_cli=False restricts the result to GUI applications (.desktop files, macOS bundles,
+        Start Menu shortcuts);
+        free-form system commands resolve with it so they can never start a PATH executable.
+        """
+        self.start()
+        self._ready.wait(timeout)
+        query = normalize_app_name(name, strip_filler=True)
+        if not query:
+            return None
+        if (query, include_cli) in self._resolved:
+            return self._resolved[(query, include_cli)]
+        entry = self._lookup(query, include_cli)
+        self._resolved[(query, include_cli)] = entry
+        return entry
+
+    def _lookup(self, query: str, include_cli: bool = True) -> Optional[AppEntry]:
+        entries = self._entries
+        if not include_cli:
+            entries = {key: entry for key, entry in entries.items() if entry.source != "path"}
+        if query in entries:
+            return entries[query]
+        for candidate in APP_ALIASES.get(query, []):
+            if candidate in entries:
+                return entries[candidate]
+        # "chrome" -> "google chrome": prefer the shortest GUI app containing every query token
+        keys = None
+        for token in query.split():
+            matches = set(self._tokens.get(token, []))
+            keys = matches if keys is None else keys & matches
+        if keys:
+            return entries[min(keys, key=len)]
+        # Fuzzy matching only ever lands on GUI apps; an executable is launched only by its exact name
+        gui = [key for key, entry in entries.items() if entry.source != "path"]
+        close = difflib.get_close_matches(query, gui, n=1, cutoff=0.8)
+        if close:
+            return entries[close[0]]
+        return None
+
+
+def launch_app(entry: AppEntry) -> subprocess.Popen:
+    """
+    Start the application without waiting for it.
+    """
+    command = list(entry.command)
+    if os.name == "nt" and entry.source in ("path", "windows"):
+        # start resolves .lnk shortcuts and detaches the app from our console
+        command = ["cmd", "/c", "start", ""] + command
+    return subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=os.name != "nt",
+    )
+
+
+app_index = AppIndex()
+
+# Usage:
+# app_index.start()  # at startup
+# entry = app_index.resolve("open safari")
+# if entry:
+#     launch_app(entry)
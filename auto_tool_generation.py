@@ -1,27 +1,78 @@
 import importlib
+import importlib.util
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from logging_setup import logger
+from model_router import routed_completion
 from openai import OpenAI
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+GENERATED_TOOLS_PACKAGE = "generated_tools"
+GENERATED_TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), GENERATED_TOOLS_PACKAGE)
+# Generated code used to live inside actions.py; give each module the same stdlib imports it could rely on there
+GENERATED_TOOL_HEADER = "import os\nimport sys\nimport json\nimport subprocess\nimport webbrowser\n"
+
+# Loaded generated tools by action name; modules are imported once and their bytecode is cached by Python
+_generated_tools = {}
+_generated_tools_lock = threading.Lock()
+
+
+def _tool_path(action_name):
+    return os.path.join(GENERATED_TOOLS_DIR, f"{action_name}.py")
+
+
+def get_generated_tool(action_name):
+    """
+    Return the generated function for action_name, loading its module on first use, or None.
+    Tools persisted by earlier runs are picked up from the generated_tools package.
+    """
+    if not action_name.isidentifier():
+        return None
+    func = _generated_tools.get(action_name)
+    if func is not None:
+        return func
+    if not os.path.exists(_tool_path(action_name)):
+        return None
+    with _generated_tools_lock:
+        if action_name in _generated_tools:
+            return _generated_tools[action_name]
+        try:
+            module = importlib.import_module(f"{GENERATED_TOOLS_PACKAGE}.{action_name}")
+        except Exception as e:
+            logger.error("Failed to load generated tool %s: %s", action_name, e)
+            return None
+        func = getattr(module, action_name, None)
+        if callable(func):
+            _generated_tools[action_name] = func
+            logger.info("Loaded generated tool: %s", action_name)
+            return func
+        logger.error("Generated module %s does not define a function named %s", action_name, action_name)
+        return None
 
-ACTIONS_FILE = "actions.py"
 
 def auto_generate_tool(action_name, params, description=""):
     """
-    Use LLM to generate a Python function for the missing tool and append it to actions.py.
+    Use LLM to generate a Python function for the missing tool and save it as its own module
+    in the generated_tools package.
     """
-    logger.info(f"Auto-generating tool: {action_name} with params {params}")
+    logger.info("Auto-generating tool: %s with params %s", action_name, params)
+    if not action_name.isidentifier():
+        return f"Cannot generate tool with invalid name: {action_name!r}"
     param_str = ", ".join(params)
-    docstring = f'"""{description or f"Auto-generated tool for {action_name}."}"""'
+    # repr() makes any description a valid string literal, quotes and backslashes included
+    docstring = repr(description or f"Auto-generated tool for {action_name}.")
     prompt = (
         f"Write a Python function named '{action_name}' that takes parameters: {param_str}. "
         f"{description or 'The function should perform the intended action safely and return a status message.'} "
         "Do not use any destructive operations. Return a string describing the result."
     )
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    response = routed_completion(
+        client, "codegen",
         messages=[
             {"role": "system", "content": "You are a Python code generator for an AI agent. Only output the function code."},
             {"role": "user", "content": prompt}
@@ -34,11 +85,94 @@ def auto_generate_tool(action_name, params, description=""):
         code = code.split("```")[1]
         if code.startswith("python"):
             code = code[len("python"):].strip()
-    # Append to actions.py
-    with open(ACTIONS_FILE, "a", encoding="utf-8") as f:
-        f.write("\n\n" + code + "\n")
-    logger.info(f"Appended new tool to {ACTIONS_FILE}: {action_name}")
-    # Reload actions module
-    import actions
-    importlib.reload(actions)
-    return f"Auto-generated and loaded new tool: {action_name}"
\ No newline at end of file
+    # Write the tool to its own module; existing actions and tools are left untouched
+    os.makedirs(GENERATED_TOOLS_DIR, exist_ok=True)
+    # Written aside and swapped in, so a concurrent import never sees a half-written module
+    tmp_path = f"{_tool_path(action_name)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"{docstring}\n{GENERATED_TOOL_HEADER}\n\n{code}\n")
+    os.replace(tmp_path, _tool_path(action_name))
+    logger.info("Saved new tool to %s: %s", _tool_path(action_name), action_name)
+    importlib.invalidate_caches()
+    with _generated_tools_lock:
+        _generated_tools.pop(action_name, None)
+        # import_module would hand back the module loaded from the previous file, and its bytecode
+        # cache may match the new file's mtime and size; drop both so the new code is what loads
+        sys.modules.pop(f"{GENERATED_TOOLS_PACKAGE}.{action_name}", None)
+        try:
+            os.remove(importlib.util.cache_from_source(_tool_path(action_name)))
+        except OSError:
+            pass
+    if get_generated_tool(action_name) is None:
+        return f"Auto-generated tool {action_name} could not be loaded."
+    return f"Auto-generated and loaded new tool: {action_name}"
+
+
+class ToolGenerationCoordinator:
+    """
+    Front door for auto_generate_tool used by the workflow engine:
+    - single-flight: concurrent requests for the same (action, parameter signature) share one generation
+    - negative cache: failed or unloadable generations are not retried until an exponential backoff expires
+    - background mode: generation runs on a worker thread and the caller gets a "pending" status immediately
+    """
+
+    def __init__(self, base_backoff: float = 60.0, max_backoff: float = 3600.0, max_workers: int = 2):
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._failures = {}  # key -> (failure_count, retry_at, last_error)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="toolgen")
+
+    @staticmethod
+    def key(action_name, params):
+        return action_name, tuple(sorted(params))
+
+    def _generate(self, key, params, description):
+        action_name = key[0]
+        try:
+            message = auto_generate_tool(action_name, params, description)
+            error = None if get_generated_tool(action_name) else message
+        except Exception as e:
+            error = str(e)
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if error is None:
+                self._failures.pop(key, None)
+            else:
+                count = self._failures.get(key, (0, 0, None))[0] + 1
+                backoff = min(self.base_backoff * 2 ** (count - 1), self.max_backoff)
+                self._failures[key] = (count, time.time() + backoff, error)
+                logger.warning("Tool generation for %s failed (%sx), retry in %.0fs: %s", action_name, count, backoff, error)
+        if error is not None:
+            raise RuntimeError(error)
+        return get_generated_tool(action_name)
+
+    def request(self, action_name, params, description="", background=False):
+        """
+        Return (status, value): ("ready", func), ("pending", None) or ("failed", error message).
+        """
+        func = get_generated_tool(action_name)
+        if func is not None:
+            return "ready", func
+        key = self.key(action_name, params)
+        with self._lock:
+            failure = self._failures.get(key)
+            if failure and failure[1] > time.time():
+                logger.info("Tool generation for %s skipped, in backoff after: %s", action_name, failure[2])
+                return "failed", failure[2]
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._generate, key, list(params), description)
+                self._in_flight[key] = future
+            else:
+                logger.info("Tool generation for %s already in flight; joining it", action_name)
+        if background:
+            return "pending", None
+        try:
+            return "ready", future.result()
+        except Exception as e:
+            return "failed", str(e)
+
+
+generation_coordinator = ToolGenerationCoordinator()
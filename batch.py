@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, Optional, Set
+from dotenv import load_dotenv
+from openai import OpenAI
+
+import actions
+from document_store import LetterDocument
+from brain import jarvis_think
+from logging_setup import logger
+from metering import meter
+from request_governor import governor
+from tracing import span, LatencyHistogram
+from workflow_engine import WorkflowEngine
+from workflow_models import Workflow, parse_action
+
+load_dotenv()
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+# Items in flight at once. The request governor's rate and concurrency limits are what actually
+# bound throughput; this only has to be high enough to keep them saturated.
+CONCURRENCY = int(os.getenv("JARVIS_BATCH_CONCURRENCY", "8"))
+PROGRESS_EVERY = 50  # items between progress log lines
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".webm", ".flac", ".mp4", ".mpeg", ".mpga")
+
+# Classifier intent -> (workflow action, field to fill, take the value from the classifier's "action"
+# instead of the utterance)
+INTENT_STEPS = {
+    "open_application": ("open_application", "app_name", True),
+    "web_search": ("web_search", "query", False),
+    "system_command": ("system_command", "command", False),
+    "calculation": ("perform_calculation", "query", True),
+}
+# Intents with no workflow step of their own; answered by calling the action directly
+DIRECT_INTENTS = {
+    "general_chat": lambda utterance, target: actions.handle_general_chat(utterance),
+    "get_news": lambda utterance, target: actions.get_news(),
+    "get_weather": lambda utterance, target: actions.get_weather(target),
+}
+
+
+def iter_items(source: str) -> Iterator[Dict]:
+    """
+    Yield {"id", "text" | "audio", ...} items from a JSONL file or a directory.
+
+    JSONL lines carry "text" (or "utterance") or "audio" (a path, relative to the file), plus an
+    optional "id" and "expected_intent". In a directory every audio file and every .txt file
+    (one utterance) is an item, identified by its relative path.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                item_id = os.path.relpath(path, source)
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield {"id": item_id, "audio": path}
+                elif name.lower().endswith(".txt"):
+                    with open(path, "r", encoding="utf-8") as f:
+                        yield {"id": item_id, "text": f.read().strip()}
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(line_number))
+            item["id"] = str(item["id"])
+            if "text" not in item and "utterance" in item:
+                item["text"] = item.pop("utterance")
+            if item.get("audio"):
+                item["audio"] = os.path.join(base, item["audio"])
+            yield item
+
+
+def load_checkpoint(output: str) -> Set[str]:
+    """
+    Ids already processed successfully according to an earlier (possibly interrupted) run's output.
+    Failed items are not included, so a resumed run retries them; a torn last line is ignored.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+class BatchRunner:
+    """
+    Streams items through STT -> brain.jarvis_think -> WorkflowEngine on a thread pool and appends
+    one JSON line per item to the output as soon as it finishes. The output doubles as the checkpoint.
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY, execute: bool = True):
+        self.concurrency = concurrency
+        self.execute = execute
+        # WorkflowEngine tracks the running workflow's id and cancellation, so each worker gets its own
+        self._local = threading.local()
+        self.histogram = LatencyHistogram()
+        self.stats = {"ok": 0, "error": 0, "skipped": 0, "intent_checked": 0, "intent_mismatches": 0}
+
+    def _engine(self) -> WorkflowEngine:
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._local.engine = WorkflowEngine()
+        return engine
+
+    def transcribe(self, path: str) -> str:
+        with open(path, "rb") as audio_file:
+            return governor.call(
+                "transcription", client.audio.transcriptions.create,
+                model="whisper-1",
+                file=audio_file,
+                language="en"
+            ).text
+
+    def _execute(self, utterance: str, intent: Dict) -> Dict:
+        name = intent.get("intent")
+        target = intent.get("action") or ""
+        if name in INTENT_STEPS:
+            action, field, use_target = INTENT_STEPS[name]
+            workflow = Workflow(steps=[parse_action({"action": action, field: (target if use_target else "") or utterance})])
+            return self._engine().execute_workflow(workflow, user_utterance=utterance)
+        if name in DIRECT_INTENTS:
+            with span(f"action.{name}"):
+                result = DIRECT_INTENTS[name](utterance, target)
+            return {"workflow": None, "results": [{"action": name, "result": result}]}
+        raise ValueError(f"unknown intent {name!r}")
+
+    def process(self, item: Dict) -> Dict:
+        """
+        Run one item and return its output record; errors are captured in the record, not raised.
+        """
+        started = time.perf_counter()
+        record = {"id": item["id"], "status": "ok"}
+        # Fresh letter document per item so drafts never leak between unrelated utterances
+        actions.use_document(LetterDocument())
+        try:
+            with span("batch.item"):
+                if item.get("audio"):
+                    record["audio"] = item["audio"]
+                    with span("stt"):
+                        utterance = self.transcribe(item["audio"])
+                else:
+                    utterance = item.get("text") or ""
+                record["transcript"] = utterance
+                intent = jarvis_think(utterance)
+                record["intent"] = intent
+                if item.get("expected_intent"):
+                    record["intent_match"] = intent.get("intent") == item["expected_intent"]
+                if self.execute:
+                    record.update(self._execute(utterance, intent))
+        except Exception as e:
+            logger.error("batch: item %s failed: %s", item["id"], e)
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - started
+        self.histogram.record(elapsed)
+        record["elapsed"] = round(elapsed, 3)
+        return record
+
+    def run(self, source: str, output: str, resume: bool = False) -> Dict:
+        done = load_checkpoint(output) if resume else set()
+        if done:
+            logger.info("batch: resuming, %s items already done", len(done))
+        torn = resume and _ends_mid_line(output)
+        started = time.perf_counter()
+        in_flight = set()
+        with open(output, "a" if resume else "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="jarvis-batch") as pool:
+            if torn:
+                # The interrupted run died mid-write; start our records on a fresh line
+                out.write("\n")
+
+            def _drain():
+                nonlocal in_flight
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._write(out, future.result())
+
+            try:
+                for item in iter_items(source):
+                    if item["id"] in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    # Bounded window: read the input lazily instead of queueing the whole corpus
+                    while len(in_flight) >= self.concurrency * 2:
+                        _drain()
+                    in_flight.add(pool.submit(contextvars.copy_context().run, self.process, item))
+                while in_flight:
+                    _drain()
+            except KeyboardInterrupt:
+                logger.warning("batch: interrupted; %s items in flight will be retried on --resume", len(in_flight))
+                for future in in_flight:
+                    future.cancel()
+                raise
+        processed = self.stats["ok"] + self.stats["error"]
+        elapsed = time.perf_counter() - started
+        return {
+            **self.stats,
+            "wall_seconds": round(elapsed, 3),
+            "items_per_second": round(processed / elapsed, 2) if elapsed else None,
+            "latency": self.histogram.summary(),
+            "governor": {name: endpoint.stats for name, endpoint in governor.endpoints.items()},
+            "usage": meter.summary(),
+        }
+
+    def _write(self, out, record: Dict):
+        out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+        self.stats[record["status"]] += 1
+        if "intent_match" in record:
+            self.stats["intent_checked"] += 1
+            self.stats["intent_mismatches"] += not record["intent_match"]
+        processed = self.stats["ok"] + self.stats["error"]
+        if processed % PROGRESS_EVERY == 0:
+            logger.info("batch: %s items done (%s errors)", processed, self.stats["error"])
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file or directory of utterances/recordings through JARVIS.")
+    parser.add_argument("source", help="JSONL file or directory of audio/.txt files")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--resume", action="store_true", help="skip items the output already records as done")
+    parser.add_argument("--classify-only", action="store_true", help="transcribe and classify, but run no actions")
+    args = parser.parse_args(argv)
+    if os.path.exists(args.output) and os.path.getsize(args.output) and not args.resume:
+        parser.error(f"{args.output} already exists; pass --resume to continue it")
+
+    runner = BatchRunner(concurrency=args.concurrency, execute=not args.classify_only)
+    try:
+        summary = runner.run(args.source, args.output, resume=args.resume)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(json.dumps(summary, indent=2))
+    if summary["error"] or summary["intent_mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# Usage:
+# python batch.py commands.jsonl -o results.jsonl --concurrency 16
+# python batch.py recordings/ -o results.jsonl --classify-only
+# python batch.py commands.jsonl -o results.jsonl --resume   # after an interruption
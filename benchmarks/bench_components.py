@@ -0,0 +1,175 @@
+"""
+Component microbenchmarks: MemoryStore, Workflow validation, WorkflowEngine dispatch, letter edits
+and intent routing.
+Imported by benchmarks.run after the fake server is up and the OpenAI/Wolfram endpoints point at it.
+"""
+import json
+import os
+import tempfile
+from typing import Dict
+
+from benchmarks.harness import load_corpus, measure
+
+SAMPLE_WORKFLOW = {
+    "description": "Draft, revise and read back a letter",
+    "steps": [
+        {"action": "create_letter", "subject": "Quarterly results", "body": "Dear Alice, " + "the numbers look strong. " * 20},
+        {"action": "edit_letter", "edit_instruction": "Make it more formal"},
+        {"action": "read_letter"},
+        {"action": "perform_calculation", "query": "square root of 225"},
+        {"action": "transcribe_exactly", "text": "hello world"},
+    ],
+}
+
+
+def bench_memory_store(iterations: int) -> Dict:
+    from memory_store import MemoryStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = MemoryStore(path=os.path.join(tmp, "memory.jsonl"))
+        for i in range(1000):
+            memory.add("user" if i % 2 else "assistant", f"message {i} " + "context " * 20)
+        return {
+            "add": measure(lambda: memory.add("user", "Draft a letter to Alice"), iterations),
+            "summarize_20_of_1000": measure(lambda: memory.summarize(limit=20), iterations),
+        }
+
+
+# One valid step per action, cycled to build large workflows
+STEP_TEMPLATES = [
+    {"action": "create_letter", "subject": "Quarterly results", "body": "Dear Alice, the numbers look strong."},
+    {"action": "edit_letter", "edit_instruction": "Make it more formal"},
+    {"action": "undo_letter_edit"},
+    {"action": "read_letter"},
+    {"action": "clear_letter"},
+    {"action": "send_letter_via_email_macos", "to_email": "alice@example.com"},
+    {"action": "web_search", "query": "arc reactor"},
+    {"action": "transcribe_exactly", "text": "hello world"},
+    {"action": "perform_calculation", "query": "square root of 225"},
+    {"action": "handle_general_chat", "prompt": "How are you?"},
+    {"action": "open_application", "app_name": "Mail"},
+    {"action": "system_command", "command": "open Terminal"},
+    {"action": "discuss_programming", "text": "Explain Python generators"},
+]
+
+
+def generate_workflow(steps: int) -> Dict:
+    return {
+        "description": f"Generated {steps}-step workflow",
+        "steps": [dict(STEP_TEMPLATES[i % len(STEP_TEMPLATES)]) for i in range(steps)],
+    }
+
+
+def bench_workflow_validation(iterations: int) -> Dict:
+    from workflow_engine import WorkflowEngine
+    from workflow_models import Workflow, validate_workflow
+
+    engine = WorkflowEngine()
+    raw = json.dumps(SAMPLE_WORKFLOW)
+    results = {
+        "model_validate": measure(lambda: Workflow.model_validate(SAMPLE_WORKFLOW), iterations),
+        "model_validate_json": measure(lambda: Workflow.model_validate_json(raw), iterations),
+        "parse_raw_then_dict": measure(lambda: Workflow.model_validate(Workflow.parse_raw(raw).dict()), iterations),
+    }
+    for size in (100, 1000):
+        data = generate_workflow(size)
+        # Step 0 misses its body, so validation fails and reports the missing field
+        invalid = {**data, "steps": [{"action": "create_letter", "subject": "x"}] + data["steps"][1:]}
+        text = json.dumps(data)
+        workflow = Workflow.model_validate(data)
+        n = max(1, iterations // (size // 10))
+        results[f"generated_{size}_steps"] = {
+            "validate_python": measure(lambda: validate_workflow(data), n),
+            "validate_json": measure(lambda: validate_workflow(text), n),
+            # The engine's old invalid-workflow path validated twice (validate_workflow, then handle_missing_info)
+            "invalid_two_pass": measure(lambda: (engine.validate_workflow(invalid), engine.handle_missing_info(invalid)), n),
+            "invalid_single_pass": measure(lambda: engine.check_workflow(invalid), n),
+            "model_dump": measure(workflow.model_dump, n),
+            "model_dump_json": measure(workflow.model_dump_json, n),
+        }
+    return results
+
+
+def bench_engine_dispatch(iterations: int) -> Dict:
+    from workflow_engine import WorkflowEngine
+    from workflow_models import Workflow
+
+    engine = WorkflowEngine()
+    local_steps = Workflow.model_validate({"steps": [
+        {"action": "create_letter", "subject": "Bench", "body": "Body"},
+        {"action": "read_letter"},
+        {"action": "transcribe_exactly", "text": "hello"},
+        {"action": "clear_letter"},
+    ]})
+    remote_steps = Workflow.model_validate({"steps": [
+        {"action": "perform_calculation", "query": f"{n} * 3"} for n in range(3)
+    ]})
+
+    def _remote():
+        # Clear the memo so every iteration reaches the (fake) Wolfram endpoint
+        with engine._memo_lock:
+            engine._memo.clear()
+        engine.execute_workflow(remote_steps)
+
+    return {
+        "schedule_5_steps": measure(lambda: WorkflowEngine.schedule(Workflow.model_validate(SAMPLE_WORKFLOW).steps), iterations),
+        "execute_local_4_steps": measure(lambda: engine.execute_workflow(local_steps), iterations, warmup=1),
+        "execute_wolfram_3_steps": measure(_remote, max(1, iterations // 10), warmup=1),
+    }
+
+
+def bench_document_edit(iterations: int) -> Dict:
+    import actions
+    from document_store import LetterDocument
+
+    paragraphs = [f"Paragraph {n}: " + "the quarterly numbers look strong across every region. " * 6 for n in range(1, 41)]
+    content = "Subject: Quarterly results\n\n" + "\n\n".join(paragraphs)
+    document = LetterDocument(content)
+    actions.use_document(document)
+    instruction = "Tighten the wording of paragraph 12"
+    targets = [12]
+
+    def _full():
+        document.set_content(content)
+        actions._rewrite_letter(document, instruction)
+
+    def _patch():
+        document.set_content(content)
+        actions.edit_letter(instruction)
+
+    n = max(1, iterations // 10)
+    return {
+        "letter_chars": len(content),
+        # Prompt size is what the provider bills and what the model has to read
+        "full_rewrite_prompt_chars": len(content) + len(instruction),
+        "patch_prompt_chars": sum(len(m["content"]) for m in document.patch_messages(instruction, targets)),
+        "full_rewrite": measure(_full, n, warmup=1),
+        "patch": measure(_patch, n, warmup=1),
+        "undo": measure(lambda: (document.set_content(content), document.undo()), iterations),
+    }
+
+
+def bench_intent_routing(iterations: int) -> Dict:
+    import brain
+    from model_router import route
+
+    utterances = [turn["utterance"] for turn in load_corpus()]
+    cycle = iter(range(10 ** 9))
+
+    def _think():
+        brain.jarvis_think(utterances[next(cycle) % len(utterances)])
+
+    return {
+        "route": measure(lambda: route("intent", utterances[0]), iterations),
+        "jarvis_think": measure(_think, max(1, iterations // 10), warmup=1),
+    }
+
+
+def run(iterations: int = 200) -> Dict:
+    return {
+        "memory_store": bench_memory_store(iterations),
+        "workflow_validation": bench_workflow_validation(iterations),
+        "engine_dispatch": bench_engine_dispatch(iterations),
+        "document_edit": bench_document_edit(iterations),
+        "intent_routing": bench_intent_routing(iterations),
+    }
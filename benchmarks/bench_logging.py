@@ -0,0 +1,112 @@
+"""
+Measures the time logging adds to one JARVIS turn on the calling thread.
+
+Compares the old setup (synchronous FileHandler + StreamHandler, eager f-strings, full payloads
+at INFO) with logging_setup's QueueHandler/QueueListener and lazy %-style calls.
+
+    python -m benchmarks.bench_logging [--turns 2000]
+"""
+import argparse
+import io
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import time
+
+from logging_setup import DeferredQueueHandler, TruncatingFormatter
+
+FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Roughly the payloads main.py and WorkflowEngine log on a three-step turn
+WORKFLOW = {"steps": [
+    {"action": "create_letter", "subject": "Quarterly update", "body": "Dear team, " + "lorem ipsum " * 120},
+    {"action": "send_letter_via_email_macos", "recipient": "alice@example.com", "subject": "Quarterly update"},
+    {"action": "open_application", "app_name": "Mail"},
+]}
+MEMORY = "\n".join(f"user: message {i} " + "context " * 30 for i in range(20))
+RESULTS = {"results": [{"action": s["action"], "result": "ok " * 40, "status": "ok"} for s in WORKFLOW["steps"]]}
+
+
+def eager_turn(log: logging.Logger):
+    log.info(f"Transcribed audio: {'draft the quarterly update and mail it to alice'!r}")
+    log.info(f"Injecting memory into agent context: {MEMORY!r}")
+    log.info(f"validate_workflow called with: {WORKFLOW!r}")
+    log.info(f"execute_workflow called with workflow: {json.dumps(WORKFLOW)}")
+    for step in WORKFLOW["steps"]:
+        log.info(f"execute_workflow step: {step}")
+        log.info(f"execute_workflow step {step['action']} result: {RESULTS['results'][0]}")
+    log.info(f"Workflow execution result: {RESULTS}")
+
+
+def lazy_turn(log: logging.Logger):
+    log.info("Transcribed audio: %r", "draft the quarterly update and mail it to alice")
+    log.debug("Injecting memory into agent context: %r", MEMORY)
+    log.debug("validate_workflow called with: %r", WORKFLOW)
+    log.debug("execute_workflow called with workflow: %s", WORKFLOW)
+    for step in WORKFLOW["steps"]:
+        log.info("execute_workflow step: %s", step)
+        log.info("execute_workflow step %s result: %s", step["action"], RESULTS["results"][0])
+    log.info("Workflow execution result: %s", RESULTS)
+
+
+def _logger(name: str, handlers) -> logging.Logger:
+    log = logging.getLogger(f"bench.{name}")
+    log.handlers[:] = handlers
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    return log
+
+
+def _time_turns(turn, log: logging.Logger, turns: int) -> float:
+    start = time.perf_counter()
+    for _ in range(turns):
+        turn(log)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def run(turns: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_file = logging.FileHandler(os.path.join(tmp, "sync.log"))
+        sync_stream = logging.StreamHandler(io.StringIO())
+        for handler in (sync_file, sync_stream):
+            handler.setFormatter(logging.Formatter(FORMAT))
+        sync_us = _time_turns(eager_turn, _logger("sync", [sync_file, sync_stream]), turns)
+        sync_file.close()
+
+        formatter = TruncatingFormatter(FORMAT)
+        rotating = logging.handlers.RotatingFileHandler(
+            os.path.join(tmp, "queued.log"), maxBytes=5 * 1024 * 1024, backupCount=2
+        )
+        queued_stream = logging.StreamHandler(io.StringIO())
+        for handler in (rotating, queued_stream):
+            handler.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, rotating, queued_stream)
+        listener.start()
+        queued_us = _time_turns(lazy_turn, _logger("queued", [DeferredQueueHandler(log_queue)]), turns)
+        drain_start = time.perf_counter()
+        listener.stop()
+        drain_ms = (time.perf_counter() - drain_start) * 1e3
+        rotating.close()
+
+    return {
+        "turns": turns,
+        "sync_eager_us_per_turn": round(sync_us, 1),
+        "queued_lazy_us_per_turn": round(queued_us, 1),
+        "speedup": round(sync_us / queued_us, 1) if queued_us else None,
+        "listener_drain_ms": round(drain_ms, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.turns), indent=2))
+
+
+if __name__ == "__main__":
+    main()
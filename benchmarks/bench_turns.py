@@ -0,0 +1,166 @@
+"""
+End-to-end turn benchmark: replays the utterance corpus as audio clips through the same stages
+JarvisMainUI.process_turn runs (STT, memory, plan cache, agent, workflow engine, TTS), minus the
+microphone, Qt widgets and speakers. Per-stage latencies come from the tracing spans.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.harness import load_corpus, make_clip
+from metering import meter
+from tracing import span, tracer
+
+
+class HeadlessTurn:
+    def __init__(self, workdir: str, stream: bool = True):
+        from openai import OpenAI
+        from jarvis_agent import get_agent, JarvisDeps
+        from memory_store import MemoryStore
+        from plan_cache import PlanCache
+        from speech_queue import SpeechQueue
+        from tts_cache import TTSCache
+        from workflow_engine import WorkflowEngine
+
+        self.client = OpenAI(max_retries=0)
+        self.stream = stream
+        self.agent = get_agent()
+        self.agent_loop = asyncio.new_event_loop()
+        self.deps = JarvisDeps(user_name="Bench")
+        self.engine = WorkflowEngine()
+        self.memory = MemoryStore(path=os.path.join(workdir, "memory.jsonl"))
+        self.plan_cache = PlanCache(path=os.path.join(workdir, "plan_cache.json"))
+        self.speech = SpeechQueue(self.client, TTSCache(path=os.path.join(workdir, "tts")), player=lambda path: None)
+
+    def transcribe(self, audio_path: str) -> str:
+        from request_governor import governor
+
+        with open(audio_path, "rb") as audio_file:
+            return governor.call(
+                "transcription", self.client.audio.transcriptions.create,
+                model="whisper-1", file=audio_file, language="en"
+            ).text
+
+    def plan(self, prompt: str, transcript: str):
+        from jarvis_agent import record_prompt_cache_usage
+        from workflow_stream import StepDispatcher, stream_jarvis_response, split_sentences
+
+        if not self.stream:
+            with span("agent.plan"):
+                result = self.agent.run_sync(prompt, deps=self.deps)
+            record_prompt_cache_usage(result.usage())
+            output = result.output
+            if output and output.workflow and not output.ask:
+                self.engine.execute_workflow(output.workflow, user_utterance=transcript)
+            if output and output.response:
+                self.speech.add(output.response)
+            return output
+
+        dispatcher = StepDispatcher(self.engine, user_utterance=transcript)
+        spoken_offset = 0
+
+        def on_response_text(text, done):
+            nonlocal spoken_offset
+            sentences, spoken_offset = split_sentences(text, spoken_offset)
+            if done and text[spoken_offset:].strip():
+                sentences.append(text[spoken_offset:].strip())
+                spoken_offset = len(text)
+            for sentence in sentences:
+                self.speech.add(sentence)
+
+        self.speech.start_playback()
+        try:
+            with span("agent.plan", streaming=True):
+                output, usage = self.agent_loop.run_until_complete(stream_jarvis_response(
+                    self.agent, prompt, self.deps, on_step=dispatcher.dispatch, on_response_text=on_response_text
+                ))
+        except Exception:
+            dispatcher.abort()
+            raise
+        record_prompt_cache_usage(usage)
+        dispatcher.finish(output.workflow if output and not output.ask else None)
+        return output
+
+    def __call__(self, audio_path: str):
+        from jarvis_agent import context_prefix
+        from speculation import speculator
+
+        with span("turn"):
+            with span("stt"):
+                transcript = self.transcribe(audio_path)
+            with speculator.speculate(self.engine, transcript):
+                self.memory.add("user", transcript)
+                with span("memory.retrieve"):
+                    recent_memory = self.memory.summarize(limit=20)
+                prompt = f"{context_prefix(self.deps)}Recent memory:\n{recent_memory}\n\nUser: {transcript}"
+                with span("plan_cache.lookup") as lookup_span:
+                    cached_plan = self.plan_cache.lookup(transcript)
+                    lookup_span.set(hit=cached_plan is not None)
+                if cached_plan:
+                    workflow, response = cached_plan
+                    self.engine.execute_workflow(workflow, user_utterance=transcript)
+                    self.speech.add(response)
+                else:
+                    planning_start = time.perf_counter()
+                    output = self.plan(prompt, transcript)
+                    planning_seconds = time.perf_counter() - planning_start
+                    if output and output.ask:
+                        self.speech.add(output.ask)
+                    if output and output.workflow and not output.ask:
+                        self.plan_cache.learn(transcript, output.workflow, output.response, planning_seconds)
+            with span("tts.playback"):
+                self.speech.flush()
+
+
+def run(server, passes: int = 3, stream: bool = True) -> Dict:
+    """
+    Replay the corpus `passes` times; later passes show the effect of the plan and TTS caches.
+    """
+    from speculation import speculator
+
+    corpus = load_corpus()
+    meter.reset()
+    speculator.reset()
+    for counters in server.stats.values():
+        counters.update(requests=0, errors=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = []
+        for i, turn in enumerate(corpus):
+            server.plans[turn["utterance"]] = turn["plan"]
+            server.intents[turn["utterance"]] = turn["intent"]
+            if "calculation" in turn:
+                server.calculations[turn["calculation"]["query"]] = turn["calculation"]["answer"]
+            audio = make_clip(turn["utterance"])
+            server.register_audio(audio, turn["utterance"])
+            path = os.path.join(tmp, f"clip{i:02d}.wav")
+            with open(path, "wb") as f:
+                f.write(audio)
+            clips.append(path)
+
+        headless = HeadlessTurn(tmp, stream=stream)
+        per_pass = []
+        for _ in range(passes):
+            tracer.reset()
+            started = time.perf_counter()
+            for path in clips:
+                headless(path)
+            per_pass.append({
+                "wall_seconds": round(time.perf_counter() - started, 3),
+                "turn": tracer.summary().get("turn", {}),
+            })
+        return {
+            "turns_per_pass": len(clips),
+            "passes": passes,
+            "streaming": stream,
+            "per_pass": per_pass,
+            # Stage breakdown of the last pass, when the caches are warm
+            "stages": tracer.summary(),
+            "plan_cache_hit_rate": round(headless.plan_cache.hit_rate(), 3),
+            "server": {name: dict(counters) for name, counters in server.stats.items()},
+            # Tokens, audio and estimated cost per call site over all passes
+            "usage": meter.summary()["sites"],
+            # Prefetches started from the transcript while the agent planned, over all passes
+            "speculation": speculator.summary(),
+        }
@@ -0,0 +1,318 @@
+"""
+Local stand-in for the OpenAI chat / transcription / speech endpoints and the Wolfram|Alpha
+query API, so the pipeline can be benchmarked offline with controlled latency and errors.
+
+    server = FakeServer(profile="realistic").start()
+    os.environ["OPENAI_BASE_URL"] = server.openai_base_url
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, replace
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+
+@dataclass(frozen=True)
+class EndpointProfile:
+    latency: float = 0.0  # seconds before the first byte
+    jitter: float = 0.0  # +/- uniform seconds added to latency
+    chunk_delay: float = 0.0  # seconds between streamed chunks
+    error_rate: float = 0.0  # fraction of requests that fail
+    error_status: int = 500
+    retry_after: Optional[float] = None  # sent with 429s, in seconds
+
+
+_REALISTIC = {
+    "chat": EndpointProfile(latency=0.35, jitter=0.15, chunk_delay=0.01),
+    "transcription": EndpointProfile(latency=0.4, jitter=0.1),
+    "speech": EndpointProfile(latency=0.25, jitter=0.1),
+    "wolfram": EndpointProfile(latency=0.3, jitter=0.1),
+}
+
+PROFILES: Dict[str, Dict[str, EndpointProfile]] = {
+    "instant": {name: EndpointProfile() for name in _REALISTIC},
+    "realistic": _REALISTIC,
+    "flaky": {
+        **_REALISTIC,
+        "chat": replace(_REALISTIC["chat"], error_rate=0.1, error_status=429, retry_after=0.05),
+        "speech": replace(_REALISTIC["speech"], error_rate=0.05, error_status=500),
+    },
+}
+
+STREAM_CHUNK_CHARS = 24  # size of each streamed tool-call argument delta
+SPEECH_BYTES_PER_CHAR = 200  # roughly the size of tts-1 mp3 output
+
+
+class FakeServer:
+    """
+    Threaded HTTP server answering from canned data: plans and intents keyed by utterance,
+    transcripts keyed by the sha256 of the uploaded audio, Wolfram answers keyed by query.
+    """
+
+    def __init__(self, profile: str = "instant", host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.profiles = dict(PROFILES[profile])
+        self.plans: Dict[str, Dict] = {}
+        self.intents: Dict[str, Dict] = {}
+        self.transcripts: Dict[str, str] = {}
+        self.calculations: Dict[str, str] = {}
+        self.stats = {name: {"requests": 0, "errors": 0} for name in self.profiles}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.base_url}/v1"
+
+    @property
+    def wolfram_url(self) -> str:
+        return f"{self.base_url}/v2/query"
+
+    def register_audio(self, audio: bytes, transcript: str):
+        self.transcripts[hashlib.sha256(audio).hexdigest()] = transcript
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay_and_fault(self, endpoint: str) -> Optional[EndpointProfile]:
+        """
+        Sleep for the endpoint's latency; return the profile if this request should fail.
+        """
+        profile = self.profiles[endpoint]
+        with self._lock:
+            self.stats[endpoint]["requests"] += 1
+            delay = max(0.0, profile.latency + self._random.uniform(-profile.jitter, profile.jitter))
+            failed = self._random.random() < profile.error_rate
+            if failed:
+                self.stats[endpoint]["errors"] += 1
+        if delay:
+            time.sleep(delay)
+        return profile if failed else None
+
+    # --- canned responses ---
+
+    def plan_for(self, prompt: str) -> Dict:
+        # main.py's prompt ends with "User: <transcript>"; fall back to the whole message
+        utterance = prompt.rsplit("User:", 1)[-1].strip()
+        return self.plans.get(utterance, {"response": "Very well, sir."})
+
+    def intent_for(self, utterance: str) -> Dict:
+        return self.intents.get(utterance.strip(), {"intent": "general_chat", "action": utterance, "confidence": 0.9})
+
+    def chat_reply(self, messages) -> str:
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        if '"intent"' in str(system):
+            return json.dumps(self.intent_for(str(user)))
+        if "Paragraphs to edit:" in str(user):
+            # Patch edit: hand every given paragraph back unchanged
+            given = str(user).split("Paragraphs to edit:", 1)[1].split("Edit instruction:", 1)[0]
+            ops = [{"op": "replace", "paragraph": int(number), "text": text.strip()}
+                   for number, text in re.findall(r"^\[(\d+)\] (.*?)(?=^\[\d+\] |\Z)", given, re.M | re.S)]
+            return json.dumps({"ops": ops})
+        if "Edit instruction:" in str(user):
+            return str(user).split("Edit instruction:", 1)[0].replace("Current letter:", "").strip()
+        return "Certainly, sir. " + str(user)[:80]
+
+
+def _usage(prompt: str, completion: str) -> Dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _handler_for(server: FakeServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Streamed chunks are tiny; without TCP_NODELAY each one waits on a delayed ACK (~40ms)
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: Dict = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, payload: Dict, status: int = 200, headers: Dict = None):
+            self._send(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+        def _send_error(self, profile: EndpointProfile):
+            headers = {}
+            if profile.retry_after is not None:
+                headers["retry-after"] = str(profile.retry_after)
+            kind = "rate_limit_exceeded" if profile.error_status == 429 else "server_error"
+            self._send_json({"error": {"message": f"fake {kind}", "type": kind, "code": kind}},
+                            status=profile.error_status, headers=headers)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._body()
+            if path.endswith("/chat/completions"):
+                self._chat(json.loads(body))
+            elif path.endswith("/audio/transcriptions"):
+                self._transcription(body)
+            elif path.endswith("/audio/speech"):
+                self._speech(json.loads(body))
+            else:
+                self._send_json({"error": {"message": f"unknown path {path}"}}, status=404)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.endswith("/v2/query"):
+                self._wolfram(parse_qs(url.query))
+            else:
+                self._send_json({"error": {"message": f"unknown path {url.path}"}}, status=404)
+
+        # --- endpoints ---
+
+        def _chat(self, request: Dict):
+            fault = server._delay_and_fault("chat")
+            if fault:
+                return self._send_error(fault)
+            messages = request.get("messages", [])
+            prompt = "".join(str(m.get("content", "")) for m in messages)
+            tools = [t["function"]["name"] for t in request.get("tools") or []]
+            # pydantic_ai returns structured output through its "final_result" tool
+            output_tool = next((name for name in tools if name.startswith("final_result")), None)
+            if output_tool:
+                last_user = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+                arguments = json.dumps(server.plan_for(last_user))
+                message = {"role": "assistant", "content": None, "tool_calls": [{
+                    "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                    "function": {"name": output_tool, "arguments": arguments},
+                }]}
+                completion, finish_reason = arguments, "tool_calls"
+            else:
+                completion = server.chat_reply(messages)
+                message = {"role": "assistant", "content": completion}
+                finish_reason = "stop"
+            usage = _usage(prompt, completion)
+            if request.get("stream"):
+                return self._stream_chat(request, message, finish_reason, usage)
+            self._send_json({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def _stream_chat(self, request: Dict, message: Dict, finish_reason: str, usage: Dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": request.get("model", "gpt-4o")}
+            delay = server.profiles["chat"].chunk_delay
+
+            def emit(payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def delta(d, finish=None):
+                emit(json.dumps({**base, "choices": [{"index": 0, "delta": d, "finish_reason": finish}]}))
+
+            if message.get("tool_calls"):
+                call = message["tool_calls"][0]
+                arguments = call["function"]["arguments"]
+                delta({"role": "assistant", "tool_calls": [{"index": 0, "id": call["id"], "type": "function",
+                                                            "function": {"name": call["function"]["name"], "arguments": ""}}]})
+                for i in range(0, len(arguments), STREAM_CHUNK_CHARS):
+                    if delay:
+                        time.sleep(delay)
+                    delta({"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + STREAM_CHUNK_CHARS]}}]})
+            else:
+                content = message["content"]
+                delta({"role": "assistant", "content": ""})
+                for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                    if delay:
+                        time.sleep(delay)
+                    delta({"content": content[i:i + STREAM_CHUNK_CHARS]})
+            delta({}, finish=finish_reason)
+            if (request.get("stream_options") or {}).get("include_usage"):
+                emit(json.dumps({**base, "choices": [], "usage": usage}))
+            emit("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _transcription(self, body: bytes):
+            fault = server._delay_and_fault("transcription")
+            if fault:
+                return self._send_error(fault)
+            audio = _multipart_file(self.headers["Content-Type"], body)
+            text = server.transcripts.get(hashlib.sha256(audio).hexdigest(), "")
+            self._send_json({"text": text})
+
+        def _speech(self, request: Dict):
+            fault = server._delay_and_fault("speech")
+            if fault:
+                return self._send_error(fault)
+            text = request.get("input", "")
+            self._send(200, b"ID3" + b"\x00" * (SPEECH_BYTES_PER_CHAR * max(1, len(text))), content_type="audio/mpeg")
+
+        def _wolfram(self, params: Dict):
+            fault = server._delay_and_fault("wolfram")
+            if fault:
+                return self._send(fault.error_status, b"<queryresult success='false' error='true'/>", "text/xml")
+            query = (params.get("input") or [""])[0]
+            answer = escape(server.calculations.get(query, "42"))
+            xml = (
+                "<?xml version='1.0' encoding='UTF-8'?>"
+                "<queryresult success='true' error='false' numpods='2'>"
+                f"<pod title='Input interpretation' id='Input' position='100' numsubpods='1'>"
+                f"<subpod title=''><plaintext>{escape(query)}</plaintext></subpod></pod>"
+                "<pod title='Result' id='Result' position='200' primary='true' numsubpods='1'>"
+                f"<subpod title=''><plaintext>{answer}</plaintext></subpod></pod>"
+                "</queryresult>"
+            )
+            # wolframalpha.Client asserts on this exact header
+            self._send(200, xml.encode("utf-8"), content_type="text/xml;charset=utf-8")
+
+    return Handler
+
+
+def _multipart_file(content_type: str, body: bytes, field: str = "file") -> bytes:
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == field:
+            return part.get_payload(decode=True) or b""
+    return b""
@@ -0,0 +1,108 @@
+"""
+Shared helpers for the benchmark suites: timing, corpus loading, synthetic audio clips,
+run metadata and result comparison.
+"""
+import io
+import json
+import math
+import os
+import platform
+import struct
+import subprocess
+import sys
+import time
+import wave
+from typing import Callable, Dict, List
+
+from tracing import LatencyHistogram
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), "corpus", "turns.jsonl")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SAMPLE_RATE = 16000
+# Summary fields compared between runs; all are "lower is better"
+COMPARED_FIELDS = ("p50_ms", "p95_ms")
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 0) -> Dict[str, float]:
+    """
+    Call fn() iterations times and summarize the per-call latency.
+    """
+    for _ in range(warmup):
+        fn()
+    histogram = LatencyHistogram()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        histogram.record(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return {**histogram.summary(), "ops_per_sec": round(iterations / elapsed, 1) if elapsed else None}
+
+
+def load_corpus(path: str = CORPUS_FILE) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_clip(text: str, seconds_per_word: float = 0.35) -> bytes:
+    """
+    Deterministic 16 kHz mono WAV whose length tracks the utterance, standing in for a recording.
+    """
+    frames = int(SAMPLE_RATE * max(0.5, seconds_per_word * len(text.split())))
+    pitch = 180 + sum(map(ord, text)) % 120
+    samples = b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * pitch * i / SAMPLE_RATE))) for i in range(frames)
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(SAMPLE_RATE)
+        clip.writeframes(samples)
+    return buffer.getvalue()
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _latency_rows(results: Dict, prefix: str = ""):
+    # Yield (dotted.path, summary) for every nested dict that looks like a latency summary
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        path = f"{prefix}{key}"
+        if all(field in value for field in COMPARED_FIELDS):
+            yield path, value
+        else:
+            yield from _latency_rows(value, f"{path}.")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.10, min_delta_ms: float = 1.0) -> List[str]:
+    """
+    Return a line per latency that got more than threshold (fractional) and min_delta_ms slower
+    than baseline; the absolute floor keeps sub-millisecond jitter from being reported.
+    """
+    previous = dict(_latency_rows(baseline.get("suites", {})))
+    regressions = []
+    for path, summary in _latency_rows(current.get("suites", {})):
+        before = previous.get(path)
+        if not before:
+            continue
+        for field in COMPARED_FIELDS:
+            old, new = before.get(field) or 0.0, summary.get(field) or 0.0
+            if old > 0 and new > old * (1 + threshold) and new - old >= min_delta_ms:
+                regressions.append(f"{path} {field}: {old:.3f} -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
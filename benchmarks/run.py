@@ -0,0 +1,95 @@
+"""
+Offline benchmark runner. Starts the fake OpenAI/Wolfram server, points the app at it and runs
+the selected suites, writing one machine-readable JSON file per run.
+
+    python -m benchmarks.run                                 # all suites, instant profile
+    python -m benchmarks.run --suite e2e --profile realistic
+    python -m benchmarks.run --compare benchmarks/results/baseline.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.fake_server import PROFILES, FakeServer
+from benchmarks.harness import RESULTS_DIR, compare, environment
+
+SUITES = ("micro", "e2e", "logging")
+# Rate limits high enough that the governor never throttles the benchmark itself
+UNTHROTTLED_LIMITS = {
+    name: {"requests_per_minute": 1_000_000, "tokens_per_minute": 0, "max_concurrency": 64}
+    for name in ("chat", "transcription", "speech")
+}
+
+
+def _point_app_at(server: FakeServer, governed: bool):
+    # Clients are created at import time, so the environment must be set before the app is imported
+    os.environ["OPENAI_BASE_URL"] = server.openai_base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["WOLFRAM_APP_ID"] = "benchmark"
+    import actions
+    from request_governor import RequestGovernor, governor
+    from tracing import tracer
+
+    actions.wolfram_client.url = server.wolfram_url
+    if not governed:
+        governor.endpoints = RequestGovernor(UNTHROTTLED_LIMITS).endpoints
+    tracer.enabled = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline JARVIS benchmarks.")
+    parser.add_argument("--suite", choices=SUITES + ("all",), default="all")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="instant",
+                        help="latency/error profile of the fake server")
+    parser.add_argument("--iterations", type=int, default=200, help="iterations per microbenchmark")
+    parser.add_argument("--passes", type=int, default=3, help="replays of the turn corpus")
+    parser.add_argument("--no-stream", action="store_true", help="plan turns with run_sync instead of streaming")
+    parser.add_argument("--governed", action="store_true", help="keep the production rate limits")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+    suites = SUITES if args.suite == "all" else (args.suite,)
+
+    results = {
+        "schema": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "profile": args.profile,
+        "environment": environment(),
+        "suites": {},
+    }
+    with FakeServer(profile=args.profile) as server:
+        _point_app_at(server, args.governed)
+        from tracing import tracer
+
+        if "micro" in suites:
+            from benchmarks import bench_components
+            tracer.reset()
+            results["suites"]["micro"] = bench_components.run(args.iterations)
+        if "e2e" in suites:
+            from benchmarks import bench_turns
+            results["suites"]["e2e"] = bench_turns.run(server, passes=args.passes, stream=not args.no_stream)
+        if "logging" in suites:
+            from benchmarks import bench_logging
+            results["suites"]["logging"] = bench_logging.run(args.iterations * 10)
+        tracer.enabled = False
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,48 @@
 from openai import OpenAI
+from model_router import routed_completion, MIN_CONFIDENCE
 import os
 import json
 from dotenv import load_dotenv
+from tracing import traced
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 
+INTENTS = ["general_chat", "open_application", "web_search", "system_command", "calculation", "get_news", "get_weather"]
+
+
+def _valid_intent(content):
+    # Escalate to the strong model when the fast one returns malformed JSON, an unknown intent or low confidence
+    data = json.loads(content)
+    return data.get("intent") in INTENTS and float(data.get("confidence", 1.0)) >= MIN_CONFIDENCE
+
+
+@traced("brain.think")
 def jarvis_think(user_command):
     """
     Uses GPT to classify the user's intent and generate a JSON command for J.A.R.V.I.S. to execute.
     """
     system_prompt = '''
-You are J.A.R.V.I.S., an AI assistant. Analyze the user's command and output a JSON object with two fields:
+You are J.A.R.V.I.S., an AI assistant. Analyze the user's command and output a JSON object with three fields:
 - "intent": The category of the command. Choose from: ["general_chat", "open_application", "web_search", "system_command", "calculation", "get_news", "get_weather"].
 - "action": The specific action to take. For example, if the intent is "open_application", the action should be the app name like "chrome", "spotify", or "notepad".
+- "confidence": A number from 0 to 1 for how sure you are about the intent.
 
 Example Input: "Open Chrome and find me recipes for pizza"
-Example Output: {"intent": "open_application", "action": "chrome"}
+Example Output: {"intent": "open_application", "action": "chrome", "confidence": 0.95}
 
 Example Input: "What's the square root of 225?"
-Example Output: {"intent": "calculation", "action": "square root of 225"}
+Example Output: {"intent": "calculation", "action": "square root of 225", "confidence": 0.98}
     '''
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
+    response = routed_completion(
+        client, "intent",
+        hedge=True,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_command}
         ],
+        validate=_valid_intent,
         temperature=0
     )
     # Parse the JSON response from GPT
@@ -0,0 +1,215 @@
+import re
+import json
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+from pydantic import BaseModel, ValidationError
+
+HISTORY_LIMIT = 50  # versions kept for undo
+OUTLINE_CHARS = 40  # characters of each untouched paragraph shown to the model in patch edits
+# Letters up to this size are rewritten whole; a patch round trip is not worth it below this
+FULL_EDIT_CHARS = 1500
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+             "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10}
+_PARAGRAPH_NUMBER = re.compile(r"\b(?:paragraphs?|para)\s+(\d+)(?:\s*(?:-|to|and)\s*(\d+))?", re.I)
+_PARAGRAPH_ORDINAL = re.compile(r"\b(" + "|".join(_ORDINALS) + r"|last|final|penultimate)\s+paragraph", re.I)
+_QUOTED = re.compile(r"[\"“]([^\"”]{4,})[\"”]")
+
+PATCH_SYSTEM_PROMPT = (
+    "You edit one part of a letter. You get an outline of the whole letter and the full text of the "
+    "paragraphs you may change. Reply with only a JSON object "
+    '{"ops": [{"op": "replace" | "insert_after" | "delete", "paragraph": <number>, "text": <new text>}]}. '
+    "Paragraph numbers refer to the outline. Only replace or delete the paragraphs given in full; "
+    "insert_after may use one of them, or the number just before one (0 inserts at the top)."
+)
+
+
+def split_paragraphs(content: str) -> Tuple[str, ...]:
+    return tuple(p.strip() for p in _PARAGRAPH_BREAK.split(content.strip()) if p.strip())
+
+
+class PatchOp(BaseModel):
+    op: Literal["replace", "insert_after", "delete"]
+    paragraph: int  # 1-based, as numbered in the outline
+    text: str = ""
+
+
+class DocumentPatch(BaseModel):
+    ops: List[PatchOp]
+
+
+class PatchError(ValueError):
+    pass
+
+
+class LetterDocument:
+    """
+    The letter the document actions work on, kept as paragraphs with a bounded version history.
+    Every change goes through commit(), so create, edit and clear can all be undone.
+    """
+
+    def __init__(self, content: str = "", history_limit: int = HISTORY_LIMIT):
+        self._lock = threading.RLock()
+        self._paragraphs = split_paragraphs(content)
+        self._undo: deque = deque(maxlen=history_limit)
+        self._redo: List[Tuple[Tuple[str, ...], str, int]] = []
+        self.version = 0
+        self.label = "initial"
+
+    @property
+    def paragraphs(self) -> Tuple[str, ...]:
+        return self._paragraphs
+
+    @property
+    def content(self) -> str:
+        return "\n\n".join(self._paragraphs)
+
+    def set_content(self, content: str, label: str = "replace"):
+        self.commit(split_paragraphs(content), label)
+
+    def commit(self, paragraphs: Sequence[str], label: str):
+        with self._lock:
+            # Paragraphs are immutable strings, so versions share them instead of copying the text
+            self._undo.append((self._paragraphs, self.label, self.version))
+            self._redo.clear()
+            self._paragraphs = tuple(paragraphs)
+            self.version += 1
+            self.label = label
+
+    def undo(self) -> Optional[str]:
+        """
+        Restore the previous version; returns the label of the change undone, or None if there is none.
+        """
+        with self._lock:
+            if not self._undo:
+                return None
+            undone = self.label
+            self._redo.append((self._paragraphs, self.label, self.version))
+            self._paragraphs, self.label, self.version = self._undo.pop()
+            return undone
+
+    def redo(self) -> Optional[str]:
+        with self._lock:
+            if not self._redo:
+                return None
+            self._undo.append((self._paragraphs, self.label, self.version))
+            self._paragraphs, self.label, self.version = self._redo.pop()
+            return self.label
+
+    def history(self) -> List[Dict]:
+        with self._lock:
+            entries = [{"version": v, "label": label, "paragraphs": len(p)} for p, label, v in self._undo]
+            return entries + [{"version": self.version, "label": self.label, "paragraphs": len(self._paragraphs)}]
+
+    # --- incremental edits ---
+
+    def outline(self, expanded: Iterable[int] = (), width: int = OUTLINE_CHARS) -> str:
+        """
+        One numbered line per paragraph, truncated to width; paragraphs in expanded are marked, not truncated.
+        """
+        expanded = set(expanded)
+        lines = []
+        for number, paragraph in enumerate(self._paragraphs, 1):
+            if number in expanded:
+                lines.append(f"[{number}] (given in full below)")
+            else:
+                flat = " ".join(paragraph.split())
+                lines.append(f"[{number}] {flat[:width]}{'…' if len(flat) > width else ''}")
+        return "\n".join(lines)
+
+    def patch_messages(self, instruction: str, targets: Sequence[int]) -> List[Dict]:
+        """
+        Chat messages for a patch edit: the outline plus only the target paragraphs in full.
+        """
+        full = "\n\n".join(f"[{n}] {self._paragraphs[n - 1]}" for n in targets)
+        user = (
+            f"Outline:\n{self.outline(targets)}\n\n"
+            f"Paragraphs to edit:\n{full}\n\n"
+            f"Edit instruction: {instruction}"
+        )
+        return [{"role": "system", "content": PATCH_SYSTEM_PROMPT}, {"role": "user", "content": user}]
+
+    def parse_patch(self, content: str, targets: Sequence[int]) -> DocumentPatch:
+        """
+        Parse the model's reply and check it only touches the target paragraphs; raises PatchError.
+        """
+        try:
+            # strict=False: models often put raw newlines inside the replacement text
+            patch = DocumentPatch.model_validate(json.loads(_strip_fence(content), strict=False))
+        except json.JSONDecodeError as e:
+            raise PatchError(f"patch is not JSON: {e}") from e
+        except ValidationError as e:
+            raise PatchError(f"invalid patch: {e.errors(include_url=False)}") from e
+        allowed = set(targets)
+        for op in patch.ops:
+            if op.op == "insert_after":
+                ok = op.paragraph in allowed or op.paragraph + 1 in allowed
+            else:
+                ok = op.paragraph in allowed
+            if not ok or not 0 <= op.paragraph <= len(self._paragraphs):
+                raise PatchError(f"patch {op.op} on paragraph {op.paragraph} is outside the editable paragraphs {sorted(allowed)}")
+        return patch
+
+    def apply_patch(self, patch: DocumentPatch, label: str = "patch"):
+        """
+        Apply ops (numbered against the current version) and commit the result as a new version.
+        """
+        with self._lock:
+            replaced: Dict[int, Optional[str]] = {}
+            inserted: Dict[int, List[str]] = {}
+            for op in patch.ops:
+                if op.op == "replace":
+                    replaced[op.paragraph] = op.text.strip()
+                elif op.op == "delete":
+                    replaced[op.paragraph] = None
+                else:
+                    inserted.setdefault(op.paragraph, []).append(op.text.strip())
+            paragraphs = [p for text in inserted.get(0, []) for p in split_paragraphs(text)]
+            for number, paragraph in enumerate(self._paragraphs, 1):
+                paragraph = replaced.get(number, paragraph)
+                if paragraph:
+                    paragraphs.extend(split_paragraphs(paragraph))
+                for text in inserted.get(number, []):
+                    paragraphs.extend(split_paragraphs(text))
+            self.commit(paragraphs, label)
+
+
+def _strip_fence(content: str) -> str:
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[-1].rsplit("```", 1)[0]
+    return content
+
+
+def affected_paragraphs(instruction: str, paragraphs: Sequence[str]) -> List[int]:
+    """
+    1-based numbers of the paragraphs an instruction clearly points at ("paragraph 3", "the last
+    paragraph", "the subject", a quoted phrase). Empty when it does not single any out, e.g.
+    "make it more formal", which needs the whole letter.
+    """
+    count = len(paragraphs)
+    found = set()
+    for match in _PARAGRAPH_NUMBER.finditer(instruction):
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        # "paragraphs 3-1" and "paragraphs 2 to 999999999" must not build huge or empty ranges
+        found.update(range(max(1, min(start, end)), min(max(start, end), count) + 1))
+    for match in _PARAGRAPH_ORDINAL.finditer(instruction):
+        word = match.group(1).lower()
+        found.add(count if word in ("last", "final") else count - 1 if word == "penultimate" else _ORDINALS[word])
+    lowered = instruction.lower()
+    if "subject" in lowered:
+        found.update(n for n, p in enumerate(paragraphs, 1) if p.lower().startswith("subject:"))
+    if any(word in lowered for word in ("sign-off", "signoff", "signature", "closing")):
+        found.add(count)
+    for phrase in _QUOTED.findall(instruction):
+        found.update(n for n, p in enumerate(paragraphs, 1) if phrase.lower() in p.lower())
+    return sorted(n for n in found if 1 <= n <= count)
+
+# Usage:
+# document = LetterDocument("Subject: Hi\n\nDear Bob,\n\nThanks.")
+# targets = affected_paragraphs("Reword paragraph 3", document.paragraphs)
+# document.apply_patch(document.parse_patch(model_reply, targets), label="edit")
+# document.undo()
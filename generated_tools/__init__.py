@@ -0,0 +1,4 @@
+"""
+Tools written by auto_tool_generation.auto_generate_tool, one module per tool.
+Modules here are created at runtime and loaded individually; see auto_tool_generation.get_generated_tool.
+"""
@@ -1,6 +1,10 @@
 import datetime
-from pydantic_ai import Agent, RunContext
+import threading
+from functools import lru_cache
+from pydantic_ai import Agent, RunContext, Tool
 from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
+import httpx
 from pydantic import BaseModel, Field
 from workflow_models import Workflow
 import os
@@ -8,6 +12,9 @@ import subprocess
 from dotenv import load_dotenv
 load_dotenv()
 from logging_setup import logger
+from model_router import route
+from metering import meter
+from request_governor import governor, GovernedTransport
 
 
 # --- System Prompt: Proactive, Context-Aware, Workflow-Driven ---
@@ -19,7 +26,10 @@ You are Jarvis, an advanced AI agent. You proactively help the user, anticipate
 - You maintain and summarize conversation and workflow history, and use it to inform your actions.
 - You can discover and propose new subtasks, orchestrate their execution, and report results in a concise, non-chatty, structured manner.
 - For every workflow, output the JSON, then execute and report results as JSON.
+Mission: Proactively assist, plan, and execute user tasks as workflows.
 """
+# The system prompt must stay byte-identical across runs so the provider can reuse its
+# prompt-prefix cache. Per-run details (user, time) go into the user message via context_prefix().
 
 # --- Agent Output Model ---
 class JarvisResponse(BaseModel):
@@ -35,29 +45,8 @@ class JarvisDeps:
         self.email_address = email_address
         self.current_time = datetime.datetime.now
 
-# --- Agent Setup ---
-logger.info("Instantiating JARVIS agent")
-jarvis = Agent(
-    model="gpt-4o",
-    deps_type=JarvisDeps,
-    output_type=JarvisResponse,
-    system_prompt=JARVIS_SYSTEM_PROMPT
-)
-logger.info("JARVIS agent instantiated")
+# --- Tools (registered in get_tools(); see actions.py for actual implementations) ---
 
-# --- Dynamic Context Injection ---
-@jarvis.system_prompt
-def add_context(ctx: RunContext[JarvisDeps]) -> str:
-    return f"""
-    Current user: {ctx.deps.user_name}
-    Current time: {ctx.deps.current_time()}
-    Mission: Proactively assist, plan, and execute user tasks as workflows.
-    """
-
-# --- Example: Tool Registration (see actions.py for actual implementations) ---
-
-
-@jarvis.tool
 def send_email(
     ctx: RunContext[JarvisDeps],
     recipient: str,
@@ -80,7 +69,7 @@ def send_email(
     Returns:
         Status message indicating success or failure.
     """
-    logger.info(f"send_email tool called: recipient={recipient}, subject={subject}, attachments={attachments}")
+    logger.info("send_email tool called: recipient=%s, subject=%s, attachments=%s", recipient, subject, attachments)
     applescript = f'''
     tell application "Mail"
         activate
@@ -101,14 +90,13 @@ def send_email(
     end tell
     '''
     try:
-        subprocess.run(["osascript", "-e", applescript], check=True)
-        logger.info(f"send_email success for {recipient}")
+        subprocess.run(["osascript", "-e", applescript], check=True, timeout=15)
+        logger.info("send_email success for %s", recipient)
         return f"Email draft created in Mail.app for {recipient}. Please review and send."
     except Exception as e:
-        logger.error(f"send_email error: {e}")
+        logger.error("send_email error: %s", e)
         return f"Failed to create email: {e}"
 
-@jarvis.tool
 def create_letter(
     ctx: RunContext[JarvisDeps],
     subject: str,
@@ -125,15 +113,100 @@ def create_letter(
     Returns:
         Status message indicating success or failure.
     """
-    logger.info(f"create_letter tool called: subject={subject}")
+    logger.info("create_letter tool called: subject=%s", subject)
     desktop = os.path.join(os.path.expanduser("~"), "Desktop")
     filename = f"Letter_{subject.replace(' ', '_')}.txt"
     path = os.path.join(desktop, filename)
     try:
         with open(path, "w") as f:
             f.write(f"Subject: {subject}\n\n{body}")
-        logger.info(f"create_letter success: {path}")
+        logger.info("create_letter success: %s", path)
         return f"Letter created at {path}"
     except Exception as e:
-        logger.error(f"create_letter error: {e}")
-        return f"Failed to create letter: {e}"
\ No newline at end of file
+        logger.error("create_letter error: %s", e)
+        return f"Failed to create letter: {e}"
+
+# --- Agent Setup (deferred until first use) ---
+_agent = None
+_agent_lock = threading.Lock()
+
+# Running totals of prompt tokens served from the provider's prefix cache
+PROMPT_CACHE_STATS = {"runs": 0, "cached_tokens": 0, "uncached_tokens": 0}
+
+
+@lru_cache(maxsize=1)
+def get_tools() -> tuple:
+    """
+    Build the tool definitions once; their JSON schemas are generated here and reused by every agent.
+    """
+    return (
+        Tool(send_email, takes_ctx=True),
+        Tool(create_letter, takes_ctx=True),
+    )
+
+
+def build_agent() -> Agent:
+    logger.info("Instantiating JARVIS agent")
+    # Planning is the largest chat consumer, so its requests share the governor's chat budget:
+    # the provider's HTTP client goes through the same buckets and adaptive window as governed calls
+    http_client = httpx.AsyncClient(
+        transport=GovernedTransport(governor.endpoints["chat"]), timeout=httpx.Timeout(600, connect=5)
+    )
+    agent = Agent(
+        model=OpenAIModel(route("plan"), provider=OpenAIProvider(http_client=http_client)),
+        deps_type=JarvisDeps,
+        output_type=JarvisResponse,
+        system_prompt=JARVIS_SYSTEM_PROMPT,
+        tools=get_tools()
+    )
+    logger.info("JARVIS agent instantiated")
+    return agent
+
+
+def get_agent() -> Agent:
+    """
+    Return the shared JARVIS agent, building it on first use. Agent runs do not share state,
+    so one instance serves concurrent sessions.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = build_agent()
+    return _agent
+
+
+def __getattr__(name):
+    # Keep `from jarvis_agent import jarvis` working without building the agent at import time.
+    if name == "jarvis":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# --- Dynamic Context Injection ---
+def context_prefix(deps: JarvisDeps) -> str:
+    """
+    Per-run context that used to live in a dynamic system prompt; prepend it to the user message.
+    """
+    return f"Current user: {deps.user_name}\nCurrent time: {deps.current_time():%Y-%m-%d %H:%M}\n\n"
+
+
+def record_prompt_cache_usage(usage) -> dict:
+    """
+    Log cached vs. uncached prompt tokens for one run (pydantic_ai RunUsage) and update PROMPT_CACHE_STATS.
+    """
+    cached = getattr(usage, "cache_read_tokens", 0) or 0
+    uncached = max((getattr(usage, "input_tokens", 0) or 0) - cached, 0)
+    # Agent runs are limited by the governor's transport but metered here, from the run's own usage
+    meter.record("agent.plan", route("plan"), prompt_tokens=cached + uncached,
+                 completion_tokens=getattr(usage, "output_tokens", 0) or 0, cached_tokens=cached)
+    PROMPT_CACHE_STATS["runs"] += 1
+    PROMPT_CACHE_STATS["cached_tokens"] += cached
+    PROMPT_CACHE_STATS["uncached_tokens"] += uncached
+    total = PROMPT_CACHE_STATS["cached_tokens"] + PROMPT_CACHE_STATS["uncached_tokens"]
+    hit_ratio = PROMPT_CACHE_STATS["cached_tokens"] / total if total else 0.0
+    logger.info(
+        "Prompt tokens this run: cached=%s uncached=%s; cumulative cache hit ratio %.1f%% over %s runs",
+        cached, uncached, hit_ratio * 100, PROMPT_CACHE_STATS["runs"]
+    )
+    return {"cached_tokens": cached, "uncached_tokens": uncached}
@@ -8,20 +8,24 @@ import requests
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QTextEdit
 from PyQt5.QtCore import Qt
 from openai import OpenAI
+from request_governor import governor
+from model_router import routed_completion
 import actions
 from dotenv import load_dotenv
 import json
-from workflow_models import Workflow, ValidationError
+from workflow_models import Workflow, validate_workflow
+from tts_cache import TTSCache
 
 # Load environment variables
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
 # Audio recording parameters
 SAMPLE_RATE = 16000
 CHANNELS = 1
 DURATION = 8  # seconds max per utterance
+WORKFLOW_SCHEMA = json.dumps(Workflow.model_json_schema(), indent=2)
 
 class JarvisVoice(QWidget):
     def __init__(self):
@@ -44,6 +48,8 @@ class JarvisVoice(QWidget):
         self.conversation = [
             {"role": "system", "content": "You are JARVIS, an AI assistant. Respond as a helpful, witty, and loyal digital butler. Always reply in English, regardless of the user's language. Your name is JARVIS. You can help with any task, including writing, editing, searching, programming, and more. Be fast, concise, and conversational. If a user asks for a multi-step task, output the workflow as a JSON object, then execute it step by step, reporting results. If info is missing, ask for it."}
         ]
+        self.tts_cache = TTSCache()
+        self.tts_cache.warm_up(client)
         self.button.pressed.connect(self.start_recording)
         self.button.released.connect(self.stop_recording)
 
@@ -87,7 +93,8 @@ class JarvisVoice(QWidget):
 
     def transcribe_audio(self, wav_path):
         with open(wav_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
+            transcript = governor.call(
+                "transcription", client.audio.transcriptions.create,
                 model="whisper-1",
                 file=audio_file,
                 language="en"
@@ -127,35 +134,28 @@ class JarvisVoice(QWidget):
         elif "workflow" in text or "do these steps" in text or "multi-step" in text:
             workflow_json = self.ask_for_workflow_json(user_text)
             self.text_area.append(f"<b>Workflow JSON:</b>\n{workflow_json}")
-            # Validate and execute workflow using Pydantic
-            try:
-                wf = Workflow.parse_raw(workflow_json)
-            except ValidationError as e:
-                return f"Invalid workflow: {e}"
+            # Validated (once) and executed by actions.execute_workflow
             return actions.execute_workflow(workflow_json)
         # General chat
         else:
             return actions.handle_general_chat(user_text)
 
     def ask_for_workflow_json(self, user_text):
-        prompt = f"User request: {user_text}\n\nOutput a JSON object describing the workflow steps needed to accomplish this task. Each step should have an 'action' and relevant parameters. Only output the JSON. Use this JSON schema:\n{Workflow.schema_json(indent=2)}"
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
+        # The schema goes in the system message: routing measures only the user's request,
+        # so short requests stay on the fast model and escalate only if the Workflow won't parse
+        instructions = f"Output a JSON object describing the workflow steps needed to accomplish the user's request. Each step should have an 'action' and relevant parameters. Only output the JSON. Use this JSON schema:\n{WORKFLOW_SCHEMA}"
+        response = routed_completion(
+            client, "workflow_json",
+            messages=[{"role": "system", "content": instructions},
+                      {"role": "user", "content": f"User request: {user_text}"}],
+            validate=lambda content: validate_workflow(content)[0] is not None,
             temperature=0
         )
         return response.choices[0].message.content
 
     def speak_response(self, text):
-        tts_response = client.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=text
-        )
         import subprocess
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-            f.write(tts_response.content)
-            mp3_path = f.name
+        mp3_path = self.tts_cache.synthesize(client, text)
         subprocess.run(["afplay", mp3_path])
 
 if __name__ == "__main__":
@@ -1,18 +1,80 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
+LOG_LEVEL = os.getenv("JARVIS_LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = 5 * 1024 * 1024  # rotate app.log at this size
+LOG_BACKUP_COUNT = 5  # compressed app.log.N.gz files kept
+MAX_MESSAGE_CHARS = 2000  # longer messages (workflow reprs, memory dumps) are truncated
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
+
+class TruncatingFormatter(logging.Formatter):
+    """
+    Formatter that caps the rendered message so large payloads cannot flood the log.
+    """
+
+    def formatMessage(self, record):
+        message = record.message
+        if len(message) > MAX_MESSAGE_CHARS:
+            record.message = f"{message[:MAX_MESSAGE_CHARS]}... [{len(message) - MAX_MESSAGE_CHARS} chars truncated]"
+        return super().formatMessage(record)
+
+
+# Arguments of these types cannot change between the log call and formatting on the listener thread
+IMMUTABLE_ARG_TYPES = (str, bytes, int, float, complex, bool, type(None))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched, so %-style message formatting
+    happens on the listener thread instead of in the caller. Records with mutable arguments
+    (dicts, lists, models) are formatted here, so the log shows them as they were at the call.
+    """
+
+    def prepare(self, record):
+        args = record.args or ()
+        # LogRecord unwraps a lone dict argument into record.args itself, and a dict is mutable
+        if isinstance(args, dict) or not all(isinstance(value, IMMUTABLE_ARG_TYPES) for value in args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+formatter = TruncatingFormatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+file_handler = logging.handlers.RotatingFileHandler(
+    LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+)
+file_handler.namer = lambda name: f"{name}.gz"
+file_handler.rotator = gzip_rotator
+file_handler.setFormatter(formatter)
+
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(formatter)
+
+# Callers only put records on this queue; file and console I/O happen on the listener thread
+log_queue = queue.SimpleQueue()
+listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
 logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding="utf-8"),
-        logging.StreamHandler()
-    ]
+    level=LOG_LEVEL,
+    handlers=[DeferredQueueHandler(log_queue)]
 )
 
-logger = logging.getLogger("jarvis")
\ No newline at end of file
+logger = logging.getLogger("jarvis")
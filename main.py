@@ -1,5 +1,7 @@
 import sys
 import os
+import asyncio
+import time
 import queue
 import sounddevice as sd
 import numpy as np
@@ -8,19 +10,31 @@ from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QLa
 from PyQt5.QtCore import Qt
 from dotenv import load_dotenv
 from openai import OpenAI
+from pydantic_ai.exceptions import UnexpectedModelBehavior
 from logging_setup import logger
+from request_governor import governor
+from tracing import span
 
-from jarvis_agent import jarvis, JarvisDeps
+from jarvis_agent import get_agent, JarvisDeps, JarvisResponse, context_prefix, record_prompt_cache_usage
 from workflow_engine import WorkflowEngine
-from workflow_models import Workflow, ValidationError
+from workflow_models import Workflow, ValidationError, plan_errors
 from memory_store import MemoryStore
+from plan_cache import PlanCache
+from app_index import app_index
+from tts_cache import TTSCache
+from speech_queue import SpeechQueue
+from workflow_stream import StepDispatcher, stream_jarvis_response, split_sentences
+from speculation import speculator
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
 SAMPLE_RATE = 16000
 CHANNELS = 1
+# Stream the agent's structured output so workflow steps and speech start before the plan is complete.
+# Set JARVIS_STREAM_AGENT=0 to fall back to a single blocking run_sync call.
+STREAM_AGENT = os.getenv("JARVIS_STREAM_AGENT", "1") != "0"
 
 class JarvisMainUI(QWidget):
     def __init__(self):
@@ -39,10 +53,20 @@ class JarvisMainUI(QWidget):
         self.layout.addWidget(self.button)
         self.setLayout(self.layout)
         self.audio_data = []
-        self.agent = jarvis
-        self.workflow_engine = WorkflowEngine()
+        self.agent = get_agent()
+        # One event loop for every streamed agent run: the agent's async HTTP client keeps pooled
+        # connections bound to the loop, and a fresh asyncio.run() per turn stalls on the stale ones
+        self.agent_loop = asyncio.new_event_loop()
+        self.workflow_engine = WorkflowEngine(
+            background_tool_generation=os.getenv("JARVIS_BACKGROUND_TOOL_GENERATION") == "1"
+        )
         self.deps = JarvisDeps(user_name="User")  # Extend as needed
         self.memory = MemoryStore()
+        app_index.start()
+        self.plan_cache = PlanCache()
+        self.tts_cache = TTSCache()
+        self.tts_cache.warm_up(client)
+        self.speech = SpeechQueue(client, self.tts_cache)
         self.button.pressed.connect(self.start_recording)
         self.button.released.connect(self.stop_recording)
         logger.info("JarvisMainUI initialized")
@@ -76,77 +100,161 @@ class JarvisMainUI(QWidget):
             write(f.name, SAMPLE_RATE, audio)
             wav_path = f.name
 
-        transcript = self.transcribe_audio(wav_path)
-        logger.info(f"Transcribed audio: {transcript!r}")
+        with span("turn"):
+            self.process_turn(wav_path)
+
+    def process_turn(self, wav_path):
+        """
+        One voice turn: transcribe, plan (cached plan or agent), execute the workflow and speak.
+        """
+        with span("stt"):
+            transcript = self.transcribe_audio(wav_path)
+        logger.info("Transcribed audio: %r", transcript)
         self.text_area.append(f"<b>You:</b> {transcript}")
         self.memory.add("user", transcript)
 
-        # Retrieve recent memory and inject as context
-        recent_memory = self.memory.summarize(limit=20)
-        logger.info(f"Injecting memory into agent context: {recent_memory!r}")
+        # Likely fast-path steps (a calculation, an app lookup) start now and overlap agent planning
+        with speculator.speculate(self.workflow_engine, transcript):
+            # Retrieve recent memory and inject as context
+            with span("memory.retrieve"):
+                recent_memory = self.memory.summarize(limit=20)
+            logger.debug("Injecting memory into agent context: %r", recent_memory)
+
+            # Route through the agent for workflow planning/execution
+            # Add memory as a prefix to the user message for context
+            full_prompt = f"{context_prefix(self.deps)}Recent memory:\n{recent_memory}\n\nUser: {transcript}"
+            # Recurring requests reuse a cached plan and skip agent planning entirely
+            with span("plan_cache.lookup") as lookup_span:
+                cached_plan = self.plan_cache.lookup(transcript)
+                lookup_span.set(hit=cached_plan is not None)
+            if cached_plan:
+                workflow, response = cached_plan
+                self.handle_agent_output(JarvisResponse(response=response, workflow=workflow), transcript)
+            else:
+                try:
+                    if STREAM_AGENT:
+                        output, workflow_result, planning_seconds = self.run_agent_streaming(full_prompt, transcript)
+                        self.handle_agent_output(output, transcript, workflow_result=workflow_result, response_spoken=True)
+                    else:
+                        planning_start = time.perf_counter()
+                        with span("agent.plan"):
+                            agent_result = self.agent.run_sync(full_prompt, deps=self.deps)
+                        planning_seconds = time.perf_counter() - planning_start
+                        logger.info("Agent result: %s", agent_result)
+                        record_prompt_cache_usage(agent_result.usage())
+                        output = agent_result.output
+                        self.handle_agent_output(output, transcript)
+                except (ValidationError, UnexpectedModelBehavior) as e:
+                    # The agent validates the plan itself now, so a step missing a field fails here
+                    # rather than in check_workflow; ask for the missing information the same way
+                    self.report_missing_info(plan_errors(e))
+                    output = None
+                if output and output.workflow and not output.ask:
+                    self.plan_cache.learn(transcript, output.workflow, output.response, planning_seconds)
+            logger.info("Plan cache hit rate: %.1f%%, planning time saved: %.1fs",
+                        self.plan_cache.hit_rate() * 100, self.plan_cache.stats['planning_seconds_saved'])
+
+        # Speak everything queued for this turn in one pass
+        with span("tts.playback"):
+            self.speech.flush()
+        self.label.setText("Press and hold the button, speak, then release.")
 
-        # Route through the agent for workflow planning/execution
-        # Add memory as a prefix to the user message for context
-        full_prompt = f"Recent memory:\n{recent_memory}\n\nUser: {transcript}"
-        agent_result = self.agent.run_sync(full_prompt, deps=self.deps)
-        logger.info(f"Agent result: {agent_result}")
-        output = agent_result.output
+    def run_agent_streaming(self, full_prompt, transcript):
+        """
+        Stream the agent run: each workflow step is executed as soon as it has been received,
+        and complete sentences of the response are queued for speech while the model is still writing.
+        """
+        dispatcher = StepDispatcher(self.workflow_engine, user_utterance=transcript)
+        spoken_offset = 0
+        self.speech.start_playback()
+
+        def on_response_text(text, done):
+            nonlocal spoken_offset
+            sentences, spoken_offset = split_sentences(text, spoken_offset)
+            if done and text[spoken_offset:].strip():
+                sentences.append(text[spoken_offset:].strip())
+                spoken_offset = len(text)
+            for sentence in sentences:
+                self.speech.add(sentence)
+            self.label.setText(text)
+            QApplication.processEvents()
+
+        planning_start = time.perf_counter()
+        # Includes the steps dispatched while streaming; they also get their own workflow.step.* spans
+        try:
+            with span("agent.plan", streaming=True):
+                output, usage = self.agent_loop.run_until_complete(stream_jarvis_response(
+                    self.agent, full_prompt, self.deps,
+                    on_step=dispatcher.dispatch,
+                    on_response_text=on_response_text
+                ))
+        except Exception:
+            # Read-only steps may already be running; stop them and drop the held ones
+            dispatcher.abort()
+            raise
+        planning_seconds = time.perf_counter() - planning_start
+        logger.info("Agent streamed result: %s", output)
+        record_prompt_cache_usage(usage)
+        workflow_result = dispatcher.finish(output.workflow if output else None)
+        return output, workflow_result, planning_seconds
+
+    def handle_agent_output(self, output, transcript, workflow_result=None, response_spoken=False):
         if output and output.ask:
-            logger.info(f"JARVIS clarification: {output.ask}")
+            logger.info("JARVIS clarification: %s", output.ask)
             self.text_area.append(f"<b>JARVIS (clarification):</b> {output.ask}")
             self.memory.add("assistant", output.ask, meta={"type": "clarification"})
-            self.speak_response(output.ask)
+            self.speech.add(output.ask)
         if output and output.workflow:
-            logger.info(f"JARVIS workflow: {output.workflow.model_dump_json(indent=2)}")
-            self.text_area.append(f"<b>Workflow JSON:</b>\n{output.workflow.model_dump_json(indent=2)}")
-            self.memory.add("assistant", output.workflow.model_dump_json(), meta={"type": "workflow"})
-            # Validate and execute workflow
-            wf = self.workflow_engine.validate_workflow(output.workflow.dict())
+            # Serialize once for the log, the window and memory
+            workflow_json = output.workflow.model_dump_json(exclude_none=True)
+            logger.info("JARVIS workflow: %s", workflow_json)
+            self.text_area.append(f"<b>Workflow JSON:</b>\n{workflow_json}")
+            self.memory.add("assistant", workflow_json, meta={"type": "workflow"})
+            # The agent already validated the workflow into models; check_workflow returns it without re-validating.
+            # (Already executed step by step when streaming.)
+            wf, missing = self.workflow_engine.check_workflow(output.workflow)
             if not wf:
-                missing = self.workflow_engine.handle_missing_info(output.workflow.dict())
-                logger.warning(f"Missing workflow info: {missing}")
-                self.text_area.append(f"<b>Missing info:</b> {missing}")
-                self.memory.add("assistant", f"Missing info: {missing}", meta={"type": "missing_info"})
-                self.speak_response("I need more information to proceed.")
+                self.report_missing_info(missing)
             else:
                 # Pass the original user utterance for fallback app launching
-                result = self.workflow_engine.execute_workflow(wf, user_utterance=transcript)
-                logger.info(f"Workflow execution result: {result}")
+                result = workflow_result or self.workflow_engine.execute_workflow(wf, user_utterance=transcript)
+                logger.info("Workflow execution result: %s", result)
                 self.text_area.append(f"<b>Workflow Results:</b>\n{result}")
                 self.memory.add("assistant", str(result), meta={"type": "workflow_result"})
-                self.speak_response(str(result))
+                # Speak only what the steps produced: the workflow id, usage and timings are unique per run,
+                # so reading them out would be noise and would keep the TTS cache from ever hitting
+                spoken = " ".join(str(r["result"]) for r in result["results"] if r.get("result"))
+                if spoken:
+                    self.speech.add(spoken)
         if output and output.response:
-            logger.info(f"JARVIS response: {output.response}")
+            logger.info("JARVIS response: %s", output.response)
             self.text_area.append(f"<b>JARVIS:</b> {output.response}")
             self.memory.add("assistant", output.response)
-            self.speak_response(output.response)
+            if not response_spoken:
+                self.speech.add(output.response)
 
-        self.label.setText("Press and hold the button, speak, then release.")
+    def report_missing_info(self, missing):
+        logger.warning("Missing workflow info: %s", missing)
+        self.text_area.append(f"<b>Missing info:</b> {missing}")
+        self.memory.add("assistant", f"Missing info: {missing}", meta={"type": "missing_info"})
+        self.speech.add("I need more information to proceed.")
 
     def transcribe_audio(self, wav_path):
-        logger.info(f"transcribe_audio called with wav_path: {wav_path}")
+        logger.info("transcribe_audio called with wav_path: %s", wav_path)
         with open(wav_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
+            transcript = governor.call(
+                "transcription", client.audio.transcriptions.create,
                 model="whisper-1",
                 file=audio_file,
                 language="en"
             )
-        logger.info(f"transcribe_audio result: {transcript.text!r}")
+        logger.info("transcribe_audio result: %r", transcript.text)
         return transcript.text
 
     def speak_response(self, text):
-        logger.info(f"speak_response called with text: {text!r}")
-        tts_response = client.audio.speech.create(
-            model="tts-1",
-            voice="onyx",
-            input=text
-        )
-        import subprocess
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-            f.write(tts_response.content)
-            mp3_path = f.name
-        logger.info(f"speak_response playing audio: {mp3_path}")
-        subprocess.run(["afplay", mp3_path])
+        logger.info("speak_response called with text: %r", text)
+        self.speech.add(text)
+        self.speech.flush()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
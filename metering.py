@@ -0,0 +1,276 @@
+import io
+import os
+import json
+import time
+import wave
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from logging_setup import logger, LOG_DIR, DeferredQueueHandler, gzip_rotator
+
+LEDGER_DIR = os.path.join(LOG_DIR, "usage")
+LEDGER_FILE = os.path.join(LEDGER_DIR, "usage.jsonl")
+LEDGER_ENABLED = os.getenv("JARVIS_USAGE_LEDGER", "1") != "0"
+LEDGER_MAX_BYTES = 10 * 1024 * 1024  # rotate usage.jsonl at this size
+LEDGER_BACKUP_COUNT = 10  # compressed usage.jsonl.N.gz files kept
+MAX_TRACKED_WORKFLOWS = 500  # per-workflow totals kept in memory (oldest dropped first)
+TTS_CHARS_PER_SECOND = 15.0  # rough speaking rate, used to estimate synthesized audio length
+
+# USD list prices: per 1M tokens for chat models, per minute of audio for Whisper, per 1M characters for TTS.
+# Matched by longest model-name prefix so dated snapshots ("gpt-4o-2024-08-06") resolve.
+PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "whisper-1": {"audio_minute": 0.006},
+    "tts-1-hd": {"characters": 30.00},
+    "tts-1": {"characters": 15.00},
+}
+
+# Who is spending: bound by the server per turn and by the workflow engine per step,
+# and carried into worker threads with the rest of the context
+_session_var: ContextVar[Optional[str]] = ContextVar("usage_session", default=None)
+_workflow_var: ContextVar[Optional[str]] = ContextVar("usage_workflow", default=None)
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, session: str, spent: float, budget: float):
+        super().__init__(f"session {session} has used ${spent:.4f} of its ${budget:.4f} budget")
+        self.session = session
+        self.spent = spent
+        self.budget = budget
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+            "audio_seconds": 0.0, "characters": 0, "cost_usd": 0.0, "latency_seconds": 0.0}
+
+
+def _price(model: str) -> Dict[str, float]:
+    for name in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return PRICES[name]
+    return {}
+
+
+def _audio_seconds(file: Any) -> Optional[float]:
+    """
+    Duration of a WAV upload given as a file object, (name, bytes) tuple or bytes; None for other formats.
+    """
+    if isinstance(file, tuple):
+        file = file[1]
+    try:
+        if isinstance(file, (bytes, bytearray)):
+            file = io.BytesIO(file)
+        file.seek(0)
+        with wave.open(file, "rb") as clip:
+            return clip.getnframes() / float(clip.getframerate())
+    except (wave.Error, EOFError, AttributeError, OSError, ValueError):
+        return None
+
+
+class JsonLineFormatter(logging.Formatter):
+    # The ledger entry travels as the record's msg and is serialized on the listener thread
+    def format(self, record):
+        return json.dumps(record.msg, default=str)
+
+
+class UsageMeter:
+    """
+    Records tokens, audio and estimated cost for every model call, totalled per call site, model,
+    session and workflow, and appends one line per call to a rotating JSONL ledger.
+    """
+
+    def __init__(self, ledger_file: Optional[str] = LEDGER_FILE if LEDGER_ENABLED else None):
+        self._lock = threading.Lock()
+        self.totals = _empty_totals()
+        self.by_site: Dict[str, Dict] = {}
+        self.by_model: Dict[str, Dict] = {}
+        self.by_session: Dict[str, Dict] = {}
+        self.by_workflow: "OrderedDict[str, Dict]" = OrderedDict()
+        self.budgets: Dict[str, float] = {}
+        self._ledger = None
+        self._listener = None
+        if ledger_file:
+            self._open_ledger(ledger_file)
+
+    def _open_ledger(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LEDGER_MAX_BYTES, backupCount=LEDGER_BACKUP_COUNT, encoding="utf-8"
+        )
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = gzip_rotator
+        handler.setFormatter(JsonLineFormatter())
+        ledger_queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(ledger_queue, handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+        self._ledger = logging.getLogger("jarvis.usage")
+        self._ledger.propagate = False
+        self._ledger.setLevel(logging.INFO)
+        self._ledger.addHandler(DeferredQueueHandler(ledger_queue))
+
+    # --- attribution and budgets ---
+
+    @contextmanager
+    def attribute(self, session: Optional[str] = None, workflow: Optional[str] = None):
+        """
+        Charge calls made inside the block (and in threads started from it) to session/workflow.
+        """
+        tokens = []
+        if session is not None:
+            tokens.append((_session_var, _session_var.set(session)))
+        if workflow is not None:
+            tokens.append((_workflow_var, _workflow_var.set(workflow)))
+        try:
+            yield
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+    def set_budget(self, session: str, max_cost_usd: Optional[float]):
+        with self._lock:
+            if max_cost_usd is None:
+                self.budgets.pop(session, None)
+            else:
+                self.budgets[session] = max_cost_usd
+
+    def forget(self, session: str):
+        """
+        Drop a closed session's totals and budget; its spend stays in the site, model and overall totals.
+        """
+        with self._lock:
+            self.by_session.pop(session, None)
+            self.budgets.pop(session, None)
+
+    def check_budget(self, session: Optional[str] = None):
+        """
+        Raise BudgetExceeded if the session (default: the current one) has spent its budget.
+        """
+        session = session or _session_var.get()
+        if session is None:
+            return
+        budget = self.budgets.get(session)
+        if budget is None:
+            return
+        spent = self.by_session.get(session, {}).get("cost_usd", 0.0)
+        if spent >= budget:
+            raise BudgetExceeded(session, spent, budget)
+
+    # --- recording ---
+
+    def record_response(self, endpoint: str, site: str, kwargs: Dict, response: Any, latency: float):
+        """
+        Meter one successful governor call from its request kwargs and the SDK response.
+        """
+        model = kwargs.get("model") or ""
+        if endpoint == "chat":
+            usage = getattr(response, "usage", None)
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.record(site, model, latency,
+                        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+                        cached_tokens=getattr(details, "cached_tokens", 0) or 0)
+        elif endpoint == "transcription":
+            # Newer API versions report the billed duration; otherwise measure WAV uploads
+            seconds = getattr(getattr(response, "usage", None), "seconds", None)
+            if seconds is None:
+                seconds = _audio_seconds(kwargs.get("file"))
+            self.record(site, model, latency, audio_seconds=seconds or 0.0)
+        elif endpoint == "speech":
+            characters = len(kwargs.get("input") or "")
+            self.record(site, model, latency, characters=characters,
+                        audio_seconds=characters / TTS_CHARS_PER_SECOND)
+
+    def record(self, site: str, model: str, latency: Optional[float] = None, prompt_tokens: int = 0,
+               completion_tokens: int = 0, cached_tokens: int = 0, audio_seconds: float = 0.0,
+               characters: int = 0) -> Dict:
+        price = _price(model)
+        cost = (
+            (prompt_tokens - cached_tokens) * price.get("input", 0.0)
+            + cached_tokens * price.get("cached_input", 0.0)
+            + completion_tokens * price.get("output", 0.0)
+            + characters * price.get("characters", 0.0)
+        ) / 1_000_000 + audio_seconds / 60.0 * price.get("audio_minute", 0.0)
+        session, workflow = _session_var.get(), _workflow_var.get()
+        entry = {
+            "ts": round(time.time(), 3), "site": site, "model": model, "session": session, "workflow": workflow,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cached_tokens": cached_tokens,
+            "audio_seconds": round(audio_seconds, 2), "characters": characters, "cost_usd": round(cost, 6),
+            "latency_seconds": round(latency, 3) if latency is not None else None,
+        }
+        with self._lock:
+            groups = [self.totals, self.by_site.setdefault(site, _empty_totals()),
+                      self.by_model.setdefault(model, _empty_totals())]
+            if session is not None:
+                groups.append(self.by_session.setdefault(session, _empty_totals()))
+            if workflow is not None:
+                if workflow not in self.by_workflow:
+                    self.by_workflow[workflow] = _empty_totals()
+                    if len(self.by_workflow) > MAX_TRACKED_WORKFLOWS:
+                        self.by_workflow.popitem(last=False)
+                groups.append(self.by_workflow[workflow])
+            for totals in groups:
+                totals["calls"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["cached_tokens"] += cached_tokens
+                totals["audio_seconds"] += audio_seconds
+                totals["characters"] += characters
+                totals["cost_usd"] += cost
+                totals["latency_seconds"] += latency or 0.0
+        if self._ledger is not None:
+            self._ledger.info(entry)
+        return entry
+
+    # --- reporting ---
+
+    def summary(self, session: Optional[str] = None) -> Dict:
+        with self._lock:
+            if session is not None:
+                return {"session": session, **self.by_session.get(session, _empty_totals()),
+                        "budget_usd": self.budgets.get(session)}
+            return {
+                "totals": dict(self.totals),
+                "sites": {k: dict(v) for k, v in self.by_site.items()},
+                "models": {k: dict(v) for k, v in self.by_model.items()},
+                "sessions": len(self.by_session),
+            }
+
+    def workflow_usage(self, workflow: str) -> Dict:
+        with self._lock:
+            return dict(self.by_workflow.get(workflow, _empty_totals()))
+
+    def reset(self):
+        with self._lock:
+            self.totals = _empty_totals()
+            self.by_site.clear()
+            self.by_model.clear()
+            self.by_session.clear()
+            self.by_workflow.clear()
+
+    def log_summary(self):
+        # Costliest call sites first
+        for site, totals in sorted(self.by_site.items(), key=lambda kv: -kv[1]["cost_usd"]):
+            logger.info(
+                "usage %s: %s calls, %s prompt (%s cached) + %s completion tokens, %.1fs audio, $%.4f, %.2fs in calls",
+                site, totals["calls"], totals["prompt_tokens"], totals["cached_tokens"], totals["completion_tokens"],
+                totals["audio_seconds"], totals["cost_usd"], totals["latency_seconds"]
+            )
+
+
+meter = UsageMeter()
+attribute = meter.attribute
+atexit.register(meter.log_summary)
+
+# Usage:
+# with attribute(session="alice"):
+#     governor.call("chat", client.chat.completions.create, site="intent", model=..., messages=...)
+# meter.summary()["sites"]["intent"]["cost_usd"]
+# meter.set_budget("alice", 0.50); meter.check_budget("alice")  # raises BudgetExceeded once spent
@@ -0,0 +1,74 @@
+import os
+import time
+from typing import Callable, Dict, List, Optional
+from logging_setup import logger
+from request_governor import governor
+
+FAST_MODEL = os.getenv("JARVIS_FAST_MODEL", "gpt-4o-mini")
+STRONG_MODEL = os.getenv("JARVIS_STRONG_MODEL", "gpt-4o")
+
+# Inputs longer than this (in characters) go to the strong model even for "fast" tasks
+SHORT_INPUT_CHARS = 600
+# Classifier outputs below this confidence are re-asked of the strong model
+MIN_CONFIDENCE = 0.6
+
+# Default tier per call site
+TASK_TIERS = {
+    "intent": "fast",        # brain.jarvis_think
+    "chat": "fast",          # actions.handle_general_chat, app.py conversation
+    "workflow_json": "fast", # jarvis_voice.ask_for_workflow_json (escalates if the Workflow won't parse)
+    "edit_letter": "strong",
+    "edit_letter_patch": "strong", # paragraph-level letter edits (escalates if the patch won't apply)
+    "codegen": "strong",     # auto_tool_generation
+    "plan": "strong",        # the pydantic_ai planning agent
+}
+
+
+def route(task: str, text: str = "", confidence: Optional[float] = None) -> str:
+    """
+    Pick a model for a call site from its task type, input length and (optionally) a prior confidence.
+    """
+    tier = TASK_TIERS.get(task, "strong")
+    if tier == "fast" and len(text) > SHORT_INPUT_CHARS:
+        tier = "strong"
+    if confidence is not None and confidence < MIN_CONFIDENCE:
+        tier = "strong"
+    return FAST_MODEL if tier == "fast" else STRONG_MODEL
+
+
+def _input_text(messages: List[Dict]) -> str:
+    return "".join(str(m.get("content", "")) for m in messages if m.get("role") != "system")
+
+
+def routed_completion(client, task: str, messages: List[Dict], validate: Optional[Callable[[str], bool]] = None,
+                      hedge: bool = False, **kwargs):
+    """
+    Run a chat completion on the routed model. If validate(content) returns False or raises,
+    the call is repeated once on STRONG_MODEL. Routing decisions and latencies are logged.
+    """
+    text = _input_text(messages)
+    model = route(task, text)
+    while True:
+        start = time.perf_counter()
+        response = governor.call(
+            "chat", client.chat.completions.create, hedge=hedge, site=task,
+            model=model,
+            messages=messages,
+            **kwargs
+        )
+        latency = time.perf_counter() - start
+        content = response.choices[0].message.content
+        try:
+            valid = validate is None or validate(content) is not False
+        except Exception as e:
+            logger.warning("model_router: %s output from %s failed validation: %s", task, model, e)
+            valid = False
+        logger.info("model_router: task=%s model=%s input_chars=%s latency=%.2fs valid=%s", task, model, len(text), latency, valid)
+        if valid or model == STRONG_MODEL:
+            return response
+        logger.info("model_router: escalating %s from %s to %s", task, model, STRONG_MODEL)
+        model = STRONG_MODEL
+
+# Usage:
+# response = routed_completion(client, "chat", [{"role": "user", "content": prompt}])
+# response = routed_completion(client, "workflow_json", messages, validate=lambda c: Workflow.parse_raw(c) is not None)
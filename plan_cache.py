@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+from workflow_models import Workflow, ValidationError
+from logging_setup import logger
+
+PLAN_CACHE_DIR = "cache"
+PLAN_CACHE_FILE = os.path.join(PLAN_CACHE_DIR, "plan_cache.json")
+
+# Slot extractors, applied in order; each match is replaced by a placeholder before the next runs.
+_SLOT_PATTERNS = [
+    ("email", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+    ("quoted", re.compile(r"\"([^\"]+)\"|“([^”]+)”")),
+    ("name", re.compile(r"\b(?:to|for|from|with|named|called)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)")),
+    ("subject", re.compile(r"\b(?:about|regarding|subject)\s+(.+?)(?=\s+and\s+|[.,!?]|$)", re.IGNORECASE)),
+    ("number", re.compile(r"\b(\d+(?:\.\d+)?)\b")),
+]
+_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+_WORD = re.compile(r"[a-z0-9]+")
+# Glue words a plan may add around slot values ("100 miles in kilometers") without the utterance saying them
+_GLUE_WORDS = {"a", "an", "the", "of", "in", "to", "for", "and", "or", "on", "at", "by", "with", "from", "into", "is"}
+
+
+def schema_fingerprint() -> str:
+    """
+    Hash of the Action/Workflow JSON schema; cached plans are dropped when it changes.
+    """
+    schema = json.dumps(Workflow.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_utterance(utterance: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Turn an utterance into a template with parameter slots.
+    Returns (template, {slot_name: value}), e.g. "email it to <email0>", {"email0": "a@b.com"}.
+    """
+    text = utterance.strip()
+    slots = {}
+    for kind, pattern in _SLOT_PATTERNS:
+        counter = 0
+
+        def _replace(match):
+            nonlocal counter
+            group = next((i for i in range(1, (pattern.groups or 0) + 1) if match.group(i) is not None), 0)
+            value = match.group(group)
+            if value.startswith("<") and value.endswith(">"):
+                return match.group(0)
+            slot = f"{kind}{counter}"
+            counter += 1
+            slots[slot] = value
+            start, end = match.span(group)
+            return match.group(0)[:start - match.start()] + f"<{slot}>" + match.group(0)[end - match.start():]
+
+        text = pattern.sub(_replace, text)
+    template = re.sub(r"\s+", " ", text.lower()).strip(" .!?")
+    return template, slots
+
+
+def _map_strings(value, fn):
+    if isinstance(value, str):
+        return fn(value)
+    if isinstance(value, list):
+        return [_map_strings(v, fn) for v in value]
+    if isinstance(value, dict):
+        return {k: _map_strings(v, fn) for k, v in value.items()}
+    return value
+
+
+def _strings(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [s for v in value for s in _strings(v)]
+    if isinstance(value, dict):
+        return [s for v in value.values() for s in _strings(v)]
+    return []
+
+
+def _unsupplied_words(skeleton: Dict, template: str) -> List[str]:
+    """
+    Words in the skeleton's string fields, outside slot placeholders, that the utterance template does not
+    contain. A letter body the agent wrote for one person must not be replayed for the next one.
+    """
+    supplied = set(_WORD.findall(re.sub(r"<\w+>", " ", template))) | _GLUE_WORDS
+    words = []
+    for step in skeleton.get("steps", []):
+        for key, value in step.items():
+            if key == "action":
+                continue
+            for text in _strings(value):
+                words.extend(w for w in _WORD.findall(_PLACEHOLDER.sub(" ", text).lower()) if w not in supplied)
+    return words
+
+
+def _structure(workflow: Dict) -> List:
+    return [(step.get("action"), sorted(k for k, v in step.items() if v is not None)) for step in workflow.get("steps", [])]
+
+
+class PlanCache:
+    """
+    Maps utterance templates to validated Workflow skeletons so repeated requests skip agent planning.
+
+    A template is only served after it has been planned min_confirmations times with the same
+    step structure, and only if every slot value from the utterance appears verbatim in the plan
+    (otherwise the plan depends on the slot in a way we cannot substitute) and the plan's step
+    fields hold no free text beyond the slots and the utterance's own words.
+    """
+
+    def __init__(self, path: str = PLAN_CACHE_FILE, min_confirmations: int = 2):
+        self.path = path
+        self.min_confirmations = min_confirmations
+        self.fingerprint = schema_fingerprint()
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "planning_seconds_saved": 0.0,
+                      "avg_planning_seconds": 0.0, "planned": 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("PlanCache could not load %s: %s", self.path, e)
+            return
+        if data.get("schema") != self.fingerprint:
+            logger.info("PlanCache: Action schema changed, discarding cached plans")
+            return
+        self.entries = data.get("entries", {})
+        self.stats.update(data.get("stats", {}))
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"schema": self.fingerprint, "entries": self.entries, "stats": self.stats}, f)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, utterance: str) -> Optional[Tuple[Workflow, str]]:
+        """
+        Return (workflow, response) with slots filled for this utterance, or None on a miss.
+        """
+        template, slots = normalize_utterance(utterance)
+        with self._lock:
+            self.stats["lookups"] += 1
+            entry = self.entries.get(template)
+            if (not entry or entry["confirmations"] < self.min_confirmations or set(entry["slots"]) != set(slots)
+                    or _unsupplied_words(entry["workflow"], template)):
+                self.stats["misses"] += 1
+                return None
+            start = time.perf_counter()
+
+            def _fill(s):
+                # One pass, so a filled-in value is never itself scanned for placeholders
+                return _PLACEHOLDER.sub(lambda m: slots.get(m.group(1), m.group(0)), s)
+
+            try:
+                workflow = Workflow.model_validate(_map_strings(entry["workflow"], _fill))
+            except ValidationError as e:
+                logger.warning("PlanCache dropping invalid plan for %r: %s", template, e)
+                del self.entries[template]
+                self.stats["misses"] += 1
+                self._save()
+                return None
+            response = _fill(entry["response"])
+            entry["hits"] += 1
+            self.stats["hits"] += 1
+            saved = max(self.stats["avg_planning_seconds"] - (time.perf_counter() - start), 0.0)
+            self.stats["planning_seconds_saved"] += saved
+            # No disk write on the hit path: hit counts and stats are persisted with the next learn()
+        logger.info("PlanCache hit for template %r (saved ~%.2fs of planning)", template, saved)
+        return workflow, response
+
+    def learn(self, utterance: str, workflow: Workflow, response: str = "", planning_seconds: float = 0.0):
+        """
+        Record an agent-generated plan for this utterance and the time the agent took to produce it.
+        """
+        template, slots = normalize_utterance(utterance)
+        wf_dict = workflow.model_dump(exclude_none=True)
+        with self._lock:
+            if planning_seconds:
+                n = self.stats["planned"]
+                self.stats["avg_planning_seconds"] = (self.stats["avg_planning_seconds"] * n + planning_seconds) / (n + 1)
+                self.stats["planned"] = n + 1
+            serialized = json.dumps(wf_dict) + response
+            if any(value not in serialized for value in slots.values()):
+                logger.info("PlanCache not caching %r: plan does not reuse all slot values", template)
+                self._save()
+                return
+
+            # All slots in one pass (longest value first, whole words only), so a placeholder
+            # already inserted is never rewritten by a shorter value ("10" then "0")
+            by_value = {}
+            for slot, value in slots.items():
+                by_value.setdefault(value, slot)
+            values = re.compile(
+                r"(?<!\w)(?:" + "|".join(re.escape(v) for v in sorted(by_value, key=len, reverse=True)) + r")(?!\w)"
+            ) if by_value else None
+
+            def _to_skeleton(s):
+                return values.sub(lambda m: f"{{{{{by_value[m.group(0)]}}}}}", s) if values else s
+
+            skeleton = _map_strings(wf_dict, _to_skeleton)
+            unsupplied = _unsupplied_words(skeleton, template)
+            if unsupplied:
+                logger.info("PlanCache not caching %r: plan has text the utterance did not supply (%s)",
+                            template, " ".join(unsupplied[:5]))
+                self._save()
+                return
+            structure = json.dumps(_structure(wf_dict))
+            entry = self.entries.get(template)
+            if entry and entry["structure"] == structure:
+                entry["confirmations"] += 1
+                entry["workflow"] = skeleton
+                entry["response"] = _to_skeleton(response)
+            else:
+                self.entries[template] = {
+                    "workflow": skeleton,
+                    "response": _to_skeleton(response),
+                    "structure": structure,
+                    "slots": sorted(slots),
+                    "confirmations": 1,
+                    "hits": 0,
+                }
+            self._save()
+
+    def invalidate(self, utterance: Optional[str] = None):
+        with self._lock:
+            if utterance is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(normalize_utterance(utterance)[0], None)
+            self._save()
+
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["lookups"] if self.stats["lookups"] else 0.0
+
+# Usage:
+# cache = PlanCache()
+# cached = cache.lookup("Draft a letter to Alice and email it to alice@example.com")
+# if cached is None:
+#     ... run the agent, then cache.learn(utterance, output.workflow, output.response, elapsed)
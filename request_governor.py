@@ -0,0 +1,308 @@
+import time
+import random
+import json
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+import httpx
+import openai
+from logging_setup import logger
+from tracing import span
+from metering import meter
+
+# Per-endpoint budgets; tokens_per_minute of 0 means only requests are limited
+DEFAULT_LIMITS = {
+    "chat": {"requests_per_minute": 500, "tokens_per_minute": 30000, "max_concurrency": 8},
+    "transcription": {"requests_per_minute": 50, "tokens_per_minute": 0, "max_concurrency": 4},
+    "speech": {"requests_per_minute": 50, "tokens_per_minute": 0, "max_concurrency": 4},
+}
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5  # seconds, doubled per attempt and jittered
+HEDGE_DELAY = 1.5  # seconds before a hedged request fires its backup call
+LATENCY_TARGET = 5.0  # seconds; slower responses shrink the concurrency window
+
+_RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at rate_per_minute; acquire() blocks until enough tokens exist.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_for = (amount - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+    def drain(self):
+        # After a 429 the provider's view of our budget is exhausted; stop bursting
+        with self._lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency window adjusted AIMD-style: +1/limit per fast success, halved on a 429 or a slow response.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(1, max_concurrency // 2))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self, latency: float):
+        with self._cond:
+            if latency > LATENCY_TARGET:
+                self.limit = max(1.0, self.limit * 0.75)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(1.0, self.limit / 2)
+
+
+class EndpointGovernor:
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "hedged": 0, "errors": 0}
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000.0 if header == "retry-after-ms" else seconds
+    return None
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Rough prompt + completion token estimate (4 characters per token) used for the TPM bucket.
+    """
+    chars = sum(len(str(m.get("content", ""))) for m in kwargs.get("messages", []))
+    return chars // 4 + int(kwargs.get("max_tokens") or 256)
+
+
+class RequestGovernor:
+    """
+    Shared gate for every OpenAI call: per-endpoint request/token buckets, an adaptive concurrency
+    window, retries that honour Retry-After, and optional hedging for short latency-critical calls.
+    """
+
+    def __init__(self, limits: Dict[str, Dict] = None):
+        self.endpoints = {
+            name: EndpointGovernor(name, **cfg) for name, cfg in (limits or DEFAULT_LIMITS).items()
+        }
+        self._hedge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+    def _attempt(self, endpoint: EndpointGovernor, fn: Callable, tokens: int, kwargs: Dict):
+        endpoint.requests.acquire()
+        endpoint.tokens.acquire(tokens)
+        with endpoint.limiter, span(f"api.{endpoint.name}", model=kwargs.get("model")):
+            start = time.monotonic()
+            result = fn(**kwargs)
+        endpoint.limiter.on_success(time.monotonic() - start)
+        return result
+
+    def _hedged_attempt(self, endpoint: EndpointGovernor, fn: Callable, tokens: int, kwargs: Dict,
+                        on_extra_response: Callable[[Any], None]):
+        first = self._hedge_pool.submit(self._attempt, endpoint, fn, tokens, kwargs)
+        done, _ = wait([first], timeout=HEDGE_DELAY)
+        if done:
+            return first.result()
+        endpoint.stats["hedged"] += 1
+        logger.info("RequestGovernor[%s]: hedging slow request", endpoint.name)
+        second = self._hedge_pool.submit(self._attempt, endpoint, fn, tokens, kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The losing call is billed too; it is metered when (and if) it succeeds
+                    other = second if future is first else first
+                    other.add_done_callback(lambda f: f.exception() is None and on_extra_response(f.result()))
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, endpoint_name: str, fn: Callable, hedge: bool = False, tokens: Optional[int] = None,
+             site: Optional[str] = None, **kwargs):
+        """
+        Invoke fn(**kwargs) (e.g. client.chat.completions.create) under the endpoint's limits.
+        Usage is metered under `site` (default: the endpoint name); a session over budget raises BudgetExceeded.
+        """
+        endpoint = self.endpoints[endpoint_name]
+        meter.check_budget()
+        if tokens is None:
+            tokens = estimate_tokens(kwargs) if endpoint_name == "chat" else 0
+        endpoint.stats["calls"] += 1
+        started = time.monotonic()
+        # A losing hedged call finishes on a pool thread; meter it under the caller's session and workflow
+        context = contextvars.copy_context()
+
+        def _record_extra(response):
+            context.run(meter.record_response, endpoint_name, site or endpoint_name, kwargs, response,
+                        time.monotonic() - started)
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if hedge:
+                    result = self._hedged_attempt(endpoint, fn, tokens, kwargs, _record_extra)
+                else:
+                    result = self._attempt(endpoint, fn, tokens, kwargs)
+                meter.record_response(endpoint_name, site or endpoint_name, kwargs, result, time.monotonic() - started)
+                return result
+            except _RETRYABLE as e:
+                if attempt == MAX_RETRIES:
+                    endpoint.stats["errors"] += 1
+                    raise
+                delay = _retry_after(e)
+                if isinstance(e, openai.RateLimitError):
+                    endpoint.stats["throttled"] += 1
+                    endpoint.limiter.on_throttle()
+                    endpoint.requests.drain()
+                if delay is None:
+                    delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                endpoint.stats["retries"] += 1
+                logger.warning("RequestGovernor[%s]: %s, retry %s/%s in %.2fs",
+                               endpoint_name, type(e).__name__, attempt + 1, MAX_RETRIES, delay)
+                time.sleep(delay)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    # Holds the concurrency slot until a (possibly streamed) response body is closed
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport for SDK clients the governor cannot wrap call by call (the pydantic_ai agent's
+    AsyncOpenAI client): every request waits for the endpoint's request/token buckets and a slot in
+    its adaptive window, and 429s and latencies feed the window like governed calls. Retries are left
+    to the SDK; usage is metered from the run's usage by the caller.
+    """
+
+    def __init__(self, endpoint: EndpointGovernor, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.endpoint = endpoint
+        self._inner = inner or httpx.AsyncHTTPTransport()
+
+    @staticmethod
+    def _estimate(request: httpx.Request) -> int:
+        try:
+            body = json.loads(request.content or b"{}")
+        except (ValueError, httpx.RequestNotRead):
+            return 0
+        return estimate_tokens(body) if isinstance(body, dict) else 0
+
+    def _acquire(self, tokens: int):
+        self.endpoint.requests.acquire()
+        self.endpoint.tokens.acquire(tokens)
+        self.endpoint.limiter.__enter__()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = self.endpoint
+        # The buckets and the window block, so waiting for them happens off the event loop
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire, self._estimate(request)))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread cannot be interrupted and may still take the slot; give it back once it has
+            def _give_back(future):
+                if not future.cancelled() and future.exception() is None:
+                    endpoint.limiter.__exit__(None, None, None)
+            acquiring.add_done_callback(_give_back)
+            raise
+        endpoint.stats["calls"] += 1
+        released = False
+
+        def _release():
+            nonlocal released
+            if not released:
+                released = True
+                endpoint.limiter.__exit__(None, None, None)
+
+        start = time.monotonic()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            _release()
+            raise
+        if response.status_code == 429:
+            endpoint.stats["throttled"] += 1
+            endpoint.limiter.on_throttle()
+            endpoint.requests.drain()
+        elif response.status_code < 500:
+            endpoint.limiter.on_success(time.monotonic() - start)
+        return httpx.Response(
+            response.status_code, headers=response.headers, extensions=response.extensions,
+            stream=_ReleasingStream(response.stream, _release), request=request,
+        )
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+governor = RequestGovernor()
+
+# Usage:
+# response = governor.call("chat", client.chat.completions.create, model="gpt-4o", messages=[...])
+# audio = governor.call("speech", client.audio.speech.create, model="tts-1", voice="onyx", input=text)
+# http_client = httpx.AsyncClient(transport=GovernedTransport(governor.endpoints["chat"]))  # SDK-managed clients
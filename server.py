@@ -0,0 +1,504 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import argparse
+import functools
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+from openai import OpenAI
+from pydantic_ai.exceptions import UnexpectedModelBehavior
+
+import actions
+from document_store import LetterDocument
+from jarvis_agent import get_agent, JarvisDeps, JarvisResponse, context_prefix, record_prompt_cache_usage
+from logging_setup import logger
+from metering import meter, attribute, BudgetExceeded
+from memory_store import MemoryStore, MEMORY_DIR
+from plan_cache import PlanCache
+from request_governor import governor
+from speculation import speculator
+from tracing import span
+from tts_cache import TTSCache
+from workflow_engine import WorkflowEngine
+from workflow_models import ValidationError, plan_errors
+from workflow_stream import StepDispatcher, stream_jarvis_response, split_sentences
+
+load_dotenv()
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+SESSIONS_DIR = os.path.join(MEMORY_DIR, "sessions")
+# Threads for blocking work: STT, memory file I/O, workflow steps, TTS
+MAX_WORKERS = int(os.getenv("JARVIS_SERVER_WORKERS", "8"))
+# Turns planning/executing at the same time, and turns allowed to wait for a slot; beyond that -> 503
+MAX_ACTIVE_TURNS = int(os.getenv("JARVIS_SERVER_ACTIVE_TURNS", "16"))
+MAX_QUEUED_TURNS = int(os.getenv("JARVIS_SERVER_QUEUED_TURNS", "64"))
+MAX_SESSION_BACKLOG = 4  # turns one session may have waiting before it gets 429
+SESSION_TTL = 30 * 60  # idle seconds before a session's in-memory state is dropped
+HISTORY_LENGTH = 50  # workflow history entries kept per session
+RETRY_AFTER = 1  # seconds suggested to rejected clients
+# Default spend cap per session in USD (unset = unlimited); POST /sessions can set its own
+SESSION_BUDGET_USD = float(os.environ["JARVIS_SESSION_BUDGET_USD"]) if os.getenv("JARVIS_SESSION_BUDGET_USD") else None
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_AUDIO_FILE = re.compile(r"^[0-9a-f]{64}\.\w+$")
+
+
+class ServerBusy(Exception):
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+
+
+class Session:
+    """
+    Everything one user's conversation owns: letter document, memory file, plan cache, workflow
+    engine (and with it memoized results and the last workflow) and recent workflow history.
+    """
+
+    def __init__(self, session_id: str, user_name: str, data_dir: str):
+        self.id = session_id
+        self.deps = JarvisDeps(user_name=user_name)
+        self.document = LetterDocument()
+        self.memory = MemoryStore(path=os.path.join(data_dir, f"{session_id}.jsonl"))
+        # Per session: a plan learned from one user's requests is never replayed for another
+        self.plan_cache = PlanCache(path=os.path.join(data_dir, f"{session_id}.plans.json"))
+        self.engine = WorkflowEngine()
+        self.history = deque(maxlen=HISTORY_LENGTH)
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+        self.turns = 0
+        self.last_active = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "user_name": self.deps.user_name,
+            "turns": self.turns,
+            "busy": self.lock.locked(),
+            "document": self.document.content,
+            "document_version": self.document.version,
+            "history": list(self.history),
+            "usage": meter.summary(self.id),
+        }
+
+
+class JarvisServer:
+    """
+    Runs the text/voice -> agent -> workflow -> speech pipeline for many sessions on one event loop.
+
+    Agent runs are async and share the loop; blocking work goes to a bounded thread pool.
+    Backpressure: at most max_active_turns turns run at once, at most max_queued_turns more wait,
+    and each session handles its turns one at a time in arrival order.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_active_turns: int = MAX_ACTIVE_TURNS,
+                 max_queued_turns: int = MAX_QUEUED_TURNS, data_dir: str = SESSIONS_DIR,
+                 session_ttl: float = SESSION_TTL):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jarvis-server")
+        self.max_active_turns = max_active_turns
+        self.max_queued_turns = max_queued_turns
+        self.data_dir = data_dir
+        self.session_ttl = session_ttl
+        self.sessions: Dict[str, Session] = {}
+        self.agent = get_agent()
+        self.tts_cache = TTSCache()
+        self._active = asyncio.Semaphore(max_active_turns)
+        self._pending = 0
+        self.stats = {"turns": 0, "rejected": 0, "errors": 0, "sessions_evicted": 0}
+        os.makedirs(self.data_dir, exist_ok=True)
+        logger.info("JarvisServer initialized: %s workers, %s active / %s queued turns",
+                    max_workers, max_active_turns, max_queued_turns)
+
+    # --- sessions ---
+
+    def get_session(self, session_id: Optional[str] = None, user_name: str = "User", create: bool = True,
+                    budget_usd: Optional[float] = SESSION_BUDGET_USD) -> Optional[Session]:
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+        elif not _SESSION_ID.match(session_id):
+            raise ValueError(f"invalid session id {session_id!r}")
+        session = self.sessions.get(session_id)
+        if session is None and create:
+            session = self.sessions[session_id] = Session(session_id, user_name, self.data_dir)
+            meter.set_budget(session_id, budget_usd)
+            logger.info("JarvisServer: session %s created", session_id)
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        if self.sessions.pop(session_id, None) is None:
+            return False
+        meter.forget(session_id)
+        return True
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for session_id, session in list(self.sessions.items()):
+            if session.last_active < cutoff and not session.lock.locked() and not session.waiting:
+                del self.sessions[session_id]
+                meter.forget(session_id)
+                self.stats["sessions_evicted"] += 1
+                logger.info("JarvisServer: evicted idle session %s", session_id)
+
+    # --- turns ---
+
+    async def _blocking(self, fn: Callable, *args):
+        # copy_context carries the session's bound document into the worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, contextvars.copy_context().run, functools.partial(fn, *args))
+
+    def _transcribe(self, audio: bytes, filename: str) -> str:
+        return governor.call(
+            "transcription", client.audio.transcriptions.create,
+            model="whisper-1",
+            file=(filename, audio),
+            language="en"
+        ).text
+
+    async def run_turn(self, session: Session, text: Optional[str] = None, audio: Optional[bytes] = None,
+                       audio_name: str = "audio.wav", speak: bool = False,
+                       on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Queue one turn for the session and return its result. Raises ServerBusy when the server
+        (503) or this session (429) already has too many turns waiting, and BudgetExceeded when
+        the session has spent its budget.
+        """
+        meter.check_budget(session.id)
+        if self._pending >= self.max_active_turns + self.max_queued_turns:
+            self.stats["rejected"] += 1
+            raise ServerBusy(503, "server is at capacity")
+        if session.waiting >= MAX_SESSION_BACKLOG:
+            self.stats["rejected"] += 1
+            raise ServerBusy(429, "too many turns queued for this session")
+        self._pending += 1
+        session.waiting += 1
+        queued = True
+        try:
+            async with session.lock:
+                async with self._active:
+                    session.waiting -= 1
+                    queued = False
+                    session.last_active = time.monotonic()
+                    try:
+                        return await self._turn(session, text, audio, audio_name, speak, on_event or (lambda event: None))
+                    except Exception:
+                        self.stats["errors"] += 1
+                        raise
+                    finally:
+                        session.last_active = time.monotonic()
+        finally:
+            self._pending -= 1
+            if queued:
+                # Cancelled (client went away) while still waiting for a slot
+                session.waiting -= 1
+
+    async def _turn(self, session: Session, text, audio, audio_name, speak, emit) -> Dict:
+        started = time.perf_counter()
+        # Task-local binding: every action this turn runs edits the session's own letter
+        # and every model call it makes is charged to the session
+        actions.use_document(session.document)
+        with span("server.turn"), attribute(session=session.id):
+            if audio is not None:
+                with span("stt"):
+                    transcript = await self._blocking(self._transcribe, audio, audio_name)
+                emit({"type": "transcript", "text": transcript})
+            else:
+                transcript = (text or "").strip()
+            # Turns in a session are serialized, so its engine holds one speculation at a time
+            missing = None
+            with speculator.speculate(session.engine, transcript):
+                await self._blocking(session.memory.add, "user", transcript)
+                with span("memory.retrieve"):
+                    recent_memory = await self._blocking(session.memory.summarize, 20)
+                prompt = f"{context_prefix(session.deps)}Recent memory:\n{recent_memory}\n\nUser: {transcript}"
+
+                cached_plan = await self._blocking(session.plan_cache.lookup, transcript)
+                if cached_plan:
+                    workflow, response = cached_plan
+                    output = JarvisResponse(response=response, workflow=workflow)
+                    workflow_result = await self._blocking(session.engine.execute_workflow, workflow, transcript)
+                else:
+                    try:
+                        output, workflow_result, planning_seconds = await self._plan(session, prompt, transcript, emit)
+                    except (ValidationError, UnexpectedModelBehavior) as e:
+                        # The plan did not validate: ask for what is missing instead of failing the turn
+                        missing = plan_errors(e)
+                        logger.warning("Missing workflow info in session %s: %s", session.id, missing)
+                        output = JarvisResponse(response="", ask="I need more information to proceed.")
+                        workflow_result = None
+                    if output and output.workflow and not output.ask:
+                        await self._blocking(session.plan_cache.learn, transcript, output.workflow, output.response, planning_seconds)
+
+            reply = (output.ask or output.response) if output else ""
+            if missing:
+                await self._blocking(session.memory.add, "assistant", f"Missing info: {missing}", {"type": "missing_info"})
+            else:
+                await self._blocking(session.memory.add, "assistant", reply,
+                                     {"type": "clarification" if output and output.ask else "response"})
+            audio_url = None
+            if speak and reply:
+                with span("tts.synthesize"):
+                    path = await self._blocking(self.tts_cache.synthesize, client, reply)
+                audio_url = f"/audio/{os.path.basename(path)}"
+
+        session.turns += 1
+        self.stats["turns"] += 1
+        record = {
+            "session_id": session.id,
+            "transcript": transcript,
+            "response": output.response if output else "",
+            "ask": output.ask if output else None,
+            "missing": missing,
+            "workflow": output.workflow.model_dump(exclude_none=True) if output and output.workflow else None,
+            "results": workflow_result["results"] if workflow_result else [],
+            "cached_plan": bool(cached_plan),
+            "audio_url": audio_url,
+            "elapsed": round(time.perf_counter() - started, 3),
+            "workflow_id": workflow_result.get("workflow_id") if workflow_result else None,
+            "usage": workflow_result.get("usage") if workflow_result else None,
+        }
+        session.history.append(record)
+        return record
+
+    async def _plan(self, session: Session, prompt: str, transcript: str, emit):
+        """
+        Stream the agent run on the server loop; steps start as soon as they arrive and complete
+        sentences of the response are pushed to the client as events.
+        """
+        dispatcher = StepDispatcher(session.engine, user_utterance=transcript)
+        spoken_offset = 0
+
+        def on_step(index, step):
+            emit({"type": "step", "index": index, "action": step.action})
+            dispatcher.dispatch(index, step)
+
+        def on_response_text(text, done):
+            nonlocal spoken_offset
+            sentences, spoken_offset = split_sentences(text, spoken_offset)
+            if done and text[spoken_offset:].strip():
+                sentences.append(text[spoken_offset:].strip())
+                spoken_offset = len(text)
+            for sentence in sentences:
+                emit({"type": "sentence", "text": sentence})
+
+        planning_start = time.perf_counter()
+        try:
+            with span("agent.plan", streaming=True):
+                output, usage = await stream_jarvis_response(
+                    self.agent, prompt, session.deps, on_step=on_step, on_response_text=on_response_text
+                )
+        except BaseException:
+            # Let steps that already started finish in the background; do not run any more
+            await self._blocking(dispatcher.abort)
+            raise
+        planning_seconds = time.perf_counter() - planning_start
+        record_prompt_cache_usage(usage)
+        workflow_result = await self._blocking(dispatcher.finish, output.workflow if output and not output.ask else None)
+        return output, workflow_result, planning_seconds
+
+    def health(self) -> Dict:
+        return {
+            "sessions": len(self.sessions),
+            "pending_turns": self._pending,
+            "max_active_turns": self.max_active_turns,
+            "max_queued_turns": self.max_queued_turns,
+            "stats": self.stats,
+            "governor": {name: endpoint.stats for name, endpoint in governor.endpoints.items()},
+            "usage": meter.summary()["totals"],
+            "speculation": speculator.summary(),
+        }
+
+
+# --- HTTP / WebSocket API ---
+
+def _busy_response(e: ServerBusy) -> web.Response:
+    return web.json_response({"error": str(e)}, status=e.status, headers={"Retry-After": str(RETRY_AFTER)})
+
+
+def _session_or_400(server: JarvisServer, session_id: str, **kwargs) -> Session:
+    try:
+        return server.get_session(session_id, **kwargs)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+
+def _session_budget(requested) -> Optional[float]:
+    """
+    The server's cap always applies; a client may only ask for a lower one.
+    """
+    if requested is None:
+        return SESSION_BUDGET_USD
+    if isinstance(requested, bool) or not isinstance(requested, (int, float)) or requested < 0:
+        raise web.HTTPBadRequest(text="budget_usd must be a non-negative number")
+    return float(requested) if SESSION_BUDGET_USD is None else min(float(requested), SESSION_BUDGET_USD)
+
+
+async def create_session(request: web.Request) -> web.Response:
+    server = request.app["jarvis"]
+    body = await request.json() if request.can_read_body else {}
+    session = _session_or_400(server, body.get("session_id"), user_name=body.get("user_name", "User"),
+                              budget_usd=_session_budget(body.get("budget_usd")))
+    return web.json_response({"session_id": session.id}, status=201)
+
+
+async def get_session(request: web.Request) -> web.Response:
+    session = _session_or_400(request.app["jarvis"], request.match_info["session_id"], create=False)
+    if session is None:
+        raise web.HTTPNotFound()
+    return web.json_response(session.snapshot())
+
+
+async def delete_session(request: web.Request) -> web.Response:
+    if not request.app["jarvis"].close_session(request.match_info["session_id"]):
+        raise web.HTTPNotFound()
+    return web.Response(status=204)
+
+
+async def post_turn(request: web.Request) -> web.Response:
+    """
+    JSON body {"text": ..., "speak": bool} for text, or raw audio bytes (audio/* content type,
+    ?speak=1 to synthesize the reply) for voice. Sessions are created on first use.
+    """
+    server = request.app["jarvis"]
+    session = _session_or_400(server, request.match_info["session_id"])
+    if request.content_type.startswith("audio/") or request.content_type == "application/octet-stream":
+        audio = await request.read()
+        kwargs = {"audio": audio, "audio_name": request.query.get("filename", "audio.wav"),
+                  "speak": request.query.get("speak") == "1"}
+    else:
+        body = await request.json()
+        kwargs = {"text": body.get("text", ""), "speak": bool(body.get("speak"))}
+    try:
+        return web.json_response(await server.run_turn(session, **kwargs))
+    except ServerBusy as e:
+        return _busy_response(e)
+    except BudgetExceeded as e:
+        return web.json_response({"error": str(e)}, status=402)
+
+
+async def websocket(request: web.Request) -> web.WebSocketResponse:
+    """
+    Text frames carry {"text": ..., "speak": bool}; binary frames carry an audio recording.
+    The server answers with transcript/step/sentence events followed by a "result" message.
+    Turns on one socket are handled in order, so a slow session naturally throttles its client.
+    """
+    server = request.app["jarvis"]
+    session = _session_or_400(server, request.match_info["session_id"])
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def _writer():
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            await ws.send_json(event)
+
+    writer = asyncio.create_task(_writer())
+    try:
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                data = msg.json()
+                kwargs = {"text": data.get("text", ""), "speak": bool(data.get("speak"))}
+            elif msg.type == WSMsgType.BINARY:
+                kwargs = {"audio": msg.data, "speak": True}
+            else:
+                continue
+            try:
+                result = await server.run_turn(session, on_event=events.put_nowait, **kwargs)
+                events.put_nowait({"type": "result", **result})
+            except ServerBusy as e:
+                events.put_nowait({"type": "error", "status": e.status, "error": str(e), "retry_after": RETRY_AFTER})
+            except BudgetExceeded as e:
+                events.put_nowait({"type": "error", "status": 402, "error": str(e)})
+            except Exception as e:
+                logger.error("JarvisServer: turn failed for session %s: %s", session.id, e)
+                events.put_nowait({"type": "error", "status": 500, "error": str(e)})
+    finally:
+        events.put_nowait(None)
+        await writer
+    return ws
+
+
+async def get_audio(request: web.Request) -> web.StreamResponse:
+    name = request.match_info["name"]
+    path = os.path.join(request.app["jarvis"].tts_cache.path, name)
+    if not _AUDIO_FILE.match(name) or not os.path.exists(path):
+        raise web.HTTPNotFound()
+    return web.FileResponse(path)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response(request.app["jarvis"].health())
+
+
+async def usage(request: web.Request) -> web.Response:
+    return web.json_response(meter.summary())
+
+
+async def _evict_loop(app: web.Application):
+    while True:
+        await asyncio.sleep(60)
+        app["jarvis"].evict_idle()
+
+
+async def _on_startup(app: web.Application):
+    if "jarvis" not in app:
+        app["jarvis"] = JarvisServer()
+    app["evictor"] = asyncio.create_task(_evict_loop(app))
+
+
+async def _on_cleanup(app: web.Application):
+    app["evictor"].cancel()
+    app["jarvis"].pool.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(server: Optional[JarvisServer] = None) -> web.Application:
+    app = web.Application(client_max_size=25 * 1024 * 1024)  # Whisper's upload limit
+    if server is not None:
+        app["jarvis"] = server
+    app.add_routes([
+        web.post("/sessions", create_session),
+        web.get("/sessions/{session_id}", get_session),
+        web.delete("/sessions/{session_id}", delete_session),
+        web.post("/sessions/{session_id}/turns", post_turn),
+        web.get("/sessions/{session_id}/ws", websocket),
+        web.get("/audio/{name}", get_audio),
+        web.get("/health", health),
+        web.get("/usage", usage),
+    ])
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve JARVIS to many concurrent sessions over HTTP/WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--active-turns", type=int, default=MAX_ACTIVE_TURNS)
+    parser.add_argument("--queued-turns", type=int, default=MAX_QUEUED_TURNS)
+    args = parser.parse_args()
+
+    async def _app():
+        # Built inside the loop so the server's semaphore and sessions belong to it
+        return create_app(JarvisServer(args.workers, args.active_turns, args.queued_turns))
+
+    web.run_app(_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
+
+# Usage:
+# python server.py --port 8765
+# curl -X POST localhost:8765/sessions/alice/turns -d '{"text": "Draft a letter to Bob"}' -H 'Content-Type: application/json'
+# curl -X POST 'localhost:8765/sessions/alice/turns?speak=1' --data-binary @clip.wav -H 'Content-Type: audio/wav'
+# websocket: ws://localhost:8765/sessions/alice/ws  ->  {"text": "Read the letter back"}
@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import actions
+from workflow_models import parse_action
+from action_registry import get_action_meta
+from app_index import app_index, normalize_app_name
+from logging_setup import logger
+from tracing import span
+
+# Set JARVIS_SPECULATE=0 to plan and execute strictly one after the other
+SPECULATE = os.getenv("JARVIS_SPECULATE", "1") != "0"
+MAX_WORKERS = 2  # speculative prefetches running at once, across all turns
+MAX_APP_WORDS = 3
+CLAIM_TIMEOUT = 10.0  # longest a step waits for an in-flight prefetch before it is treated as a miss
+
+_CALCULATION = re.compile(
+    r"^(?:please\s+)?(?:what(?:'s|\s+is|\s+are)|calculate|compute|how\s+much\s+is|convert|solve)\s+(?:the\s+)?(.+)$", re.I
+)
+_OPEN_APP = re.compile(r"^(?:please\s+)?(?:open|launch|start)\s+(?:up\s+)?(?:the\s+)?(.+?)(?:\s+app(?:lication)?)?$", re.I)
+_MATH_WORDS = ("square root", "sqrt", "percent", "integral", "derivative", "factorial", "log ")
+
+
+def normalize_query(query: str) -> str:
+    # "What is the Square Root of 225?" and "square root of 225" must compare equal
+    query = re.sub(r"[?!.,]+$", "", query.strip().lower())
+    query = re.sub(r"^(?:the|a|an)\s+", "", query)
+    return " ".join(query.split())
+
+
+@dataclass
+class Prediction:
+    """
+    A step the transcript suggests the plan will contain, and the prefetch started for it.
+    commit=True: the prefetched value is the step's result (pure actions only).
+    commit=False: the prefetch only warms a lookup the step will repeat (e.g. resolving an app).
+    """
+    action: str
+    key: str  # normalized argument the plan's step is matched on
+    argument: str  # as spoken, passed to the prefetch
+    commit: bool
+    future: Future = None
+    started: float = 0.0
+    finished: Optional[float] = None
+    claimed: bool = False
+
+    def step(self):
+        if self.action == "open_application":
+            return parse_action({"action": self.action, "app_name": self.argument})
+        return parse_action({"action": self.action, "query": self.argument})
+
+    def matches(self, step) -> bool:
+        if step.action != self.action:
+            return False
+        if self.action == "open_application":
+            return normalize_app_name(step.app_name, strip_filler=True) == self.key
+        return normalize_query(getattr(step, "query", "") or "") == self.key
+
+
+def predict(transcript: str) -> List[Prediction]:
+    """
+    Cheap, local guesses at fast-path steps; each clause of "X and Y" is considered separately.
+    """
+    predictions = []
+    for clause in re.split(r"\s+(?:and|then)\s+", transcript.strip().rstrip("?!.")):
+        match = _CALCULATION.match(clause)
+        if match:
+            query = normalize_query(match.group(1))
+            if any(c.isdigit() for c in query) or any(word in query for word in _MATH_WORDS):
+                predictions.append(Prediction("perform_calculation", query, match.group(1).strip(), commit=True))
+                continue
+        match = _OPEN_APP.match(clause)
+        if match:
+            name = normalize_app_name(match.group(1), strip_filler=True)
+            # "start a new letter for Bob" is not an app; app names are a few words at most
+            if name and len(name.split()) <= MAX_APP_WORDS:
+                predictions.append(Prediction("open_application", name, match.group(1).strip(), commit=False))
+    # Only side-effect-free work may run before the plan exists
+    return [p for p in predictions if not p.commit or get_action_meta(p.action).pure]
+
+
+class Speculation:
+    """
+    The prefetches started for one turn. Steps claim matching predictions while the workflow runs;
+    finish() discards whatever the final plan did not use.
+    """
+
+    def __init__(self, speculator: "Speculator", predictions: List[Prediction]):
+        self.speculator = speculator
+        self.predictions = predictions
+        self._lock = threading.Lock()
+
+    def claim(self, step, timeout: float = CLAIM_TIMEOUT) -> Optional[str]:
+        """
+        If a prediction matches the step, wait for its prefetch and return the result to commit
+        (None for warm-only predictions, failures and mismatches).
+        """
+        with self._lock:
+            prediction = next((p for p in self.predictions if not p.claimed and p.matches(step)), None)
+            if prediction is None:
+                return None
+            prediction.claimed = True
+        claimed_at = time.perf_counter()
+        try:
+            value = prediction.future.result(timeout=max(timeout, 0))
+        except FutureTimeout:
+            logger.info("Speculation: %s prefetch still running after %.1fs, discarding", step.action, timeout)
+            self.speculator.record(prediction, hit=False)
+            return None
+        except Exception as e:
+            logger.warning("Speculation: %s prefetch failed: %s", step.action, e)
+            self.speculator.record(prediction, hit=False)
+            return None
+        if prediction.commit and str(value).startswith(("Error", "Sorry")):
+            self.speculator.record(prediction, hit=False)
+            return None
+        # Without speculation the step would have spent the whole prefetch duration; it waited only this long
+        waited = time.perf_counter() - claimed_at
+        self.speculator.record(prediction, hit=True, saved=max(prediction.finished - prediction.started - waited, 0.0))
+        logger.info("Speculation: committed prefetched %s (waited %.3fs)", step.action, waited)
+        return value if prediction.commit else None
+
+    def finish(self):
+        with self._lock:
+            unclaimed = [p for p in self.predictions if not p.claimed]
+            for p in unclaimed:
+                p.claimed = True
+        for p in unclaimed:
+            # The request may still be in flight; its result is dropped when it lands
+            p.future.add_done_callback(lambda _, p=p: self.speculator.record(p, hit=False))
+
+
+class Speculator:
+    """
+    Starts side-effect-free work predicted from the transcript while the agent is still planning.
+    """
+
+    def __init__(self, enabled: bool = SPECULATE, max_workers: int = MAX_WORKERS):
+        self.enabled = enabled
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self.stats = {"turns": 0, "predictions": 0, "hits": 0, "misses": 0,
+                      "seconds_saved": 0.0, "seconds_wasted": 0.0}
+
+    def _work(self, prediction: Prediction) -> Callable[[], object]:
+        if prediction.action == "perform_calculation":
+            return lambda: actions.perform_calculation(prediction.argument)
+        return lambda: app_index.resolve(prediction.argument)
+
+    def _run(self, prediction: Prediction, work: Callable[[], object]):
+        try:
+            with span(f"speculate.{prediction.action}"):
+                return work()
+        finally:
+            prediction.finished = time.perf_counter()
+
+    def start(self, transcript: str, engine=None) -> Speculation:
+        predictions = predict(transcript) if self.enabled else []
+        if engine is not None:
+            # A result the engine already memoized would never be claimed
+            predictions = [p for p in predictions if not (p.commit and engine.is_memoized(p.step()))]
+        for prediction in predictions:
+            prediction.started = time.perf_counter()
+            # copy_context: the prefetch's model/API usage is charged to the current session
+            prediction.future = self._pool.submit(
+                contextvars.copy_context().run, self._run, prediction, self._work(prediction)
+            )
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats["predictions"] += len(predictions)
+        if predictions:
+            logger.info("Speculation: prefetching %s", [(p.action, p.key) for p in predictions])
+        return Speculation(self, predictions)
+
+    @contextmanager
+    def speculate(self, engine, transcript: str):
+        """
+        Prefetch for transcript and let engine's steps claim the results for the rest of the block.
+        """
+        speculation = self.start(transcript, engine)
+        engine.speculation = speculation
+        try:
+            yield speculation
+        finally:
+            engine.speculation = None
+            speculation.finish()
+
+    def record(self, prediction: Prediction, hit: bool, saved: float = 0.0):
+        with self._lock:
+            if hit:
+                self.stats["hits"] += 1
+                self.stats["seconds_saved"] += saved
+            else:
+                self.stats["misses"] += 1
+                if prediction.finished is not None:
+                    self.stats["seconds_wasted"] += prediction.finished - prediction.started
+
+    def reset(self):
+        with self._lock:
+            self.stats.update(turns=0, predictions=0, hits=0, misses=0, seconds_saved=0.0, seconds_wasted=0.0)
+
+    def hit_rate(self) -> float:
+        resolved = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / resolved if resolved else 0.0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "hit_rate": round(self.hit_rate(), 3),
+                    "seconds_saved": round(self.stats["seconds_saved"], 3),
+                    "seconds_wasted": round(self.stats["seconds_wasted"], 3)}
+
+
+speculator = Speculator()
+
+# Usage:
+# with speculator.speculate(engine, transcript):   # right after STT, before planning
+#     ...plan with the agent and run the workflow on engine...
+# speculator.summary()["hit_rate"]
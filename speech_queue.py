@@ -0,0 +1,93 @@
+import queue
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from logging_setup import logger
+from tts_cache import TTSCache
+
+
+def play_audio(path: str):
+    subprocess.run(["afplay", path])
+
+
+class SpeechQueue:
+    """
+    Collects everything JARVIS wants to say during one turn and speaks it in a single pass.
+    Duplicate utterances are dropped, synthesis of each segment starts as soon as it is added
+    (so segments are synthesized concurrently), and playback follows the order of add().
+    """
+
+    def __init__(self, client, tts_cache: TTSCache, player: Callable[[str], None] = play_audio,
+                 max_workers: int = 4):
+        self.client = client
+        self.tts_cache = tts_cache
+        self.player = player
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._pending = queue.Queue()
+        self._seen = set()
+        self._player_thread = None
+
+    def add(self, text: Optional[str]):
+        text = (text or "").strip()
+        if not text:
+            return
+        if text in self._seen:
+            logger.info("SpeechQueue dropped duplicate segment: %r", text[:60])
+            return
+        self._seen.add(text)
+        future = self._pool.submit(self.tts_cache.synthesize, self.client, text)
+        self._pending.put((text, future))
+
+    def start_playback(self):
+        """
+        Play segments in the background as soon as they are synthesized, instead of waiting
+        for flush(). Used when the response is streamed in while the turn is still running.
+        """
+        if self._player_thread and self._player_thread.is_alive():
+            return
+        self._player_thread = threading.Thread(target=self._playback_loop, name="speech-player", daemon=True)
+        self._player_thread.start()
+
+    def _playback_loop(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                self._play(*item)
+            finally:
+                self._pending.task_done()
+
+    def _play(self, text, future):
+        try:
+            path = future.result()
+        except Exception as e:
+            logger.error("SpeechQueue synthesis failed for %r: %s", text[:60], e)
+            return
+        logger.info("SpeechQueue playing audio: %s", path)
+        self.player(path)
+
+    def flush(self):
+        """
+        Play everything queued for this turn in order and block until it has been spoken.
+        """
+        if self._player_thread and self._player_thread.is_alive():
+            self._pending.put(None)
+            self._pending.join()
+            self._player_thread = None
+        else:
+            while True:
+                try:
+                    item = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                self._play(*item)
+                self._pending.task_done()
+        self._seen.clear()
+
+# Usage:
+# speech = SpeechQueue(client, TTSCache())
+# speech.add("Opening Safari.")
+# speech.add("Done, sir.")
+# speech.flush()
@@ -0,0 +1,242 @@
+import os
+import json
+import math
+import time
+import atexit
+import threading
+import functools
+from collections import deque
+from typing import Callable, Dict, Optional
+from logging_setup import logger, LOG_DIR
+
+# Tracing is off unless JARVIS_TRACE=1; when off, span() and @traced cost one attribute check
+TRACING_ENABLED = os.getenv("JARVIS_TRACE") == "1"
+TRACE_DIR = os.getenv("JARVIS_TRACE_DIR", os.path.join(LOG_DIR, "traces"))
+MAX_EVENTS = 100_000  # spans kept for export; histograms keep counting past this
+HISTOGRAM_PRECISION = 0.01  # relative bucket width, i.e. percentiles are accurate to ~1%
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of durations: log-spaced buckets with a fixed relative error, so memory
+    stays constant however many samples are recorded and percentiles are read straight off the counts.
+    """
+
+    _LOG_BASE = math.log1p(HISTOGRAM_PRECISION)
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        micros = max(seconds * 1e6, 1.0)
+        index = int(math.log(micros) / self._LOG_BASE)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        Duration in seconds below which p percent of the samples fall.
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * p / 100.0))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                upper = math.exp((index + 1) * self._LOG_BASE) / 1e6
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1e3, 3),
+            "min_ms": round(self.min * 1e3, 3),
+            "p50_ms": round(self.percentile(50) * 1e3, 3),
+            "p95_ms": round(self.percentile(95) * 1e3, 3),
+            "p99_ms": round(self.percentile(99) * 1e3, 3),
+            "max_ms": round(self.max * 1e3, 3),
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        # Attach attributes discovered inside the span, e.g. span.set(cached=True)
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """
+    Records named spans (STT, memory retrieval, agent planning, workflow steps, API calls, TTS)
+    into per-name latency histograms and a bounded event buffer for JSONL / Chrome-trace export.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, max_events: int = MAX_EVENTS):
+        self.enabled = enabled
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+        self._wall_epoch = time.time()
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name: str, start: float, duration: float, attrs: Optional[Dict] = None):
+        event = {
+            "name": name,
+            "start": start - self._epoch,
+            "duration": duration,
+            "thread": threading.get_ident(),
+            "attrs": attrs or {},
+        }
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(duration)
+            self.events.append(event)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """
+        Decorator form of span(); the span is named after the function unless name is given.
+        """
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.events.clear()
+
+    def export_jsonl(self, path: str) -> str:
+        """
+        One JSON object per span: name, wall-clock start, duration in ms, thread and attributes.
+        """
+        with self._lock:
+            events = list(self.events)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for e in events:
+                f.write(json.dumps({
+                    "name": e["name"],
+                    "ts": round(self._wall_epoch + e["start"], 6),
+                    "duration_ms": round(e["duration"] * 1e3, 3),
+                    "thread": e["thread"],
+                    "attrs": e["attrs"],
+                }, default=str) + "\n")
+        return path
+
+    def export_chrome_trace(self, path: str) -> str:
+        """
+        Chrome trace-event JSON (complete "X" events); open in chrome://tracing or ui.perfetto.dev.
+        """
+        with self._lock:
+            events = list(self.events)
+        trace = {"traceEvents": [
+            {
+                "name": e["name"],
+                "ph": "X",
+                "ts": round(e["start"] * 1e6, 1),
+                "dur": round(e["duration"] * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": e["thread"],
+                "args": e["attrs"],
+            }
+            for e in events
+        ], "displayTimeUnit": "ms"}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, default=str)
+        return path
+
+    def dump(self, directory: str = TRACE_DIR) -> Optional[str]:
+        """
+        Write the summary and both export formats into directory; returns the file prefix used.
+        """
+        if not self.events:
+            return None
+        prefix = os.path.join(directory, time.strftime("trace-%Y%m%d-%H%M%S"))
+        self.export_jsonl(f"{prefix}.jsonl")
+        self.export_chrome_trace(f"{prefix}.chrome.json")
+        with open(f"{prefix}.summary.json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        logger.info("Trace written to %s.{jsonl,chrome.json,summary.json}", prefix)
+        return prefix
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+
+
+@atexit.register
+def _dump_on_exit():
+    if tracer.enabled:
+        tracer.dump()
+
+# Usage:
+# JARVIS_TRACE=1 python main.py   (traces land in logs/traces/ on exit)
+# with span("stt", model="whisper-1"):
+#     transcript = transcribe(path)
+# @traced("brain.think")
+# def jarvis_think(user_command): ...
+# tracer.summary()["stt"]["p95_ms"]
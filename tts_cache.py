@@ -0,0 +1,139 @@
+import os
+import hashlib
+import threading
+from typing import Iterable, Optional
+from logging_setup import logger
+from request_governor import governor
+from tracing import span
+
+TTS_CACHE_DIR = os.getenv("JARVIS_TTS_CACHE_DIR", os.path.join("cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("JARVIS_TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+TTS_MODEL = "tts-1"
+TTS_VOICE = "onyx"
+TTS_FORMAT = "mp3"
+
+# Phrases JARVIS says often enough to be worth pre-rendering at startup.
+# Override with JARVIS_TTS_WARM_PHRASES (entries separated by "|").
+DEFAULT_WARM_PHRASES = [
+    "I need more information to proceed.",
+    "Letter updated.",
+    "Letter cleared.",
+    "Draft letter created.",
+]
+
+
+def warm_phrases_from_env() -> list:
+    raw = os.getenv("JARVIS_TTS_WARM_PHRASES")
+    if not raw:
+        return list(DEFAULT_WARM_PHRASES)
+    return [p.strip() for p in raw.split("|") if p.strip()]
+
+
+class TTSCache:
+    """
+    On-disk cache of synthesized speech, keyed by (model, voice, text, format).
+    Entries are evicted least-recently-used first once the directory exceeds max_bytes;
+    recency is tracked through file mtimes so it survives restarts.
+    """
+
+    def __init__(self, path: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, voice: str, text: str, response_format: str) -> str:
+        raw = "\x1f".join([model, voice, response_format, text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str, response_format: str) -> str:
+        return os.path.join(self.path, f"{key}.{response_format}")
+
+    def get(self, model: str, voice: str, text: str, response_format: str = TTS_FORMAT) -> Optional[str]:
+        path = self._file(self.key(model, voice, text, response_format), response_format)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, model: str, voice: str, text: str, audio: bytes, response_format: str = TTS_FORMAT) -> str:
+        path = self._file(self.key(model, voice, text, response_format), response_format)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.path):
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            logger.info("TTSCache evicted entries, size now %s bytes", total)
+
+    def synthesize(self, client, text: str, model: str = TTS_MODEL, voice: str = TTS_VOICE,
+                   response_format: str = TTS_FORMAT) -> str:
+        """
+        Return the path of an audio file for `text`, calling the TTS API only on a cache miss.
+        """
+        with span("tts.synthesize", chars=len(text)) as tts_span:
+            path = self.get(model, voice, text, response_format)
+            tts_span.set(cached=bool(path))
+            if path:
+                logger.info("TTSCache hit for text: %r", text[:60])
+                return path
+            logger.info("TTSCache miss for text: %r", text[:60])
+            tts_response = governor.call(
+                "speech", client.audio.speech.create,
+                model=model,
+                voice=voice,
+                input=text,
+                response_format=response_format
+            )
+            return self.put(model, voice, text, tts_response.content, response_format)
+
+    def warm_up(self, client, phrases: Optional[Iterable[str]] = None, background: bool = True):
+        """
+        Pre-render `phrases` (defaults to warm_phrases_from_env()) so they play instantly later.
+        """
+        phrases = list(phrases) if phrases is not None else warm_phrases_from_env()
+
+        def _run():
+            for phrase in phrases:
+                try:
+                    self.synthesize(client, phrase)
+                except Exception as e:
+                    logger.error("TTSCache warm-up failed for %r: %s", phrase, e)
+            logger.info("TTSCache warm-up finished for %s phrases", len(phrases))
+
+        if background:
+            thread = threading.Thread(target=_run, name="tts-warmup", daemon=True)
+            thread.start()
+            return thread
+        _run()
+        return None
+
+# Usage:
+# cache = TTSCache()
+# cache.warm_up(client)
+# mp3_path = cache.synthesize(client, "Hello, sir.")
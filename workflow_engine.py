@@ -1,210 +1,516 @@
-from workflow_models import Workflow, Action, ValidationError
-from typing import Any, Dict, List
+from workflow_models import Workflow, Action, validate_workflow, format_errors
+from typing import Any, Dict, List, Tuple
 import actions
-import importlib
+from auto_tool_generation import get_generated_tool, generation_coordinator
+from app_index import app_index, launch_app, APP_ALIASES
 from logging_setup import logger
-import subprocess
+from tracing import span
+from metering import meter, attribute
 import re
+import time
+import random
+import asyncio
+import threading
+import json
+import itertools
+import uuid
+from collections import OrderedDict
+import contextvars
+from action_registry import get_action_meta
+from speculation import CLAIM_TIMEOUT
+
+MAX_MEMO_ENTRIES = 256  # memoized pure results kept per engine (least recently used dropped first)
+STEP_TIMEOUT = 30.0  # seconds allowed for a single attempt of one step
+WORKFLOW_TIMEOUT = 120.0  # seconds allowed for a whole workflow
+MAX_RETRIES = 2  # extra attempts for idempotent steps that time out
+RETRY_BACKOFF = 0.5  # base delay in seconds, doubled per attempt and jittered
+
+
 class WorkflowEngine:
-    def __init__(self):
+    def __init__(self, background_tool_generation: bool = False, step_timeout: float = STEP_TIMEOUT,
+                 workflow_timeout: float = WORKFLOW_TIMEOUT, max_retries: int = MAX_RETRIES):
+        # When set, unknown actions return a pending status while their tool is generated off-thread
+        self.background_tool_generation = background_tool_generation
+        self.step_timeout = step_timeout
+        self.workflow_timeout = workflow_timeout
+        self.max_retries = max_retries
+        self._cancelled = threading.Event()
+        # Memoized results of pure steps: (action, params) -> (workflow_id, expires_at, result)
+        self._memo: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._workflow_ids = itertools.count(1)
+        self._workflow_id = 0
+        self.workflow_tag = None
+        # Per-turn speculation.Speculation whose prefetched results steps may claim instead of running
+        self.speculation = None
         self.last_workflow = None
         self.last_results = None
         logger.info("WorkflowEngine initialized")
 
+    def check_workflow(self, workflow_json: Any) -> Tuple[Workflow | None, List[str]]:
+        """
+        Validate once and return (workflow, missing): the workflow, or None with a readable line
+        per missing or invalid field. A Workflow instance is already valid and is returned as is.
+        """
+        logger.debug("check_workflow called with: %r", workflow_json)
+        wf, errors = validate_workflow(workflow_json)
+        if wf is None:
+            missing = format_errors(errors)
+            logger.warning("check_workflow found: %s", missing)
+            return None, missing
+        return wf, []
+
     def validate_workflow(self, workflow_json: Any) -> Workflow | None:
-        logger.info(f"validate_workflow called with: {workflow_json!r}")
-        try:
-            if isinstance(workflow_json, str):
-                wf = Workflow.parse_raw(workflow_json)
+        return self.check_workflow(workflow_json)[0]
+
+    def execute_workflow(self, workflow: Workflow, user_utterance: str = "") -> Dict:
+        logger.debug("execute_workflow called with workflow: %s", workflow)
+        with span("workflow.execute", steps=len(workflow.steps)):
+            return self._execute_workflow(workflow, user_utterance)
+
+    def _execute_workflow(self, workflow: Workflow, user_utterance: str) -> Dict:
+        deadline = self.begin_workflow()
+        results = []
+        for batch in self.schedule(workflow.steps):
+            if len(batch) == 1:
+                results.append(self.run_step(batch[0], user_utterance=user_utterance, deadline=deadline))
+                continue
+            # Side-effect-free steps in a batch run concurrently; results keep workflow order
+            logger.info("execute_workflow running %s read-only steps concurrently", len(batch))
+            slots = [None] * len(batch)
+            # Identical pure steps in one batch are run once and the result shared
+            first_index = {}
+            for i, step in enumerate(batch):
+                if get_action_meta(step.action).pure:
+                    first_index.setdefault(self._memo_key(step), i)
+
+            def _run(i, step):
+                slots[i] = self.run_step(step, user_utterance=user_utterance, deadline=deadline)
+
+            threads = [
+                threading.Thread(target=contextvars.copy_context().run, args=(_run, i, step), daemon=True)
+                for i, step in enumerate(batch)
+                if first_index.get(self._memo_key(step), i) == i
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for i, step in enumerate(batch):
+                if slots[i] is None:
+                    slots[i] = {**slots[first_index[self._memo_key(step)]], "cached": True}
+            results.extend(slots)
+        return self.finish_workflow(workflow, results)
+
+    @staticmethod
+    def schedule(steps: List[Action]) -> List[List[Action]]:
+        """
+        Split steps into ordered batches: consecutive concurrency-safe (read-only) steps share a batch,
+        every step with side effects runs alone and acts as a barrier.
+        """
+        batches = []
+        for step in steps:
+            if batches and get_action_meta(step.action).concurrent_safe and \
+                    all(get_action_meta(s.action).concurrent_safe for s in batches[-1]):
+                batches[-1].append(step)
             else:
-                wf = Workflow.parse_obj(workflow_json)
-            logger.info("validate_workflow success")
-            return wf
-        except ValidationError as e:
-            logger.error(f"validate_workflow error: {e}")
+                batches.append([step])
+        return batches
+
+    @staticmethod
+    def _memo_key(step: Action) -> tuple:
+        params = step.model_dump(exclude_none=True, exclude={"action"})
+        return step.action, json.dumps(params, sort_keys=True, default=str)
+
+    def _memo_lookup(self, step: Action) -> Dict | None:
+        meta = get_action_meta(step.action)
+        if not meta.pure:
             return None
+        with self._memo_lock:
+            key = self._memo_key(step)
+            entry = self._memo.get(key)
+            if entry is not None:
+                self._memo.move_to_end(key)
+        if entry is None:
+            return None
+        workflow_id, expires_at, result = entry
+        if workflow_id != self._workflow_id and time.monotonic() > expires_at:
+            return None
+        return result
 
-    def execute_workflow(self, workflow: Workflow, user_utterance: str = "") -> Dict:
-        logger.info(f"execute_workflow called with workflow: {workflow}")
+    def is_memoized(self, step: Action) -> bool:
+        return self._memo_lookup(step) is not None
+
+    def _memo_get(self, step: Action) -> Dict | None:
+        result = self._memo_lookup(step)
+        if result is None:
+            return None
+        logger.info("execute_workflow step %s: memoized result reused", step.action)
+        return {**result, "cached": True}
+
+    def _claim_speculative(self, step: Action, deadline: float | None, started: float) -> Dict | None:
+        speculation = self.speculation
+        if speculation is None:
+            return None
+        # A stalled prefetch is a miss after CLAIM_TIMEOUT; the step still gets its own attempts
+        value = speculation.claim(step, timeout=min(CLAIM_TIMEOUT, self._attempt_timeout(deadline)))
+        if value is None:
+            return None
+        result = {"action": step.action, "result": value, "status": "ok",
+                  "elapsed": round(time.monotonic() - started, 3)}
+        self._memo_put(step, result)
+        return {**result, "speculative": True}
+
+    def _memo_put(self, step: Action, result: Dict):
+        meta = get_action_meta(step.action)
+        text = str(result.get("result", ""))
+        # Failures are reported as "Error ..."/"Sorry ..." strings and must not be cached
+        if not meta.pure or text.startswith(("Error", "Sorry")):
+            return
+        key, now = self._memo_key(step), time.monotonic()
+        with self._memo_lock:
+            # Drop entries that can no longer be served, then the least recently used beyond the cap
+            for stale in [k for k, (workflow_id, expires_at, _) in self._memo.items()
+                          if workflow_id != self._workflow_id and now > expires_at]:
+                del self._memo[stale]
+            self._memo[key] = (self._workflow_id, now + meta.cache_ttl, result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > MAX_MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+
+    async def execute_workflow_async(self, workflow: Workflow, user_utterance: str = "") -> Dict:
+        """
+        Async counterpart of execute_workflow; cancelling the awaiting task cancels the workflow.
+        """
+        logger.info("execute_workflow_async called with workflow: %s", workflow)
+        deadline = self.begin_workflow()
         results = []
-        for step in workflow.steps:
-            action = step.action
-            logger.info(f"execute_workflow step: {action}")
-            # Dynamically dispatch to actions module
-            # Always try to launch apps for open_application or system_command
-            auto_tool_match = False
-            user_confirmation_needed = False
-            if action == "open_application":
-                app_name = getattr(step, "app_name", None) or getattr(step, "subject", None) or getattr(step, "body", None)
-                if app_name:
-                    auto_result = self.auto_tool_handler(app_name.lower(), step)
-                    result = auto_result
-                    auto_tool_match = True
-                    # Only prompt if failed
-                    if "Failed to open" in auto_result:
-                        user_confirmation_needed = True
-            elif action == "system_command":
-                command = getattr(step, "command", "")
-
-                match = re.search(r"(open|launch|start)\s+['\"]?([a-zA-Z0-9 ._-]+)['\"]?", command.lower())
-                if match:
-                    app_name = match.group(2)
-                    auto_result = self.auto_tool_handler(app_name, step)
-                    result = auto_result
-                    auto_tool_match = True
-                    if "Failed to open" in auto_result:
-                        user_confirmation_needed = True
-                else:
-                    result = f"System command '{command}' received (not executed for safety)."
-                    user_confirmation_needed = True
-            if not auto_tool_match and hasattr(actions, action):
-                func = getattr(actions, action)
-                # Only pass relevant fields that match the function signature
-                import inspect
-                sig = inspect.signature(func)
-                valid_params = {k: v for k, v in step.dict().items() if v is not None and k != "action" and k in sig.parameters}
-                extra_params = {k: v for k, v in step.dict().items() if v is not None and k != "action" and k not in sig.parameters}
-                if extra_params:
-                    logger.warning(f"execute_workflow: extra params for {action} dropped: {extra_params}")
+        try:
+            for step in workflow.steps:
+                results.append(await self.run_step_async(step, user_utterance=user_utterance, deadline=deadline))
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        return self.finish_workflow(workflow, results)
+
+    def begin_workflow(self) -> float:
+        """
+        Reset cancellation, open a new memoization scope and return the workflow's deadline.
+        """
+        self._cancelled.clear()
+        self._workflow_id = next(self._workflow_ids)
+        # Globally unique, unlike _workflow_id; model usage made by the steps is charged to it
+        self.workflow_tag = uuid.uuid4().hex[:12]
+        return time.monotonic() + self.workflow_timeout
+
+    def cancel(self):
+        """
+        Stop waiting on the running step and skip the remaining ones. A step that is already
+        running in a worker thread is abandoned, not killed.
+        """
+        logger.warning("WorkflowEngine: workflow cancelled")
+        self._cancelled.set()
+
+    def _attempts(self, step: Action) -> int:
+        return 1 + (self.max_retries if get_action_meta(step.action).idempotent else 0)
+
+    def _attempt_timeout(self, deadline: float | None) -> float:
+        if deadline is None:
+            return self.step_timeout
+        return min(self.step_timeout, deadline - time.monotonic())
+
+    @staticmethod
+    def _status_result(step: Action, status: str, message: str, started: float) -> Dict:
+        logger.warning("execute_workflow step %s: %s", step.action, status)
+        return {"action": step.action, "result": message, "status": status,
+                "elapsed": round(time.monotonic() - started, 3)}
+
+    def _budget_result(self, step: Action, attempted: int, started: float) -> Dict:
+        if attempted:
+            return self._status_result(step, "timeout", f"Step '{step.action}' timed out.", started)
+        return self._status_result(step, "skipped", f"Step '{step.action}' skipped: workflow time budget exhausted.", started)
+
+    def _backoff(self, attempt: int, deadline: float | None) -> float:
+        delay = RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if deadline is not None:
+            delay = min(delay, max(deadline - time.monotonic(), 0))
+        return delay
+
+    def run_step(self, step: Action, user_utterance: str = "", deadline: float | None = None) -> Dict:
+        """
+        Run execute_step on a worker thread, bounded by step_timeout and the workflow deadline.
+        Idempotent steps that time out are retried with jittered exponential backoff.
+        Timeouts, cancellation and an exhausted budget produce a result with a "status" instead of blocking.
+        """
+        with span(f"workflow.step.{step.action}") as step_span, attribute(workflow=self.workflow_tag):
+            result = self._run_step(step, user_utterance, deadline)
+            step_span.set(status=result.get("status"), cached=result.get("cached", False),
+                          speculative=result.get("speculative", False))
+        return result
+
+    def _run_step(self, step: Action, user_utterance: str, deadline: float | None) -> Dict:
+        started = time.monotonic()
+        memoized = self._memo_get(step)
+        if memoized is not None:
+            return memoized
+        speculative = self._claim_speculative(step, deadline, started)
+        if speculative is not None:
+            return speculative
+        attempted = 0
+        for attempt in range(self._attempts(step)):
+            if self._cancelled.is_set():
+                return self._status_result(step, "cancelled", f"Step '{step.action}' was cancelled.", started)
+            timeout = self._attempt_timeout(deadline)
+            if timeout <= 0:
+                break
+            attempted += 1
+            done = threading.Event()
+            box = {}
+
+            def _target():
                 try:
-                    result = func(**valid_params)
-                    logger.info(f"execute_workflow {action} result: {result!r}")
-                except TypeError as e:
-                    # Self-healing: detect missing/invalid arguments and prompt for clarification
-                    logger.error(f"execute_workflow argument error in {action}: {e}")
-                    missing_args = []
-                    import re
-                    match = re.findall(r"missing (\d+) required positional argument[s]?: (.+)", str(e))
-                    if match:
-                        arglist = match[0][1].replace("'", "").replace('"', "").split(", ")
-                        missing_args = [arg.strip() for arg in arglist]
-                    if missing_args:
-                        result = (
-                            f"Step '{action}' failed: missing required arguments: {missing_args}. "
-                            f"Please provide the missing information to continue."
-                        )
-                        user_confirmation_needed = True
-                    else:
-                        result = f"Error executing {action}: {e}"
-                        user_confirmation_needed = True
+                    box["value"] = self.execute_step(step, user_utterance=user_utterance)
                 except Exception as e:
-                    logger.error(f"execute_workflow error in {action}: {e}")
-                    result = f"Error executing {action}: {e}"
+                    box["error"] = e
+                finally:
+                    done.set()
+
+            # Daemon thread rather than a pool: a hung call must not hold a worker or block interpreter exit.
+            # The caller's context (e.g. a server session's document) is carried into the thread.
+            threading.Thread(target=contextvars.copy_context().run, args=(_target,),
+                             name=f"step-{step.action}", daemon=True).start()
+            attempt_deadline = time.monotonic() + timeout
+            while not done.is_set() and not self._cancelled.is_set():
+                remaining = attempt_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done.wait(min(remaining, 0.1))
+            if done.is_set():
+                if "error" in box:
+                    return self._status_result(step, "error", f"Error executing {step.action}: {box['error']}", started)
+                result = {**box["value"], "status": "ok", "elapsed": round(time.monotonic() - started, 3)}
+                self._memo_put(step, result)
+                return result
+            if self._cancelled.is_set():
+                return self._status_result(step, "cancelled", f"Step '{step.action}' was cancelled.", started)
+            logger.warning("execute_workflow step %s timed out after %.1fs (attempt %s)", step.action, timeout, attempt + 1)
+            if attempt + 1 < self._attempts(step):
+                time.sleep(self._backoff(attempt, deadline))
+        return self._budget_result(step, attempted, started)
+
+    @staticmethod
+    def _thread_future(fn, *args) -> asyncio.Future:
+        # Like asyncio.to_thread, but on a daemon thread so an abandoned step cannot block loop shutdown
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _set(setter, value):
+            if not future.done():
+                setter(value)
+
+        def _target():
+            try:
+                value = fn(*args)
+            except Exception as e:
+                loop.call_soon_threadsafe(_set, future.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(_set, future.set_result, value)
+
+        threading.Thread(target=contextvars.copy_context().run, args=(_target,), daemon=True).start()
+        return future
+
+    async def _execute_step_in_thread(self, step: Action, user_utterance: str) -> Dict:
+        return await self._thread_future(self.execute_step, step, user_utterance)
+
+    async def run_step_async(self, step: Action, user_utterance: str = "", deadline: float | None = None) -> Dict:
+        """
+        asyncio version of run_step; task cancellation propagates as CancelledError.
+        """
+        with attribute(workflow=self.workflow_tag):
+            return await self._run_step_async(step, user_utterance, deadline)
+
+    async def _run_step_async(self, step: Action, user_utterance: str, deadline: float | None) -> Dict:
+        started = time.monotonic()
+        memoized = self._memo_get(step)
+        if memoized is not None:
+            return memoized
+        if self.speculation is not None:
+            # Waiting on an in-flight prefetch blocks, so it happens off the event loop
+            speculative = await self._thread_future(self._claim_speculative, step, deadline, started)
+            if speculative is not None:
+                return speculative
+        attempted = 0
+        for attempt in range(self._attempts(step)):
+            if self._cancelled.is_set():
+                return self._status_result(step, "cancelled", f"Step '{step.action}' was cancelled.", started)
+            timeout = self._attempt_timeout(deadline)
+            if timeout <= 0:
+                break
+            attempted += 1
+            try:
+                value = await asyncio.wait_for(self._execute_step_in_thread(step, user_utterance), timeout)
+                result = {**value, "status": "ok", "elapsed": round(time.monotonic() - started, 3)}
+                self._memo_put(step, result)
+                return result
+            except asyncio.TimeoutError:
+                logger.warning("execute_workflow step %s timed out after %.1fs (attempt %s)", step.action, timeout, attempt + 1)
+            except Exception as e:
+                return self._status_result(step, "error", f"Error executing {step.action}: {e}", started)
+            if attempt + 1 < self._attempts(step):
+                await asyncio.sleep(self._backoff(attempt, deadline))
+        return self._budget_result(step, attempted, started)
+
+    def finish_workflow(self, workflow: Workflow, results: List[Dict]) -> Dict:
+        self.last_workflow = workflow
+        self.last_results = results
+        logger.info("execute_workflow results: %r", results)
+        return {"workflow": workflow.model_dump(), "results": results,
+                "workflow_id": self.workflow_tag, "usage": meter.workflow_usage(self.workflow_tag)}
+
+    def execute_step(self, step: Action, user_utterance: str = "") -> Dict:
+        """
+        Execute a single workflow step and return {"action": ..., "result": ...}.
+        """
+        action = step.action
+        logger.info("execute_workflow step: %s", action)
+        # Each action model declares only its own fields, so this is exactly the step's arguments
+        fields = step.model_dump(exclude_none=True, exclude={"action"})
+        # Dynamically dispatch to actions module
+        # Always try to launch apps for open_application or system_command
+        auto_tool_match = False
+        user_confirmation_needed = False
+        if action == "open_application":
+            app_name = step.app_name
+            if app_name:
+                auto_result = self.auto_tool_handler(app_name.lower(), step)
+                result = auto_result
+                auto_tool_match = True
+                # Only prompt if failed
+                if "Failed to open" in auto_result:
+                    user_confirmation_needed = True
+        elif action == "system_command":
+            command = step.command
+
+            match = re.search(r"(open|launch|start)\s+['\"]?([a-zA-Z0-9 ._-]+)['\"]?", command.lower())
+            if match:
+                app_name = match.group(2)
+                # Free-form command text only ever opens GUI applications, never a PATH executable
+                auto_result = self.auto_tool_handler(app_name, step, include_cli=False)
+                result = auto_result
+                auto_tool_match = True
+                if "Failed to open" in auto_result:
+                    user_confirmation_needed = True
+            else:
+                result = f"System command '{command}' received (not executed for safety)."
+                user_confirmation_needed = True
+        # Built-in actions first, then tools generated (and persisted) by earlier workflows
+        func = None if auto_tool_match else getattr(actions, action, None) or get_generated_tool(action)
+        if func is not None:
+            # Only pass relevant fields that match the function signature
+            import inspect
+            sig = inspect.signature(func)
+            valid_params = {k: v for k, v in fields.items() if k in sig.parameters}
+            extra_params = {k: v for k, v in fields.items() if k not in sig.parameters}
+            if extra_params:
+                logger.warning("execute_workflow: extra params for %s dropped: %s", action, extra_params)
+            try:
+                with span(f"action.{action}"):
+                    result = func(**valid_params)
+                logger.info("execute_workflow %s result: %r", action, result)
+            except TypeError as e:
+                # Self-healing: detect missing/invalid arguments and prompt for clarification
+                logger.error("execute_workflow argument error in %s: %s", action, e)
+                missing_args = []
+                match = re.findall(r"missing (\d+) required positional argument[s]?: (.+)", str(e))
+                if match:
+                    arglist = match[0][1].replace("'", "").replace('"', "").split(", ")
+                    missing_args = [arg.strip() for arg in arglist]
+                if missing_args:
+                    result = (
+                        f"Step '{action}' failed: missing required arguments: {missing_args}. "
+                        f"Please provide the missing information to continue."
+                    )
                     user_confirmation_needed = True
-            elif not auto_tool_match and not action == "system_command":
-                logger.warning(f"execute_workflow unknown action: {action}")
-                # Fallback: try to infer app from user utterance
-                fallback_result = None
-                if user_utterance:
-                    for app in ["terminal", "photo booth", "camera", "reminders", "safari", "settings"]:
-                        if app in user_utterance.lower():
-                            fallback_result = self.auto_tool_handler(app, step)
-                            logger.info(f"Fallback auto-tool: tried to open {app} from user utterance.")
-                            break
-                if fallback_result:
-                    result = fallback_result
                 else:
-                    # Try to auto-generate the missing tool
-                    from auto_tool_generation import auto_generate_tool
-                    # Use the step's dict to get parameter names
-                    params = [k for k, v in step.dict().items() if v is not None and k != "action"]
-                    description = f"Auto-generated tool for action '{action}' with parameters {params}."
-                    gen_result = auto_generate_tool(action, params, description)
-                    logger.info(f"Auto-tool generation result: {gen_result}")
-                    # Try to call the new tool
-                    importlib.reload(actions)
-                    if hasattr(actions, action):
-                        func = getattr(actions, action)
-                        try:
-                            valid_params = {k: v for k, v in step.dict().items() if v is not None and k != "action"}
-                            result = func(**valid_params)
-                            logger.info(f"Auto-generated tool {action} executed with result: {result!r}")
-                        except Exception as e:
-                            logger.error(f"Auto-generated tool {action} failed: {e}")
-                            result = f"Auto-generated tool {action} failed: {e}"
-                    else:
-                        result = f"Auto-generated tool {action} could not be loaded."
+                    result = f"Error executing {action}: {e}"
+                    user_confirmation_needed = True
+            except Exception as e:
+                logger.error("execute_workflow error in %s: %s", action, e)
+                result = f"Error executing {action}: {e}"
                 user_confirmation_needed = True
-            # After each step, check if user confirmation is needed
-            if user_confirmation_needed:
-                result += (
-                    " [Please confirm: Did this step succeed? If not, would you like to retry, clarify, or try an alternative?]"
+        elif not auto_tool_match and not action == "system_command":
+            logger.warning("execute_workflow unknown action: %s", action)
+            # Fallback: try to infer app from user utterance
+            fallback_result = None
+            if user_utterance:
+                for app in ["terminal", "photo booth", "camera", "reminders", "safari", "settings"]:
+                    if app in user_utterance.lower():
+                        fallback_result = self.auto_tool_handler(app, step)
+                        logger.info("Fallback auto-tool: tried to open %s from user utterance.", app)
+                        break
+            if fallback_result:
+                result = fallback_result
+            else:
+                # Try to auto-generate the missing tool (deduplicated and backed off by the coordinator)
+                # Use the step's dict to get parameter names
+                params = list(fields)
+                description = f"Auto-generated tool for action '{action}' with parameters {params}."
+                status, value = generation_coordinator.request(
+                    action, params, description, background=self.background_tool_generation
                 )
-            results.append({"action": action, "result": result})
-        self.last_workflow = workflow
-        self.last_results = results
-        logger.info(f"execute_workflow results: {results!r}")
-        return {"workflow": workflow.dict(), "results": results}
+                logger.info("Auto-tool generation status for %s: %s", action, status)
+                # Try to call the new tool
+                if status == "pending":
+                    result = f"Tool {action} is being generated in the background and will be available for later requests."
+                elif status == "ready":
+                    func = value
+                    try:
+                        result = func(**fields)
+                        logger.info("Auto-generated tool %s executed with result: %r", action, result)
+                    except Exception as e:
+                        logger.error("Auto-generated tool %s failed: %s", action, e)
+                        result = f"Auto-generated tool {action} failed: {e}"
+                else:
+                    result = f"Auto-generated tool {action} could not be loaded. ({value})"
+            user_confirmation_needed = True
+        # After each step, check if user confirmation is needed
+        if user_confirmation_needed:
+            result += (
+                " [Please confirm: Did this step succeed? If not, would you like to retry, clarify, or try an alternative?]"
+            )
+        return {"action": action, "result": result}
 
-    def auto_tool_handler(self, action, step):
+    def auto_tool_handler(self, action, step, include_cli=True):
         """
         Attempt to handle unknown actions by opening system apps or providing guidance.
-        Adapts to macOS, Windows, or Linux, and asks for clarification if needed.
+        Apps are resolved through the installed-application index, so unknown apps are rejected
+        without spawning a process and launches never block the workflow.
+        include_cli=False (system_command) only opens GUI applications.
         """
-        import subprocess
         import platform
 
         os_type = platform.system().lower()
-        logger.info(f"auto_tool_handler: Detected OS: {os_type}")
+        logger.info("auto_tool_handler: Detected OS: %s", os_type)
 
-        def try_open(app_name, friendly_name=None):
+        entry = app_index.resolve(action, include_cli=include_cli)
+        if entry:
             try:
-                if os_type == "darwin":
-                    subprocess.run(["open", "-a", app_name], check=True)
-                elif os_type == "windows":
-                    subprocess.run(["start", "", app_name], shell=True, check=True)
-                elif os_type == "linux":
-                    subprocess.run(["xdg-open", app_name], check=True)
-                else:
-                    return f"Unsupported OS for auto-tool: {os_type}"
-                logger.info(f"Auto-tool: Opened {app_name} on {os_type}.")
-                return f"Opened {friendly_name or app_name} on your {os_type.capitalize()} system."
+                launch_app(entry)
+                logger.info("Auto-tool: Opened %s on %s.", entry.name, os_type)
+                return f"Opened {entry.name} on your {os_type.capitalize()} system."
             except Exception as e:
-                logger.error(f"Auto-tool error opening {app_name}: {e}")
-                return f"Failed to open {friendly_name or app_name}: {e}"
-
-        # Camera/Photo Booth
-        if "camera" in action or "photo booth" in action or "camera" in (step.subject or "") or "photo booth" in (step.subject or ""):
-            if os_type == "darwin":
-                return try_open("Photo Booth", "Photo Booth (camera)")
-            elif os_type == "windows":
-                return try_open("Camera", "Camera app")
-            elif os_type == "linux":
-                return try_open("cheese", "Cheese (camera app)")
-            else:
-                return f"Camera opening not supported on your OS: {os_type}"
-        # Reminders
-        if "reminder" in action or "reminder" in (step.subject or ""):
-            if os_type == "darwin":
-                return try_open("Reminders", "Reminders app")
-            elif os_type == "windows":
+                logger.error("Auto-tool error opening %s: %s", entry.name, e)
+                return f"Failed to open {entry.name}: {e}"
+        # Reminders have no standard app outside macOS
+        if "reminder" in action:
+            if os_type == "windows":
                 return "Please use the Windows 'Alarms & Clock' or 'Cortana' to set reminders."
             elif os_type == "linux":
                 return "Please use your preferred calendar/reminder app on Linux."
-        # Safari (web browser)
-        if "safari" in action or "browser" in action or "web" in action or "safari" in (step.subject or ""):
-            if os_type == "darwin":
-                return try_open("Safari", "Safari (web browser)")
-            elif os_type == "windows":
-                return try_open("chrome", "Chrome browser")
-            elif os_type == "linux":
-                return try_open("firefox", "Firefox browser")
-        # Terminal
-        if "terminal" in action or "shell" in action or "terminal" in (step.subject or ""):
-            if os_type == "darwin":
-                return try_open("Terminal", "Terminal")
-            elif os_type == "windows":
-                return try_open("cmd", "Command Prompt")
-            elif os_type == "linux":
-                return try_open("gnome-terminal", "Terminal")
-        # System Preferences/Settings
-        if "settings" in action or "preferences" in action or "system preferences" in (step.subject or ""):
-            if os_type == "darwin":
-                return try_open("System Settings", "System Settings")
-            elif os_type == "windows":
-                return try_open("ms-settings:", "Windows Settings")
-            elif os_type == "linux":
-                return try_open("gnome-control-center", "Settings")
+        # A known kind of app was requested but nothing suitable is installed
+        if any(alias in action for alias in APP_ALIASES):
+            logger.warning("Auto-tool: no installed application matches %r", action)
+            return f"Failed to open {action}: no matching application is installed on your {os_type.capitalize()} system."
         # If ambiguous, ask for clarification
         if "open" in action or "launch" in action or "start" in action:
             return (
@@ -219,17 +525,8 @@ class WorkflowEngine:
         )
 
     def handle_missing_info(self, workflow_json: Any) -> List[str]:
-        logger.info(f"handle_missing_info called with: {workflow_json!r}")
-        # Returns a list of missing required fields for each step
-        missing = []
-        try:
-            Workflow.parse_obj(workflow_json)
-        except ValidationError as e:
-            for err in e.errors():
-                loc = ".".join(str(x) for x in err["loc"])
-                missing.append(f"Missing or invalid: {loc} ({err['msg']})")
-            logger.warning(f"handle_missing_info found: {missing}")
-        return missing
+        # Returns a list of missing required fields for each step; prefer check_workflow, which validates once
+        return self.check_workflow(workflow_json)[1]
 
     def discover_and_extend(self, workflow: Workflow, context: Dict) -> Workflow:
         logger.info("discover_and_extend called")
@@ -239,9 +536,8 @@ class WorkflowEngine:
 
 # Example usage:
 # engine = WorkflowEngine()
-# wf = engine.validate_workflow(workflow_json)
+# wf, missing = engine.check_workflow(workflow_json)
 # if not wf:
-#     missing = engine.handle_missing_info(workflow_json)
 #     # Ask user for missing info
 # else:
 #     result = engine.execute_workflow(wf)
\ No newline at end of file
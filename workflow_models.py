@@ -1,37 +1,120 @@
-from pydantic import BaseModel, Field, ValidationError
-from typing import List, Optional, Literal, Dict, Any
-
-class Action(BaseModel):
-    action: Literal[
-        "create_letter",
-        "edit_letter",
-        "read_letter",
-        "clear_letter",
-        "send_letter_via_email_macos",
-        "web_search",
-        "transcribe_exactly",
-        "perform_calculation",
-        "handle_general_chat",
-        "open_application",
-        "system_command",
-        "discuss_programming"
-    ]
+from pydantic import AliasChoices, BaseModel, Field, TypeAdapter, ValidationError
+from typing import Annotated, Any, Dict, List, Literal, Optional, Tuple, Union
+
+# One model per action, each declaring only the fields its function in actions.py takes.
+# Action is a union discriminated on "action": validation goes straight to the matching model
+# (no trying every member) and reports a missing required field against that action.
+
+class CreateLetter(BaseModel):
+    action: Literal["create_letter"]
+    subject: str
+    body: str
+
+class EditLetter(BaseModel):
+    action: Literal["edit_letter"]
+    edit_instruction: str
+    paragraphs: Optional[List[int]] = Field(None, description="1-based numbers of the paragraphs to change; omit for whole-letter edits")
+
+class UndoLetterEdit(BaseModel):
+    action: Literal["undo_letter_edit"]
+
+class ReadLetter(BaseModel):
+    action: Literal["read_letter"]
+
+class ClearLetter(BaseModel):
+    action: Literal["clear_letter"]
+
+class SendLetterViaEmail(BaseModel):
+    action: Literal["send_letter_via_email_macos"]
+    to_email: str
     subject: Optional[str] = None
-    body: Optional[str] = None
-    edit_instruction: Optional[str] = None
-    to_email: Optional[str] = None
-    query: Optional[str] = None
-    text: Optional[str] = None
-    command: Optional[str] = None
-    app_name: Optional[str] = None
-    params: Optional[Dict[str, Any]] = None
+
+class WebSearch(BaseModel):
+    action: Literal["web_search"]
+    query: str
+
+class TranscribeExactly(BaseModel):
+    action: Literal["transcribe_exactly"]
+    text: str
+
+class PerformCalculation(BaseModel):
+    action: Literal["perform_calculation"]
+    query: str
+
+class HandleGeneralChat(BaseModel):
+    action: Literal["handle_general_chat"]
+    # Older plans (and cached ones) sent the message as "text"
+    prompt: str = Field(validation_alias=AliasChoices("prompt", "text"))
+
+class OpenApplication(BaseModel):
+    action: Literal["open_application"]
+    app_name: str
+
+class SystemCommand(BaseModel):
+    action: Literal["system_command"]
+    command: str
+
+class DiscussProgramming(BaseModel):
+    action: Literal["discuss_programming"]
+    text: str
+
+Action = Annotated[
+    Union[
+        CreateLetter, EditLetter, UndoLetterEdit, ReadLetter, ClearLetter, SendLetterViaEmail, WebSearch,
+        TranscribeExactly, PerformCalculation, HandleGeneralChat, OpenApplication, SystemCommand,
+        DiscussProgramming,
+    ],
+    Field(discriminator="action"),
+]
 
 class Workflow(BaseModel):
     steps: List[Action]
     description: Optional[str] = Field(None, description="A high-level description of the workflow's purpose.")
 
+# Building a TypeAdapter compiles a validator; build each once and reuse it
+ACTION_ADAPTER = TypeAdapter(Action)
+WORKFLOW_ADAPTER = TypeAdapter(Workflow)
+
+
+def parse_action(data: Any) -> Action:
+    """
+    Validate one step (a dict or JSON string) into its action's model; raises ValidationError.
+    """
+    if isinstance(data, (str, bytes)):
+        return ACTION_ADAPTER.validate_json(data)
+    return ACTION_ADAPTER.validate_python(data)
+
+
+def validate_workflow(data: Any) -> Tuple[Optional[Workflow], List[Dict]]:
+    """
+    Validate a workflow given as a model, dict or JSON string in a single pass.
+    Returns (workflow, []) on success and (None, errors) otherwise, errors in ValidationError.errors() form.
+    """
+    if isinstance(data, Workflow):
+        return data, []
+    try:
+        if isinstance(data, (str, bytes)):
+            return WORKFLOW_ADAPTER.validate_json(data), []
+        return WORKFLOW_ADAPTER.validate_python(data), []
+    except ValidationError as e:
+        return None, e.errors(include_url=False)
+
+
+def format_errors(errors: List[Dict]) -> List[str]:
+    return [f"Missing or invalid: {'.'.join(str(x) for x in err['loc'])} ({err['msg']})" for err in errors]
+
+
+def plan_errors(error: Exception) -> List[str]:
+    """
+    Readable "Missing or invalid" lines for an agent run whose output did not validate; run_sync wraps
+    the ValidationError in UnexpectedModelBehavior after its retry.
+    """
+    cause = error
+    while cause is not None and not isinstance(cause, ValidationError):
+        cause = cause.__cause__ or cause.__context__
+    return format_errors(cause.errors()) if cause is not None else [str(error)]
+
 # Example usage:
-# try:
-#     wf = Workflow.parse_raw(json_string)
-# except ValidationError as e:
-#     print("Invalid workflow:", e)
\ No newline at end of file
+# workflow, errors = validate_workflow(json_string)
+# if workflow is None:
+#     print("Invalid workflow:", format_errors(errors))
@@ -0,0 +1,267 @@
+import json
+import re
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from pydantic_ai.messages import ToolCallPart
+from workflow_models import Workflow, Action, ValidationError, parse_action
+from action_registry import get_action_meta
+from logging_setup import logger
+
+STEP_PATH = ("workflow", "steps")
+RESPONSE_PATH = ("response",)
+
+_SENTENCE_END = re.compile(r"[.!?](?:\s|$)")
+
+
+class IncrementalWorkflowParser:
+    """
+    Incremental scanner over the JSON text of a JarvisResponse as it streams in.
+
+    feed() is given the whole text received so far (each call extends the previous one) and
+    yields (index, step_dict) for every object in workflow.steps whose closing brace has
+    arrived. The partially received `response` string is available as response_text.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._string_path = None
+        self._response_start = None
+        self._response_raw = None
+        self.response_done = False
+
+    def _value_path(self) -> tuple:
+        if not self._stack:
+            return ()
+        top = self._stack[-1]
+        if top["type"] == "obj":
+            return top["path"] + (top["key"],)
+        return top["path"] + (top["index"],)
+
+    def feed(self, text: str) -> Iterator[Tuple[int, Dict]]:
+        if not text.startswith(self._buf):
+            # The stream restarted (e.g. a retry); start scanning from scratch.
+            self.__init__()
+        self._buf = text
+        while self._pos < len(text):
+            pos = self._pos
+            c = text[pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    raw = text[self._string_start + 1:pos]
+                    if self._string_is_key:
+                        self._stack[-1]["key"] = json.loads(f'"{raw}"')
+                    elif self._string_path == RESPONSE_PATH:
+                        self._response_raw = raw
+                        self.response_done = True
+                continue
+            if c == '"':
+                self._in_string = True
+                self._string_start = pos
+                top = self._stack[-1] if self._stack else None
+                self._string_is_key = bool(top and top["type"] == "obj" and top["expect"] == "key")
+                self._string_path = None if self._string_is_key else self._value_path()
+                if self._string_path == RESPONSE_PATH:
+                    self._response_start = pos + 1
+            elif c == "{":
+                self._stack.append({"type": "obj", "path": self._value_path(), "key": None, "expect": "key", "start": pos})
+            elif c == "[":
+                self._stack.append({"type": "arr", "path": self._value_path(), "index": 0, "start": pos})
+            elif c in "}]":
+                if not self._stack:
+                    continue
+                node = self._stack.pop()
+                path = node["path"]
+                if c == "}" and len(path) == 3 and path[:2] == STEP_PATH:
+                    try:
+                        yield path[2], json.loads(text[node["start"]:pos + 1])
+                    except json.JSONDecodeError as e:
+                        logger.warning("IncrementalWorkflowParser could not decode step %s: %s", path[2], e)
+            elif c == ":":
+                if self._stack and self._stack[-1]["type"] == "obj":
+                    self._stack[-1]["expect"] = "value"
+            elif c == ",":
+                if self._stack:
+                    top = self._stack[-1]
+                    if top["type"] == "obj":
+                        top["expect"] = "key"
+                        top["key"] = None
+                    else:
+                        top["index"] += 1
+
+    @property
+    def response_text(self) -> str:
+        if self._response_raw is not None:
+            raw = self._response_raw
+        elif self._response_start is not None and self._in_string and self._string_path == RESPONSE_PATH:
+            raw = self._buf[self._response_start:]
+        else:
+            return ""
+        # Trim a trailing, partially received escape sequence before decoding.
+        for cut in range(0, 7):
+            try:
+                return json.loads(f'"{raw[:len(raw) - cut]}"')
+            except json.JSONDecodeError:
+                continue
+        return ""
+
+
+def split_sentences(text: str, start: int = 0) -> Tuple[List[str], int]:
+    """
+    Return the complete sentences in text[start:] and the offset just past the last one.
+    """
+    sentences = []
+    for match in _SENTENCE_END.finditer(text, start):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, start
+
+
+class StepDispatcher:
+    """
+    Runs workflow steps on a single background thread, in order, as they arrive from the stream.
+
+    Only read-only steps start before the whole output has validated: the first step with side
+    effects (and everything after it, to keep the order) is held until finish() gets the final workflow.
+    """
+
+    def __init__(self, engine, user_utterance: str = ""):
+        self.engine = engine
+        self.user_utterance = user_utterance
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workflow-step")
+        self._futures = {}
+        self._steps = {}
+        self._holding = False
+        # Set when the first step is submitted, so the workflow timeout does not count planning time
+        self._deadline = None
+
+    def dispatch(self, index: int, step: Action):
+        if index in self._futures or self._holding:
+            return
+        if not get_action_meta(step.action).read_only:
+            logger.info("StepDispatcher holding step %s (%s) until the plan validates", index, step.action)
+            self._holding = True
+            return
+        self._submit(index, step)
+
+    def _submit(self, index: int, step: Action):
+        if self._deadline is None:
+            self._deadline = self.engine.begin_workflow()
+        logger.info("StepDispatcher dispatching step %s: %s", index, step.action)
+        self._steps[index] = step
+        self._futures[index] = self._executor.submit(
+            contextvars.copy_context().run, self.engine.run_step, step, self.user_utterance, self._deadline
+        )
+
+    @property
+    def dispatched(self) -> int:
+        return len(self._futures)
+
+    def finish(self, workflow: Optional[Workflow]) -> Optional[Dict]:
+        """
+        Dispatch any steps the stream did not deliver early, wait for all of them and return
+        the same shape as WorkflowEngine.execute_workflow.
+        """
+        if workflow is not None:
+            for index, step in enumerate(workflow.steps):
+                early = self._steps.get(index)
+                if early is not None and early != step:
+                    # Only read-only steps start early, so the streamed guess is discarded and rerun
+                    logger.warning("StepDispatcher step %s ran as %r but the final plan has %r; running it again",
+                                   index, early, step)
+                if early is None or early != step:
+                    self._submit(index, step)
+            for index in sorted(i for i in self._futures if i >= len(workflow.steps)):
+                logger.warning("StepDispatcher step %s (%s) is not in the final plan; dropping its result",
+                               index, self._steps[index].action)
+        results = {i: self._futures[i].result() for i in sorted(self._futures)}
+        self._executor.shutdown(wait=False)
+        if workflow is None:
+            return None
+        if self._deadline is None:
+            # An empty plan still opens its own workflow scope
+            self._deadline = self.engine.begin_workflow()
+        return self.engine.finish_workflow(workflow, [results[i] for i in range(len(workflow.steps))])
+
+    def abort(self):
+        """
+        The plan failed (e.g. the final output did not validate): stop the steps already running
+        and drop the held ones.
+        """
+        self.engine.cancel()
+        self.finish(None)
+
+
+def _output_args_text(message) -> Optional[str]:
+    for part in reversed(message.parts):
+        if isinstance(part, ToolCallPart):
+            if isinstance(part.args, dict):
+                return json.dumps(part.args)
+            return part.args or None
+    return None
+
+
+async def stream_jarvis_response(
+    agent,
+    prompt: str,
+    deps,
+    on_step: Optional[Callable[[int, Action], None]] = None,
+    on_response_text: Optional[Callable[[str, bool], None]] = None,
+    debounce_by: float | None = 0.05,
+):
+    """
+    Run the agent with streaming and report progress while the structured output arrives:
+    on_step(index, action) fires once per validated workflow step as soon as it is complete,
+    on_response_text(text_so_far, done) fires whenever more of `response` has arrived.
+    Returns (output, usage) once the stream has finished.
+    """
+    parser = IncrementalWorkflowParser()
+    last_text = ""
+    reported_done = False
+    async with agent.run_stream(prompt, deps=deps) as result:
+        message = None
+        async for message, last in result.stream_structured(debounce_by=debounce_by):
+            raw = _output_args_text(message)
+            if not raw:
+                continue
+            for index, step in parser.feed(raw):
+                try:
+                    action = parse_action(step)
+                except ValidationError as e:
+                    logger.warning("stream_jarvis_response: step %s failed validation: %s", index, e)
+                    continue
+                if on_step:
+                    on_step(index, action)
+            text = parser.response_text
+            if on_response_text and (text != last_text or parser.response_done != reported_done):
+                on_response_text(text, parser.response_done)
+                last_text, reported_done = text, parser.response_done
+        try:
+            output = await result.validate_structured_output(message)
+        except ValidationError as e:
+            # No output retry here, unlike run(); callers abort their dispatcher and ask for the missing fields
+            logger.warning("stream_jarvis_response: output failed validation: %s", e)
+            raise
+        return output, result.usage()
+
+# Usage:
+# dispatcher = StepDispatcher(WorkflowEngine(), user_utterance=transcript)
+# try:
+#     output, usage = asyncio.run(stream_jarvis_response(jarvis, prompt, deps, on_step=dispatcher.dispatch))
+# except ValidationError:
+#     dispatcher.abort(); raise
+# results = dispatcher.finish(output.workflow)